@@ -3,19 +3,74 @@
 from flask import Flask, request, jsonify, redirect
 from flask_cors import CORS
 import boto3
+from botocore.exceptions import ClientError
 import os
 import jwt
-from jwt import PyJWKClient
-from jose import jwt as jose_jwt
-from jose.exceptions import JWTError
 import requests
 import json
 from functools import wraps
 import base64
 import re
 import time
-from url_shortener import create_short_url, get_full_url, get_user_urls, delete_short_url, scheduled_cleanup
-from database import init_database
+import hashlib
+import hmac
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from url_shortener import (
+    create_short_url,
+    create_file_short_url,
+    create_file_short_urls,
+    parse_s3_link,
+    get_full_url,
+    get_user_urls,
+    get_user_urls_for_files,
+    get_next_link_expiry,
+    delete_short_url,
+    delete_file_short_urls,
+    scheduled_cleanup
+)
+from database import (
+    init_database,
+    get_store_id,
+    record_file_hash,
+    get_file_hash,
+    find_file_by_hash,
+    delete_file_hash,
+    delete_file_hashes
+)
+from change_log import get_changes_since, get_change_cursor, get_change_log_pruned_through
+from content_dedupe import HashingRequest, get_upload_content_hash, DEDUPE_ACROSS_USERS
+from trial_status_cache import invalidate_trial_status, get_trial_status_cache_stats
+from redirect_cache import get_redirect_cache_stats, get_expiry_timestamp
+from cdn_invalidation import queue_redirect_invalidation, get_cdn_invalidation_stats
+from click_counter import get_click_counter_stats
+from file_catalog import (
+    add_catalog_file,
+    remove_catalog_file,
+    remove_catalog_files,
+    get_catalog_file,
+    get_catalog_files,
+    list_catalog_page,
+    catalog_position,
+    count_catalog_files,
+    ensure_user_catalog,
+    reconcile_file_catalog,
+    CatalogNotReadyError
+)
+from multipart_uploads import (
+    MAX_PRESIGN_BATCH,
+    MAX_PARTS,
+    choose_part_size,
+    start_multipart_upload,
+    presign_upload_parts,
+    list_uploaded_parts,
+    complete_multipart_upload,
+    abort_multipart_upload,
+    abort_stale_multipart_uploads,
+    stream_to_s3,
+    UploadTooLargeError
+)
 # NOTE: user_management imports moved to runtime to prevent startup crashes
 # from user_management import (
 #     initialize_user, 
@@ -28,6 +83,7 @@ from database import init_database
 from datetime import datetime, timedelta
 
 app = Flask(__name__)
+app.request_class = HashingRequest  # Hash uploaded files while the body is parsed
 
 # Initialize database on app startup
 try:
@@ -50,7 +106,7 @@ CORS(app, origins=[
     "https://localhost:3000",            # Local development with HTTPS
     "http://127.0.0.1:3000",            # Alternative localhost
     "https://127.0.0.1:3000"            # Alternative localhost with HTTPS
-])
+], expose_headers=['Retry-After'])
 
 # --- NEW: Cognito Configuration ---
 # These will be loaded from environment variables set in the ECS Task Definition.
@@ -62,165 +118,337 @@ COGNITO_CLIENT_ID = os.environ.get('COGNITO_CLIENT_ID')
 # This is used to get the public keys needed to verify the JWTs.
 JWKS_URL = f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}/.well-known/jwks.json"
 
-# Initialize JWKS client for PyJWT with improved error handling
-jwks_client = None
-jwks_data_cache = None
-jwks_cache_time = None
-JWKS_CACHE_DURATION = 3600  # Cache JWKS data for 1 hour
+# --- JWKS key registry ---
+# Cognito's signing keys are fetched once, parsed into ready-to-use public keys
+# indexed by 'kid' and refreshed on a background timer. Requests keep using the
+# current keys while a refresh runs; only an unknown 'kid' triggers a fetch on
+# the request thread.
+JWKS_CACHE_DURATION = 3600  # Refresh JWKS data every hour
+JWKS_UNKNOWN_KID_REFRESH_INTERVAL = 30  # Minimum seconds between unknown-kid fetches
+JWKS_FETCH_TIMEOUT = 5
+JWKS_FETCH_WAIT_TIMEOUT = JWKS_FETCH_TIMEOUT + 1  # Max wait on another thread's fetch
+
+class SigningKeyNotFoundError(jwt.InvalidTokenError):
+    """No JWKS key matches the token's kid (may be transient, e.g. JWKS unreachable)"""
+
+class JWKSKeyRegistry:
+    """Parsed public keys from a JWKS endpoint, indexed by key ID"""
+    
+    def __init__(self, jwks_url, refresh_interval=JWKS_CACHE_DURATION):
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self.keys = {}  # kid -> jwt.PyJWK
+        self.last_refresh = None
+        self.last_error = None
+        self.fetch_count = 0
+        self.coalesced_waiters = 0
+        self._last_fetch_attempt = 0
+        self._lock = threading.Lock()
+        self._inflight_fetch = None
+        self._timer = None
+    
+    def fetch_keys(self):
+        """Download the JWKS document and parse every usable key"""
+        response = requests.get(self.jwks_url, timeout=JWKS_FETCH_TIMEOUT)
+        response.raise_for_status()
+        
+        keys = {}
+        for key_data in response.json().get('keys', []):
+            try:
+                keys[key_data['kid']] = jwt.PyJWK(key_data)
+            except (KeyError, jwt.PyJWKError) as e:
+                print(f"Skipping unusable JWKS key {key_data.get('kid')}: {e}")
+        return keys
+    
+    def refresh(self):
+        """
+        Fetch the key set and swap it in, keeping the current keys on failure.
+        Concurrent callers share a single in-flight fetch and get its result.
+        """
+        with self._lock:
+            inflight = self._inflight_fetch
+            is_leader = inflight is None
+            if is_leader:
+                inflight = {'done': threading.Event(), 'success': False}
+                self._inflight_fetch = inflight
+            else:
+                self.coalesced_waiters += 1
+        
+        if not is_leader:
+            if not inflight['done'].wait(JWKS_FETCH_WAIT_TIMEOUT):
+                print("Timed out waiting for in-flight JWKS fetch")
+                return False
+            return inflight['success']
+        
+        try:
+            inflight['success'] = self._fetch_and_swap()
+        finally:
+            with self._lock:
+                self._inflight_fetch = None
+            inflight['done'].set()
+        return inflight['success']
+    
+    def _fetch_and_swap(self):
+        self._last_fetch_attempt = time.time()
+        self.fetch_count += 1
+        try:
+            keys = self.fetch_keys()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Failed to refresh JWKS keys: {e}")
+            return False
+        
+        with self._lock:
+            rotated = bool(self.keys) and set(self.keys) != set(keys)
+            self.keys = keys
+            self.last_refresh = time.time()
+            self.last_error = None
+        
+        if rotated:
+            print("JWKS key set changed - clearing verified token cache")
+            clear_verified_token_cache()
+        print(f"JWKS keys refreshed ({len(keys)} keys)")
+        return True
+    
+    def get_signing_key(self, kid):
+        """Return the parsed key for a kid, fetching right away only if it is unknown"""
+        key = self.keys.get(kid)
+        if key is None:
+            since_last_fetch = time.time() - self._last_fetch_attempt
+            if not self.keys or since_last_fetch >= JWKS_UNKNOWN_KID_REFRESH_INTERVAL:
+                print(f"Unknown JWKS kid '{kid}' - fetching keys")
+                self.refresh()
+                key = self.keys.get(kid)
+        
+        if key is None:
+            raise SigningKeyNotFoundError("Unable to find appropriate key in JWKS")
+        return key
+    
+    def start_background_refresh(self):
+        """Start the periodic refresh timer (no-op if already running)"""
+        if self._timer is None:
+            self._schedule_refresh(self.refresh_interval)
+    
+    def _schedule_refresh(self, delay):
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _background_refresh(self):
+        success = self.refresh()
+        # Retry sooner if the refresh failed; the old keys stay in use meanwhile
+        self._schedule_refresh(self.refresh_interval if success else JWKS_UNKNOWN_KID_REFRESH_INTERVAL)
+
+jwks_registry = None
+jwks_registry_lock = threading.Lock()
 
-def get_or_initialize_jwks_client():
-    """Get JWKS client with lazy initialization and retry logic"""
-    global jwks_client, jwks_data_cache, jwks_cache_time
+def get_jwks_key_registry():
+    """Get the JWKS key registry, creating it and its refresh timer on first use"""
+    global jwks_registry
     
     # Check if we have required environment variables
     if not AWS_REGION or not COGNITO_USER_POOL_ID:
         print("Warning: AWS_REGION or COGNITO_USER_POOL_ID not set - JWT validation will fail")
         return None
     
-    # If client exists and is working, return it
-    if jwks_client:
-        return jwks_client
+    if jwks_registry is None:
+        with jwks_registry_lock:
+            if jwks_registry is None:
+                registry = JWKSKeyRegistry(JWKS_URL)
+                registry.start_background_refresh()
+                jwks_registry = registry
+    return jwks_registry
+
+# --- Verified-token cache ---
+# The frontend sends the same Cognito ID token on many requests per session, so
+# the claims of already-verified tokens are kept in a bounded LRU keyed by a
+# SHA-256 digest of the token. Entries expire at the token's own 'exp'.
+VERIFIED_TOKEN_CACHE_SIZE = int(os.environ.get('VERIFIED_TOKEN_CACHE_SIZE', 1024))
+verified_token_cache = OrderedDict()  # digest -> (exp, decoded_token)
+verified_token_cache_lock = threading.Lock()
+verified_token_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def get_token_digest(token):
+    """Hash a raw JWT so the token itself is never used as a cache key"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def get_cached_verified_token(token):
+    """Return cached claims for a previously verified token, or None"""
+    digest = get_token_digest(token)
+    with verified_token_cache_lock:
+        entry = verified_token_cache.get(digest)
+        if entry is None:
+            verified_token_cache_stats['misses'] += 1
+            return None
+        
+        exp, decoded_token = entry
+        if time.time() >= exp:
+            # Token expired since it was cached - drop it and verify again
+            del verified_token_cache[digest]
+            verified_token_cache_stats['misses'] += 1
+            return None
+        
+        verified_token_cache.move_to_end(digest)
+        verified_token_cache_stats['hits'] += 1
+        return dict(decoded_token)
+
+def cache_verified_token(token, decoded_token):
+    """Remember the claims of a verified token until its 'exp'"""
+    exp = decoded_token.get('exp')
+    if not exp or VERIFIED_TOKEN_CACHE_SIZE <= 0:
+        return
     
-    # Try to initialize JWKS client with retry logic
-    max_retries = 3
-    retry_delay = 1
+    digest = get_token_digest(token)
+    with verified_token_cache_lock:
+        verified_token_cache[digest] = (float(exp), dict(decoded_token))
+        verified_token_cache.move_to_end(digest)
+        while len(verified_token_cache) > VERIFIED_TOKEN_CACHE_SIZE:
+            verified_token_cache.popitem(last=False)
+            verified_token_cache_stats['evictions'] += 1
+
+def clear_verified_token_cache():
+    """Drop all cached verified tokens (e.g. after a JWKS key rotation)"""
+    with verified_token_cache_lock:
+        verified_token_cache.clear()
+
+def get_verified_token_cache_stats():
+    """Hit/miss counters for the verified-token cache"""
+    with verified_token_cache_lock:
+        stats = dict(verified_token_cache_stats)
+        stats['size'] = len(verified_token_cache)
+    lookups = stats['hits'] + stats['misses']
+    stats['max_size'] = VERIFIED_TOKEN_CACHE_SIZE
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
+
+# --- Failed-token (negative) cache ---
+# Tokens that failed verification are remembered for a short time so bots and
+# stale browser tabs replaying the same bad token are rejected without any work.
+FAILED_TOKEN_CACHE_SIZE = int(os.environ.get('FAILED_TOKEN_CACHE_SIZE', 1024))
+FAILED_TOKEN_CACHE_TTL = int(os.environ.get('FAILED_TOKEN_CACHE_TTL', 60))
+failed_token_cache = OrderedDict()  # digest -> (expires_at, error_class, error_args)
+failed_token_cache_lock = threading.Lock()
+failed_token_cache_stats = {'hits': 0, 'rejections': 0}
+
+def get_cached_token_failure(token):
+    """Return the cached verification error for a recently failed token, or None"""
+    digest = get_token_digest(token)
+    with failed_token_cache_lock:
+        entry = failed_token_cache.get(digest)
+        if entry is None:
+            return None
+        
+        expires_at, error_class, error_args = entry
+        if time.time() >= expires_at:
+            del failed_token_cache[digest]
+            return None
+        
+        failed_token_cache_stats['hits'] += 1
+    # Rebuilt from the original args (not the message), since some PyJWT errors
+    # format their message from their arguments, e.g. MissingRequiredClaimError
+    return error_class(*error_args)
+
+def cache_token_failure(token, error):
+    """Remember that a token failed verification for FAILED_TOKEN_CACHE_TTL seconds"""
+    if FAILED_TOKEN_CACHE_SIZE <= 0:
+        return
     
-    for attempt in range(max_retries):
-        try:
-            print(f"Initializing JWKS client (attempt {attempt + 1}/{max_retries})")
-            print(f"JWKS URL: {JWKS_URL}")
-            
-            # Create new client
-            jwks_client = PyJWKClient(JWKS_URL)
-            
-            # Test the client by fetching the keys
-            # This will trigger an exception if there's a problem
-            test_response = requests.get(JWKS_URL, timeout=5)
-            test_response.raise_for_status()
-            
-            # Cache the JWKS data for fallback
-            jwks_data_cache = test_response.json()
-            jwks_cache_time = time.time()
-            
-            print("JWKS client initialized and tested successfully")
-            return jwks_client
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Network error initializing JWKS client (attempt {attempt + 1}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                retry_delay *= 2  # Exponential backoff
-            else:
-                print("Failed to initialize JWKS client after all retries")
-                jwks_client = None
-                
-        except Exception as e:
-            print(f"Unexpected error initializing JWKS client: {e}")
-            jwks_client = None
-            break
+    digest = get_token_digest(token)
+    with failed_token_cache_lock:
+        failed_token_cache[digest] = (time.time() + FAILED_TOKEN_CACHE_TTL, type(error), error.args)
+        failed_token_cache.move_to_end(digest)
+        while len(failed_token_cache) > FAILED_TOKEN_CACHE_SIZE:
+            failed_token_cache.popitem(last=False)
+        failed_token_cache_stats['rejections'] += 1
+
+def get_failed_token_cache_stats():
+    """Counters for the failed-token cache"""
+    with failed_token_cache_lock:
+        stats = dict(failed_token_cache_stats)
+        stats['size'] = len(failed_token_cache)
+    stats['ttl_seconds'] = FAILED_TOKEN_CACHE_TTL
+    return stats
+
+def precheck_token_claims(token):
+    """
+    Cheap checks on the unverified claims before any signature verification.
+    Raises the same PyJWT errors jwt.decode would for exp, iss, aud and token_use.
+    """
+    claims = jwt.decode(token, options={"verify_signature": False})
     
-    return None
-
-def get_cached_jwks_data():
-    """Get cached JWKS data if available and not expired"""
-    global jwks_data_cache, jwks_cache_time
+    exp = claims.get('exp')
+    if not isinstance(exp, (int, float)):
+        raise jwt.MissingRequiredClaimError('exp')
+    if exp <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    
+    expected_issuer = f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}"
+    if claims.get('iss') != expected_issuer:
+        raise jwt.InvalidIssuerError("Invalid issuer")
     
-    if jwks_data_cache and jwks_cache_time:
-        cache_age = time.time() - jwks_cache_time
-        if cache_age < JWKS_CACHE_DURATION:
-            print(f"Using cached JWKS data (age: {cache_age:.0f}s)")
-            return jwks_data_cache
+    audience = claims.get('aud')
+    audiences = audience if isinstance(audience, list) else [audience]
+    if COGNITO_CLIENT_ID not in audiences:
+        raise jwt.InvalidAudienceError("Audience doesn't match")
     
-    return None
+    # Only Cognito ID tokens carry the email claim the routes rely on
+    if claims.get('token_use') != 'id':
+        raise jwt.InvalidTokenError(f"Unexpected token_use: {claims.get('token_use')}")
 
 def verify_jwt_token(token):
     """
-    Verify JWT token using both PyJWT and python-jose as fallback
+    Verify JWT token, serving repeat tokens from the verified/failed token caches
     Returns decoded token if valid, raises exception if invalid
     """
-    # Try to get or initialize JWKS client
-    client = get_or_initialize_jwks_client()
+    cached_token = get_cached_verified_token(token)
+    if cached_token is not None:
+        return cached_token
     
-    # Method 1: Try PyJWT with PyJWKClient (recommended)
-    if client:
-        try:
-            # Get the signing key from the JWT token
-            signing_key = client.get_signing_key_from_jwt(token)
-            
-            # Decode and verify the token
-            decoded_token = jwt.decode(
-                token,
-                signing_key.key,
-                algorithms=["RS256"],
-                audience=COGNITO_CLIENT_ID,
-                issuer=f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}",
-                options={
-                    "verify_signature": True,
-                    "verify_aud": True,
-                    "verify_iss": True,
-                    "verify_exp": True
-                }
-            )
-            print("JWT successfully verified using PyJWT")
-            return decoded_token
-            
-        except Exception as pyjwt_error:
-            print(f"PyJWT verification failed: {pyjwt_error}")
-    else:
-        pyjwt_error = "JWKS client not available"
+    cached_failure = get_cached_token_failure(token)
+    if cached_failure is not None:
+        raise cached_failure
     
-    # Method 2: Fallback to python-jose with cached or fresh JWKS data
     try:
-        # Try to use cached JWKS data first
-        jwks_data = get_cached_jwks_data()
-        
-        if not jwks_data:
-            # Fetch fresh JWKS data
-            print("Fetching fresh JWKS data for fallback verification")
-            jwks_response = requests.get(JWKS_URL, timeout=5)
-            jwks_response.raise_for_status()
-            jwks_data = jwks_response.json()
-            
-            # Update cache
-            global jwks_data_cache, jwks_cache_time
-            jwks_data_cache = jwks_data
-            jwks_cache_time = time.time()
-        
-        # Get token header to find the correct key
-        unverified_header = jose_jwt.get_unverified_header(token)
-        
-        # Find the key that matches the kid
-        rsa_key = None
-        for key in jwks_data["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = key
-                break
-        
-        if not rsa_key:
-            raise jwt.InvalidTokenError("Unable to find appropriate key in JWKS")
-        
-        # Verify the token using python-jose
-        decoded_token = jose_jwt.decode(
-            token,
-            rsa_key,
-            algorithms=["RS256"],
-            audience=COGNITO_CLIENT_ID,
-            issuer=f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}"
-        )
-        print("JWT successfully verified using python-jose (fallback)")
-        return decoded_token
-        
-    except requests.exceptions.RequestException as network_error:
-        print(f"Network error fetching JWKS data: {network_error}")
-        raise jwt.InvalidTokenError(f"Failed to fetch public keys: {network_error}")
-        
-    except Exception as jose_error:
-        print(f"python-jose verification also failed: {jose_error}")
-        # Provide a more helpful error message
-        if "Unable to find appropriate key" in str(jose_error):
-            raise jwt.InvalidTokenError("Failed to process public key - key not found in JWKS")
-        else:
-            raise jwt.InvalidTokenError(f"Token verification failed: PyJWT({pyjwt_error}), jose({jose_error})")
+        precheck_token_claims(token)
+        decoded_token = _verify_jwt_signature(token)
+    except SigningKeyNotFoundError:
+        # Could be a JWKS outage rather than a bad token - don't cache it
+        raise
+    except jwt.PyJWTError as e:
+        cache_token_failure(token, e)
+        raise
+    
+    cache_verified_token(token, decoded_token)
+    return decoded_token
+
+def _verify_jwt_signature(token):
+    """
+    Verify JWT signature and claims against the pre-parsed JWKS keys
+    Returns decoded token if valid, raises exception if invalid
+    """
+    registry = get_jwks_key_registry()
+    if registry is None:
+        raise jwt.InvalidTokenError("JWKS key registry not available")
+    
+    # Look up the signing key by the token's key ID
+    unverified_header = jwt.get_unverified_header(token)
+    signing_key = registry.get_signing_key(unverified_header.get('kid'))
+    
+    decoded_token = jwt.decode(
+        token,
+        signing_key.key,
+        algorithms=["RS256"],
+        audience=COGNITO_CLIENT_ID,
+        issuer=f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}",
+        options={
+            "verify_signature": True,
+            "verify_aud": True,
+            "verify_iss": True,
+            "verify_exp": True
+        }
+    )
+    print("JWT successfully verified using PyJWT")
+    return decoded_token
 
 
 # --- NEW: JWT Validation Decorator ---
@@ -270,24 +498,25 @@ def token_required(f):
             print(f"Token validation error: {e}")
             return jsonify({'message': 'Token is invalid!'}), 401
         
-        # Check for expired trials on each authenticated request
+        # Check for expired trials on each authenticated request. The expiry comes
+        # from the 'trial_expires_at' claim added by the Cognito pre-token-generation
+        # trigger, so no database read is needed; tokens without it are skipped
+        # and left to /api/admin/expire-trials.
         try:
             user_email = decoded_token.get('email')
-            user_id = decoded_token.get('sub')
             user_groups = decoded_token.get('cognito:groups', [])
+            trial_expires_at = decoded_token.get('trial_expires_at')
             
-            if user_email and user_id and 'premium-trial' in user_groups:
+            if user_email and trial_expires_at and 'premium-trial' in user_groups:
                 # Check if this trial user's trial has expired
                 try:
-                    from user_management import get_user_trial_status
-                    trial_status = get_user_trial_status(user_email, user_id)
-                    if trial_status['trial_status'] == 'expired':
+                    if float(trial_expires_at) <= time.time():
                         # Process this expired trial
                         from cognito_utils import move_user_to_free_group
                         move_user_to_free_group(user_email)
                         print(f"Processed expired trial for user {user_email}")
                 except ImportError as ie:
-                    print(f"Warning: Could not import user_management: {ie}")
+                    print(f"Warning: Could not import cognito_utils: {ie}")
                 except Exception as e:
                     print(f"Warning: Trial status check failed: {e}")
         except Exception as e:
@@ -299,6 +528,24 @@ def token_required(f):
 
     return decorated
 
+# Maintenance endpoints run by scheduled tasks authenticate with a shared secret
+# in the X-Admin-Token header; they are disabled when ADMIN_API_TOKEN is unset.
+ADMIN_API_TOKEN = os.environ.get('ADMIN_API_TOKEN')
+
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not ADMIN_API_TOKEN:
+            return jsonify({'message': 'Admin API is disabled'}), 403
+        
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), ADMIN_API_TOKEN.encode()):
+            return jsonify({'message': 'Admin token is missing or invalid'}), 401
+        
+        return f(*args, **kwargs)
+    
+    return decorated
+
 
 # --- Existing S3 Configuration ---
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
@@ -367,16 +614,538 @@ def upload_file(decoded_token): # The decoded token is passed by the decorator
             file_key = f"{user_folder}/{sanitized_filename}"
             print(f"S3 file key: {file_key}")
 
-            s3.upload_fileobj(file, S3_BUCKET_NAME, file_key)
+            dedupe_result = store_deduplicated_upload(file, file_key, user_folder)
+            print(f"Upload stored ({dedupe_result}): {file_key}")
             return jsonify({
                 'message': 'File successfully uploaded',
-                'file_name': file_key # Return the full key with sanitized name
+                'file_name': file_key, # Return the full key with sanitized name
+                'dedupe': dedupe_result
             }), 200
         except Exception as e:
             return jsonify({'message': f'An error occurred: {e}'}), 500
     
     return jsonify({'message': 'S3 bucket not configured'}), 500
 
+def get_object_etag(file_key):
+    """Return the ETag of an object, or None if it does not exist"""
+    try:
+        return s3.head_object(Bucket=S3_BUCKET_NAME, Key=file_key)['ETag']
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+def store_deduplicated_upload(file, file_key, user_folder):
+    """
+    Store an uploaded file in S3 unless identical content is already there
+    
+    The S3 write is skipped when the hash index says the same content already
+    sits at file_key. Otherwise the content hash is looked up among this
+    user's files (any user's when DEDUPE_ACROSS_USERS is set) and the write is
+    replaced by a server-side copy when it sits under another key. The
+    indexed ETag guards against objects that were overwritten or removed
+    since they were indexed.
+    
+    Returns:
+        'skipped', 'copied' or 'uploaded'
+    """
+    content_hash, size_bytes = get_upload_content_hash(file)
+    
+    # Check the target key's own entry first, so that other keys holding the
+    # same content don't turn a re-upload into a copy
+    current = get_file_hash(file_key)
+    if current and current['content_hash'] == content_hash and current['etag']:
+        if get_object_etag(file_key) == current['etag']:
+            return 'skipped'
+    
+    existing = find_file_by_hash(content_hash, None if DEDUPE_ACROSS_USERS else user_folder)
+    if existing and existing['file_key'] != file_key and existing['etag']:
+        try:
+            s3.copy(
+                {'Bucket': S3_BUCKET_NAME, 'Key': existing['file_key']},
+                S3_BUCKET_NAME, file_key,
+                ExtraArgs={'CopySourceIfMatch': existing['etag']}
+            )
+            record_stored_upload(file_key, content_hash, user_folder, size_bytes)
+            return 'copied'
+        except ClientError as e:
+            # Source was deleted or changed since it was indexed - fall back to a normal upload
+            print(f"Dedupe copy from {existing['file_key']} failed, uploading instead: {e}")
+            delete_file_hash(existing['file_key'])
+    
+    s3.upload_fileobj(file, S3_BUCKET_NAME, file_key)
+    record_stored_upload(file_key, content_hash, user_folder, size_bytes)
+    return 'uploaded'
+
+def record_stored_upload(file_key, content_hash, user_folder, size_bytes):
+    """Add a newly written object to the hash index and the file catalog"""
+    etag = get_object_etag(file_key)
+    record_file_hash(file_key, content_hash, user_folder, size_bytes, etag)
+    add_catalog_file(file_key, size_bytes, etag, content_hash)
+
+# --- Direct-to-S3 uploads ---
+# The browser sends file bytes straight to S3 with a presigned POST, so Flask only
+# signs the request and confirms the result instead of proxying the whole body.
+MAX_UPLOAD_SIZE_BYTES = int(os.environ.get('MAX_UPLOAD_SIZE_BYTES', 5 * 1024 * 1024 * 1024))  # 5 GB (S3 POST limit)
+UPLOAD_PRESIGN_EXPIRATION = 900  # 15 minutes to start the upload
+
+@app.route("/api/upload/presign", methods=['POST'])
+@token_required
+def presign_upload(decoded_token):
+    """Return presigned POST credentials for uploading a file directly to S3"""
+    data = request.get_json(silent=True)
+    if not data or not data.get('filename'):
+        return jsonify({'message': 'Missing filename parameter'}), 400
+    
+    if not S3_BUCKET_NAME:
+        return jsonify({'message': 'S3 bucket not configured'}), 500
+    
+    try:
+        file_size = int(data.get('file_size', 0))
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Invalid file_size parameter'}), 400
+    
+    if file_size < 0:
+        return jsonify({'message': 'Invalid file_size parameter'}), 400
+    if file_size > MAX_UPLOAD_SIZE_BYTES:
+        return jsonify({
+            'message': 'File is too large',
+            'max_size_bytes': MAX_UPLOAD_SIZE_BYTES
+        }), 413
+    
+    user_folder = get_user_folder_name(decoded_token)
+    if not user_folder:
+        return jsonify({'message': 'User identification not found in token'}), 400
+    
+    sanitized_filename = sanitize_filename(data['filename'])
+    file_key = f"{user_folder}/{sanitized_filename}"
+    print(f"Presigning direct upload for S3 key: {file_key} ({file_size} bytes)")
+    
+    fields = {}
+    conditions = [['content-length-range', 0, MAX_UPLOAD_SIZE_BYTES]]
+    content_type = data.get('content_type')
+    if content_type:
+        fields['Content-Type'] = content_type
+        conditions.append({'Content-Type': content_type})
+    
+    try:
+        presigned_post = s3.generate_presigned_post(
+            Bucket=S3_BUCKET_NAME,
+            Key=file_key,
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=UPLOAD_PRESIGN_EXPIRATION
+        )
+        return jsonify({
+            'upload_url': presigned_post['url'],
+            'fields': presigned_post['fields'],
+            'file_key': file_key,
+            'max_size_bytes': MAX_UPLOAD_SIZE_BYTES,
+            'expires_in_seconds': UPLOAD_PRESIGN_EXPIRATION
+        })
+    except Exception as e:
+        print(f"Error presigning upload for key '{file_key}': {e}")
+        return jsonify({'message': f'Could not prepare upload: {e}'}), 500
+
+@app.route("/api/upload/confirm", methods=['POST'])
+@token_required
+def confirm_upload(decoded_token):
+    """Confirm a direct-to-S3 upload and register it for the user"""
+    data = request.get_json(silent=True)
+    if not data or not data.get('file_key'):
+        return jsonify({'message': 'Missing file_key parameter'}), 400
+    
+    file_key = data['file_key']
+    user_folder = get_user_folder_name(decoded_token)
+    
+    # Security check: ensure file belongs to the authenticated user
+    if not user_folder or not file_key.startswith(f"{user_folder}/"):
+        return jsonify({'message': 'Access denied - file does not belong to user'}), 403
+    
+    try:
+        head = s3.head_object(Bucket=S3_BUCKET_NAME, Key=file_key)
+        size_bytes = head['ContentLength']
+        
+        if size_bytes > MAX_UPLOAD_SIZE_BYTES:
+            s3.delete_object(Bucket=S3_BUCKET_NAME, Key=file_key)
+            return jsonify({
+                'message': 'File is too large',
+                'max_size_bytes': MAX_UPLOAD_SIZE_BYTES
+            }), 413
+        
+        add_catalog_file(file_key, size_bytes, head['ETag'], last_modified=head['LastModified'])
+        print(f"Confirmed direct upload: {file_key} ({size_bytes} bytes)")
+        return jsonify({
+            'message': 'File successfully uploaded',
+            'file_name': file_key,
+            'size_bytes': size_bytes
+        }), 200
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return jsonify({'message': 'Uploaded file not found'}), 404
+        print(f"Error confirming upload for key '{file_key}': {e}")
+        return jsonify({'message': f'An error occurred: {e}'}), 500
+
+# --- Resumable multipart uploads ---
+# Large files are uploaded as parts directly to S3; the client can upload parts
+# in parallel, list what already arrived and resume after a network drop.
+MAX_MULTIPART_UPLOAD_SIZE_BYTES = int(os.environ.get('MAX_MULTIPART_UPLOAD_SIZE_BYTES', 50 * 1024 * 1024 * 1024))  # 50 GB
+
+def get_owned_multipart_upload(decoded_token, data):
+    """
+    Read file_key/upload_id from request data and check the key belongs to the user
+    Returns (file_key, upload_id, error_response)
+    """
+    if not data or not data.get('file_key') or not data.get('upload_id'):
+        return None, None, (jsonify({'message': 'Missing file_key or upload_id parameter'}), 400)
+    
+    file_key = data['file_key']
+    user_folder = get_user_folder_name(decoded_token)
+    
+    # Security check: ensure file belongs to the authenticated user
+    if not user_folder or not file_key.startswith(f"{user_folder}/"):
+        return None, None, (jsonify({'message': 'Access denied - file does not belong to user'}), 403)
+    
+    return file_key, data['upload_id'], None
+
+@app.route("/api/upload/multipart/start", methods=['POST'])
+@token_required
+def start_multipart_upload_endpoint(decoded_token):
+    """Start a resumable multipart upload under the user's folder"""
+    data = request.get_json(silent=True)
+    if not data or not data.get('filename'):
+        return jsonify({'message': 'Missing filename parameter'}), 400
+    
+    if not S3_BUCKET_NAME:
+        return jsonify({'message': 'S3 bucket not configured'}), 500
+    
+    try:
+        file_size = int(data.get('file_size', 0))
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Invalid file_size parameter'}), 400
+    
+    if file_size < 0:
+        return jsonify({'message': 'Invalid file_size parameter'}), 400
+    if file_size > MAX_MULTIPART_UPLOAD_SIZE_BYTES:
+        return jsonify({
+            'message': 'File is too large',
+            'max_size_bytes': MAX_MULTIPART_UPLOAD_SIZE_BYTES
+        }), 413
+    
+    user_folder = get_user_folder_name(decoded_token)
+    if not user_folder:
+        return jsonify({'message': 'User identification not found in token'}), 400
+    
+    # Same key layout as /api/upload
+    file_key = f"{user_folder}/{sanitize_filename(data['filename'])}"
+    
+    try:
+        upload_id = start_multipart_upload(s3, S3_BUCKET_NAME, file_key, data.get('content_type'))
+        return jsonify({
+            'file_key': file_key,
+            'upload_id': upload_id,
+            'part_size': choose_part_size(file_size),
+            'max_parts': MAX_PARTS,
+            'max_part_urls_per_request': MAX_PRESIGN_BATCH
+        })
+    except Exception as e:
+        print(f"Error starting multipart upload for key '{file_key}': {e}")
+        return jsonify({'message': f'Could not start upload: {e}'}), 500
+
+@app.route("/api/upload/multipart/part-urls", methods=['POST'])
+@token_required
+def presign_multipart_parts_endpoint(decoded_token):
+    """Presign upload URLs for a batch of part numbers"""
+    data = request.get_json(silent=True)
+    file_key, upload_id, error_response = get_owned_multipart_upload(decoded_token, data)
+    if error_response:
+        return error_response
+    
+    try:
+        part_numbers = [int(number) for number in data.get('part_numbers', [])]
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Invalid part_numbers parameter'}), 400
+    
+    if not part_numbers or len(part_numbers) > MAX_PRESIGN_BATCH:
+        return jsonify({'message': f'Request between 1 and {MAX_PRESIGN_BATCH} part numbers'}), 400
+    if any(number < 1 or number > MAX_PARTS for number in part_numbers):
+        return jsonify({'message': f'Part numbers must be between 1 and {MAX_PARTS}'}), 400
+    
+    try:
+        part_urls = presign_upload_parts(s3, S3_BUCKET_NAME, file_key, upload_id, part_numbers)
+        return jsonify({
+            'file_key': file_key,
+            'upload_id': upload_id,
+            'parts': part_urls
+        })
+    except Exception as e:
+        print(f"Error presigning parts for upload {upload_id}: {e}")
+        return jsonify({'message': f'Could not presign parts: {e}'}), 500
+
+@app.route("/api/upload/multipart/parts", methods=['GET'])
+@token_required
+def list_multipart_parts_endpoint(decoded_token):
+    """List the parts already uploaded, so an interrupted upload can resume"""
+    file_key, upload_id, error_response = get_owned_multipart_upload(decoded_token, request.args)
+    if error_response:
+        return error_response
+    
+    try:
+        parts = list_uploaded_parts(s3, S3_BUCKET_NAME, file_key, upload_id)
+        return jsonify({
+            'file_key': file_key,
+            'upload_id': upload_id,
+            'parts': parts,
+            'uploaded_bytes': sum(part['size'] for part in parts)
+        })
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchUpload':
+            return jsonify({'message': 'Upload not found'}), 404
+        print(f"Error listing parts for upload {upload_id}: {e}")
+        return jsonify({'message': f'Could not list parts: {e}'}), 500
+
+@app.route("/api/upload/multipart/complete", methods=['POST'])
+@token_required
+def complete_multipart_upload_endpoint(decoded_token):
+    """Assemble the uploaded parts into the final object"""
+    data = request.get_json(silent=True)
+    file_key, upload_id, error_response = get_owned_multipart_upload(decoded_token, data)
+    if error_response:
+        return error_response
+    
+    try:
+        # Use S3's own record of the parts so the client only needs the upload ID
+        parts = list_uploaded_parts(s3, S3_BUCKET_NAME, file_key, upload_id)
+        if not parts:
+            return jsonify({'message': 'No parts have been uploaded'}), 400
+        
+        size_bytes = sum(part['size'] for part in parts)
+        if size_bytes > MAX_MULTIPART_UPLOAD_SIZE_BYTES:
+            abort_multipart_upload(s3, S3_BUCKET_NAME, file_key, upload_id)
+            return jsonify({
+                'message': 'File is too large',
+                'max_size_bytes': MAX_MULTIPART_UPLOAD_SIZE_BYTES
+            }), 413
+        
+        etag = complete_multipart_upload(s3, S3_BUCKET_NAME, file_key, upload_id, parts)
+        add_catalog_file(file_key, size_bytes, etag)
+        return jsonify({
+            'message': 'File successfully uploaded',
+            'file_name': file_key,
+            'size_bytes': size_bytes,
+            'part_count': len(parts)
+        }), 200
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchUpload':
+            return jsonify({'message': 'Upload not found'}), 404
+        print(f"Error completing upload {upload_id}: {e}")
+        return jsonify({'message': f'Could not complete upload: {e}'}), 500
+
+@app.route("/api/upload/multipart/abort", methods=['POST'])
+@token_required
+def abort_multipart_upload_endpoint(decoded_token):
+    """Abort a multipart upload and discard its parts"""
+    data = request.get_json(silent=True)
+    file_key, upload_id, error_response = get_owned_multipart_upload(decoded_token, data)
+    if error_response:
+        return error_response
+    
+    try:
+        abort_multipart_upload(s3, S3_BUCKET_NAME, file_key, upload_id)
+        return jsonify({
+            'message': 'Upload aborted',
+            'file_key': file_key,
+            'upload_id': upload_id
+        })
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchUpload':
+            return jsonify({'message': 'Upload not found'}), 404
+        print(f"Error aborting upload {upload_id}: {e}")
+        return jsonify({'message': f'Could not abort upload: {e}'}), 500
+
+# --- Streaming pass-through uploads ---
+@app.route("/api/upload/stream", methods=['PUT', 'POST'])
+@token_required
+def stream_upload_file(decoded_token):
+    """
+    Server-side upload for clients that cannot reach S3 directly. The raw request
+    body (not multipart/form-data) is piped to S3 in fixed-size parts, so memory
+    and disk use per upload stay constant. The filename comes from the 'filename'
+    query parameter or the X-File-Name header.
+    """
+    filename = request.args.get('filename') or request.headers.get('X-File-Name')
+    if not filename:
+        return jsonify({'message': 'Missing filename parameter'}), 400
+    
+    if not S3_BUCKET_NAME:
+        return jsonify({'message': 'S3 bucket not configured'}), 500
+    
+    if request.content_length is not None and request.content_length > MAX_MULTIPART_UPLOAD_SIZE_BYTES:
+        return jsonify({
+            'message': 'File is too large',
+            'max_size_bytes': MAX_MULTIPART_UPLOAD_SIZE_BYTES
+        }), 413
+    
+    user_folder = get_user_folder_name(decoded_token)
+    if not user_folder:
+        return jsonify({'message': 'User identification not found in token'}), 400
+    
+    file_key = f"{user_folder}/{sanitize_filename(filename)}"
+    content_type = request.mimetype if request.mimetype != 'application/octet-stream' else None
+    print(f"Streaming upload to S3 key: {file_key}")
+    
+    try:
+        size_bytes = stream_to_s3(
+            s3, S3_BUCKET_NAME, file_key, request.stream,
+            content_type=content_type,
+            max_size=MAX_MULTIPART_UPLOAD_SIZE_BYTES
+        )
+        add_catalog_file(file_key, size_bytes)
+        return jsonify({
+            'message': 'File successfully uploaded',
+            'file_name': file_key,
+            'size_bytes': size_bytes
+        }), 200
+    except UploadTooLargeError:
+        return jsonify({
+            'message': 'File is too large',
+            'max_size_bytes': MAX_MULTIPART_UPLOAD_SIZE_BYTES
+        }), 413
+    except Exception as e:
+        print(f"Error streaming upload for key '{file_key}': {e}")
+        return jsonify({'message': f'An error occurred: {e}'}), 500
+
+def get_link_expiration(decoded_token):
+    """Return (expiration_seconds, tier) for download links based on the user's group"""
+    user_groups = decoded_token.get('cognito:groups', [])
+    
+    if 'premium-tier' in user_groups or 'premium-trial' in user_groups:
+        return 604800, 'premium'  # 7 days (S3 maximum)
+    return 259200, 'free'  # Default to free tier: 3 days
+
+# Lazy file links store only bucket/key and are presigned with a short TTL on each click
+LAZY_PRESIGN_LINKS = os.environ.get('LAZY_PRESIGN_LINKS', 'true').lower() == 'true'
+LINK_PRESIGN_TTL = int(os.environ.get('LINK_PRESIGN_TTL', 300))  # 5 minutes
+
+def create_download_short_url(decoded_token, file_key, expiration_seconds):
+    """Create a short download URL for file_key"""
+    user_email = decoded_token.get('email', 'unknown')
+    
+    if LAZY_PRESIGN_LINKS:
+        return create_file_short_url(
+            bucket=S3_BUCKET_NAME,
+            file_key=file_key,
+            user_email=user_email,
+            expires_in_days=expiration_seconds // 86400
+        )
+    
+    # Legacy mode: store a presigned URL valid for the whole link lifetime
+    presigned_url = s3.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': S3_BUCKET_NAME, 'Key': file_key},
+        ExpiresIn=expiration_seconds
+    )
+    filename = file_key.split('/')[-1] if '/' in file_key else file_key
+    
+    return create_short_url(
+        full_url=presigned_url,
+        user_email=user_email,
+        file_key=file_key,
+        filename=filename,
+        expires_in_days=expiration_seconds // 86400  # Convert seconds to days
+    )
+
+# --- Batch uploads ---
+# Many files in one request, uploaded to S3 through a bounded pool that shares
+# the module-level s3 client (boto3 clients are thread-safe).
+MAX_BATCH_UPLOAD_FILES = int(os.environ.get('MAX_BATCH_UPLOAD_FILES', 200))
+BATCH_UPLOAD_WORKERS = int(os.environ.get('BATCH_UPLOAD_WORKERS', 8))
+batch_upload_executor = ThreadPoolExecutor(max_workers=BATCH_UPLOAD_WORKERS, thread_name_prefix='batch-upload')
+
+def upload_batch_file(file, file_key, user_folder):
+    """Upload one file of a batch; returns a per-file result instead of raising"""
+    try:
+        content_hash, size_bytes = get_upload_content_hash(file)
+        s3.upload_fileobj(file, S3_BUCKET_NAME, file_key)
+        record_stored_upload(file_key, content_hash, user_folder, size_bytes)
+        return {'filename': file.filename, 'file_name': file_key, 'success': True}
+    except Exception as e:
+        print(f"Error uploading batch file '{file_key}': {e}")
+        return {'filename': file.filename, 'file_name': file_key, 'success': False, 'error': str(e)}
+
+@app.route("/api/upload/batch", methods=['POST'])
+@token_required
+def upload_batch(decoded_token):
+    """
+    Upload many files (form field 'files') in one request. Set form field
+    'create_links' to 'true' to also create a short download link for each
+    uploaded file. Returns one result per file; 207 on partial success.
+    Files whose names map to the same key as an earlier file are rejected.
+    """
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'message': 'No files selected for uploading'}), 400
+    
+    if len(files) > MAX_BATCH_UPLOAD_FILES:
+        return jsonify({'message': f'Too many files - maximum is {MAX_BATCH_UPLOAD_FILES} per request'}), 400
+    
+    if not S3_BUCKET_NAME:
+        return jsonify({'message': 'S3 bucket not configured'}), 500
+    
+    user_folder = get_user_folder_name(decoded_token)
+    if not user_folder:
+        return jsonify({'message': 'User identification not found in token'}), 400
+    
+    create_links = request.form.get('create_links', 'false').lower() == 'true'
+    print(f"Batch upload of {len(files)} files for user folder: {user_folder}")
+    
+    # Names that sanitize to the same key would race to overwrite each other,
+    # so only the first of them is uploaded and the rest are rejected
+    pending = []
+    seen_keys = set()
+    for file in files:
+        file_key = f"{user_folder}/{sanitize_filename(file.filename)}"
+        if file_key in seen_keys:
+            pending.append({'filename': file.filename, 'file_name': file_key, 'success': False,
+                            'error': 'Another file in this batch has the same name'})
+        else:
+            seen_keys.add(file_key)
+            pending.append(batch_upload_executor.submit(upload_batch_file, file, file_key, user_folder))
+    results = [item if isinstance(item, dict) else item.result() for item in pending]
+    
+    uploaded = [result for result in results if result['success']]
+    if create_links and uploaded:
+        expiration_seconds, tier = get_link_expiration(decoded_token)
+        base_url = get_short_url_base()
+        try:
+            # One transaction for every link, like /api/files/new-links
+            link_results = create_file_short_urls(S3_BUCKET_NAME, [result['file_name'] for result in uploaded],
+                                                  decoded_token.get('email', 'unknown'), expiration_seconds // 86400)
+            for result in uploaded:
+                short_code = link_results[result['file_name']]['short_code']
+                result['short_code'] = short_code
+                result['download_url'] = f"{base_url}/s/{short_code}"
+                result['expires_in_seconds'] = expiration_seconds
+        except Exception as e:
+            print(f"Error creating short URLs for batch upload: {e}")
+            for result in uploaded:
+                result['link_error'] = str(e)
+    
+    success_count = sum(1 for result in results if result['success'])
+    if success_count == len(results):
+        status_code = 200
+    elif success_count:
+        status_code = 207
+    else:
+        status_code = 500
+    
+    return jsonify({
+        'message': f'Uploaded {success_count} of {len(results)} files',
+        'results': results,
+        'success_count': success_count,
+        'failure_count': len(results) - success_count
+    }), status_code
+
 # --- UPDATED: This endpoint is protected and has tiered logic ---
 @app.route("/api/get-download-link", methods=['GET'])
 @token_required
@@ -392,36 +1161,13 @@ def get_download_link(decoded_token):
     print(f"Decoded file_name: {file_name}")
     
     # Determine expiration time based on user's group
-    user_groups = decoded_token.get('cognito:groups', [])
-    
-    if 'premium-tier' in user_groups or 'premium-trial' in user_groups:
-        expiration_seconds = 604800 # 7 days (S3 maximum)
-        tier = 'premium'
-    else: # Default to free tier
-        expiration_seconds = 259200  # 3 days
-        tier = 'free'
+    expiration_seconds, tier = get_link_expiration(decoded_token)
 
     try:
-        # Generate presigned URL first
-        presigned_url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': S3_BUCKET_NAME, 'Key': file_name},
-            ExpiresIn=expiration_seconds
-        )
+        # Generate presigned URL and create a short URL for it
+        short_url_result = create_download_short_url(decoded_token, file_name, expiration_seconds)
         print(f"Generated presigned URL for S3 key: {file_name}")
         
-        # Create short URL for the presigned URL
-        user_email = decoded_token.get('email', 'unknown')
-        filename = file_name.split('/')[-1] if '/' in file_name else file_name
-        
-        short_url_result = create_short_url(
-            full_url=presigned_url,
-            user_email=user_email,
-            file_key=file_name,
-            filename=filename,
-            expires_in_days=expiration_seconds // 86400  # Convert seconds to days
-        )
-        
         # Build short URL using CloudFront domain
         base_url = get_short_url_base()
         short_url = f"{base_url}/s/{short_url_result['short_code']}"
@@ -486,6 +1232,8 @@ def upgrade_tier(decoded_token):
         )
         print(f"Added user '{user_name}' to premium-tier group")
         
+        invalidate_trial_status(decoded_token.get('email'), decoded_token.get('sub'))
+        
         return jsonify({'message': 'User successfully upgraded to premium tier.'}), 200
 
     except Exception as e:
@@ -497,6 +1245,125 @@ def upgrade_tier(decoded_token):
 
 # --- NEW: Premium File Management Endpoints ---
 
+# --- Conditional GET for listings ---
+# Listings carry an ETag hashed from what they are built from, so a client
+# revalidating with If-None-Match gets a 304 without the JSON body being built.
+def get_listing_etag(*parts):
+    """Return a validator for a listing built from parts (rows, query parameters)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+def listing_response(etag, result=None):
+    """JSON response for a listing, or 304 Not Modified when result is None"""
+    if result is None:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(result)
+    response.set_etag(etag)
+    # Browsers keep the body and revalidate on every request; shared caches must not store it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
+
+# --- File listing pagination ---
+MAX_FILES_PAGE_SIZE = 1000
+
+def encode_files_cursor(cursor):
+    """Serialize a listing position into an opaque, URL-safe cursor"""
+    raw = json.dumps(cursor, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_files_cursor(cursor, sort):
+    """Parse a cursor from encode_files_cursor; raises ValueError if it is malformed or for another sort"""
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError('Malformed cursor')
+    if not isinstance(data, dict) or data.get('sort') != sort:
+        raise ValueError('Cursor does not match the requested sort')
+    if sort == 'name' and not isinstance(data.get('after'), str):
+        raise ValueError('Malformed cursor')
+    if sort == 'newest':
+        after = data.get('after')
+        if not (isinstance(after, list) and len(after) == 2
+                and isinstance(after[0], str) and isinstance(after[1], str)):
+            raise ValueError('Malformed cursor')
+    return data
+
+def list_user_objects_page(user_folder, page_size, sort, cursor):
+    """
+    Return (objects, next_cursor, total_count) for one page of a user's files
+    
+    Served from the file catalog, so no S3 calls are made once the user's
+    folder has been reconciled. Pages are keyset-based: the cursor stores the
+    (last_modified, Key) or Key of the last item returned and the catalog
+    reads the next page straight from its index, so a page costs the same
+    however many files the folder holds, and uploads and deletes between
+    requests do not shift later pages. total_count is only counted for the
+    first page (None afterwards). Without page_size the whole listing is
+    returned.
+    """
+    ensure_user_catalog(s3, S3_BUCKET_NAME, user_folder)
+    after = cursor['after'] if cursor else None
+    
+    if not page_size:
+        objects = list_catalog_page(user_folder, sort, after)
+        return objects, None, len(objects) if after is None else None
+    
+    # One extra item tells whether another page follows
+    objects = list_catalog_page(user_folder, sort, after, page_size + 1)
+    total_count = count_catalog_files(user_folder) if after is None else None
+    if len(objects) <= page_size:
+        return objects, None, total_count
+    
+    page = objects[:page_size]
+    next_cursor = encode_files_cursor({'sort': sort, 'after': catalog_position(page[-1], sort)})
+    return page, next_cursor, total_count
+
+def format_file_size(size_bytes):
+    """Format a file size in human-readable form"""
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    return f"{size_bytes / (1024 * 1024):.1f} MB"
+
+def format_file_entry(obj, user_folder, short_url_info):
+    """Build the JSON entry for one file from its catalog object and newest short URL"""
+    file_data = {
+        'key': obj['Key'],
+        'filename': obj['Key'].replace(f"{user_folder}/", ""),  # Remove folder prefix
+        'size_bytes': obj['Size'],
+        'size_display': format_file_size(obj['Size']),
+        'last_modified': obj['LastModified'].isoformat(),
+        'upload_date': obj['LastModified'].strftime('%b %d, %Y')
+    }
+    
+    # Add short URL information if available
+    if short_url_info:
+        file_data.update({
+            'short_code': short_url_info.get('short_code'),
+            'click_count': short_url_info.get('click_count', 0),
+            'url_created_at': short_url_info.get('created_at'),
+            'expires_at': short_url_info.get('expires_at'),
+            'expires_in_days': short_url_info.get('expires_in_days', 7)
+        })
+    else:
+        # No short URL exists for this file yet
+        file_data.update({
+            'short_code': None,
+            'click_count': 0,
+            'url_created_at': None,
+            'expires_at': None,
+            'expires_in_days': None
+        })
+    return file_data
+
 @app.route("/api/files", methods=['GET'])
 @token_required
 def list_user_files(decoded_token):
@@ -526,91 +1393,70 @@ def list_user_files(decoded_token):
         print(f"Traceback: {traceback.format_exc()}")
         return jsonify({'message': f'Error processing request: {str(e)}'}), 500
     
+    # Optional paging: page_size (1-1000), sort ('newest' or 'name') and the
+    # opaque cursor returned as next_cursor by the previous page
+    sort = request.args.get('sort', 'newest')
+    page_size = request.args.get('page_size')
+    try:
+        page_size = int(page_size) if page_size else None
+        if page_size is not None and not 1 <= page_size <= MAX_FILES_PAGE_SIZE:
+            raise ValueError
+    except ValueError:
+        return jsonify({'message': f'page_size must be between 1 and {MAX_FILES_PAGE_SIZE}'}), 400
+    if sort not in ('newest', 'name'):
+        return jsonify({'message': "sort must be 'newest' or 'name'"}), 400
+    try:
+        cursor = decode_files_cursor(request.args.get('cursor'), sort)
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    
     try:
-        print(f"Listing files for user folder: {user_folder}")
+        print(f"Listing files for user folder: {user_folder} (page_size={page_size}, sort={sort})")
         
-        # List S3 objects with metadata for the user's folder
-        response = s3.list_objects_v2(
-            Bucket=S3_BUCKET_NAME,
-            Prefix=f"{user_folder}/"
+        user_email = decoded_token.get('email', 'unknown')
+        # First use reconciles the folder, which logs changes; do it before the
+        # cursor is read so the first revalidation already matches
+        ensure_user_catalog(s3, S3_BUCKET_NAME, user_folder)
+        # Read before the listing, so changes made while it is built are not skipped
+        changes_cursor = get_change_cursor(user_folder)
+        
+        # Every file, link and click write advances the change cursor, and the
+        # next link expiry covers links lapsing without a write, so the
+        # validator needs no listing work
+        etag = get_listing_etag(
+            user_folder, user_email, sort, page_size, request.args.get('cursor'),
+            changes_cursor, get_next_link_expiry(user_email), get_store_id()
         )
-        print(f"S3 response received: {response.get('ResponseMetadata', {}).get('HTTPStatusCode')}")
+        if request.if_none_match.contains(etag):
+            print(f"Files for user {user_folder} not modified")
+            return listing_response(etag)
         
-        files = []
-        user_email = decoded_token.get('email', 'unknown')
+        objects, next_cursor, total_count = list_user_objects_page(user_folder, page_size, sort, cursor)
         
-        for obj in response.get('Contents', []):
-            # Skip the folder itself (empty key)
-            if obj['Key'] == f"{user_folder}/":
-                continue
-                
-            # Extract filename from S3 key (remove folder prefix)
-            filename = obj['Key'].replace(f"{user_folder}/", "")
-            
-            # Format file size in human-readable format
-            size_bytes = obj['Size']
-            if size_bytes < 1024:
-                size_display = f"{size_bytes} B"
-            elif size_bytes < 1024 * 1024:
-                size_display = f"{size_bytes / 1024:.1f} KB"
-            else:
-                size_display = f"{size_bytes / (1024 * 1024):.1f} MB"
-            
-            # Get short URL info for this file
-            short_url_info = None
-            try:
-                # Get user's URLs and find the one for this file
-                user_urls = get_user_urls(user_email, limit=1000)  # Get more URLs to find the right one
-                for url_data in user_urls:
-                    if url_data.get('file_key') == obj['Key']:
-                        short_url_info = url_data
-                        break
-            except Exception as url_error:
-                print(f"Error getting short URL info for {obj['Key']}: {url_error}")
-            
-            file_data = {
-                'key': obj['Key'],
-                'filename': filename,
-                'size_bytes': size_bytes,
-                'size_display': size_display,
-                'last_modified': obj['LastModified'].isoformat(),
-                'upload_date': obj['LastModified'].strftime('%b %d, %Y')
-            }
-            
-            # Add short URL information if available
-            if short_url_info:
-                file_data.update({
-                    'short_code': short_url_info.get('short_code'),
-                    'click_count': short_url_info.get('click_count', 0),
-                    'url_created_at': short_url_info.get('created_at'),
-                    'expires_at': short_url_info.get('expires_at'),
-                    'expires_in_days': short_url_info.get('expires_in_days', 7)
-                })
-            else:
-                # No short URL exists for this file yet
-                file_data.update({
-                    'short_code': None,
-                    'click_count': 0,
-                    'url_created_at': None,
-                    'expires_at': None,
-                    'expires_in_days': None
-                })
-            
-            files.append(file_data)
+        # Short URL info for every listed file, fetched with one query
+        try:
+            urls_by_file = get_user_urls_for_files(user_email, [obj['Key'] for obj in objects])
+        except Exception as url_error:
+            print(f"Error getting short URL info for {user_folder}: {url_error}")
+            urls_by_file = {}
         
-        # Sort files by last modified (newest first)
-        files.sort(key=lambda x: x['last_modified'], reverse=True)
+        files = [format_file_entry(obj, user_folder, urls_by_file.get(obj['Key'])) for obj in objects]
         
         result = {
             'files': files,
-            'total_count': len(files),
+            'count': len(files),
+            'total_count': total_count,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'changes_cursor': str(changes_cursor),  # Pass to /api/files/changes as since
             'user_folder': user_folder
         }
         
-        print(f"Found {len(files)} files for user {user_folder}")
-        print(f"Returning JSON response: {json.dumps(result, indent=2)}")
-        return jsonify(result)
+        print(f"Returning {len(files)} files for user {user_folder} (has_more={next_cursor is not None})")
+        return listing_response(etag, result)
         
+    except CatalogNotReadyError:
+        raise
     except Exception as e:
         print(f"Error listing files for user {user_folder}: {e}")
         import traceback
@@ -620,6 +1466,104 @@ def list_user_files(decoded_token):
         return jsonify(error_response), 500
 
 
+MAX_CHANGES_PER_SYNC = 1000  # Change log entries read per /api/files/changes call
+
+@app.route("/api/files/changes", methods=['GET'])
+@token_required
+def list_file_changes(decoded_token):
+    """
+    Return files and short links changed since a delta-sync cursor (Premium feature)
+    
+    since is the changes_cursor from /api/files or the next_cursor of a previous
+    call. Changed items are returned in their current state (files in the same
+    shape as /api/files), and items that no longer exist are listed as removed.
+    Returns 410 when the cursor is older than the retained change log, in which
+    case the client should reload /api/files.
+    
+    Links are returned from the state logged with each change, so every task
+    answers alike. The link table itself is still per task, so link info on
+    files whose link did not change comes from this task's copy.
+    """
+    user_groups = decoded_token.get('cognito:groups', [])
+    if 'premium-tier' not in user_groups and 'premium-trial' not in user_groups:
+        return jsonify({'message': 'Premium feature - please upgrade your account'}), 403
+    
+    user_folder = get_user_folder_name(decoded_token)
+    if not user_folder:
+        return jsonify({'message': 'User identification not found in token'}), 400
+    user_email = decoded_token.get('email', 'unknown')
+    
+    try:
+        since = int(request.args.get('since', ''))
+        if since < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'message': 'since must be a cursor returned by /api/files'}), 400
+    
+    try:
+        changes = get_changes_since(user_folder, since, MAX_CHANGES_PER_SYNC + 1)
+        # Checked after the read, so entries pruned in between cannot be missed
+        if since < get_change_log_pruned_through(user_folder):
+            return jsonify({'message': 'Cursor has expired - reload the file list', 'reset': True}), 410
+        has_more = len(changes) > MAX_CHANGES_PER_SYNC
+        changes = changes[:MAX_CHANGES_PER_SYNC]
+        next_cursor = changes[-1]['seq'] if changes else since
+        
+        # Link upserts carry the link's state, so links are resolved from the
+        # shared log rather than this task's own link table
+        latest_link_changes = {}
+        for change in changes:
+            if change['item_type'] == 'link':
+                latest_link_changes[change['item_key']] = change
+        now = datetime.utcnow()
+        base_url = request.host_url.rstrip('/')
+        links = []
+        removed_links = []
+        for short_code, change in latest_link_changes.items():
+            url = change.get('payload')
+            if change['change'] != 'upsert' or not url or \
+                    (url['expires_at'] and datetime.fromisoformat(url['expires_at']) <= now):
+                removed_links.append(short_code)
+                continue
+            url = dict(url, short_url=f"{base_url}/s/{short_code}")
+            links.append(url)
+        
+        # Files that changed, plus files whose link info changed
+        changed_keys = [change['item_key'] for change in changes if change['item_type'] == 'file']
+        changed_keys.extend(url['file_key'] for url in links if url['file_key'])
+        changed_keys = list(dict.fromkeys(key for key in changed_keys if key.startswith(f"{user_folder}/")))
+        
+        objects = []
+        removed_files = []
+        for file_key in changed_keys:
+            obj = get_catalog_file(file_key)
+            if obj:
+                objects.append(obj)
+            else:
+                removed_files.append(file_key)
+        
+        # The local link table only backs files whose link did not change here;
+        # it is per task until links move to a shared store
+        urls_by_file = get_user_urls_for_files(user_email, [obj['Key'] for obj in objects])
+        for url in sorted(links, key=lambda url: url['created_at'] or ''):
+            if url['file_key']:
+                urls_by_file[url['file_key']] = url
+        files = [format_file_entry(obj, user_folder, urls_by_file.get(obj['Key'])) for obj in objects]
+        
+        print(f"Returning {len(changes)} changes since {since} for user {user_folder}")
+        return jsonify({
+            'files': files,
+            'removed_files': removed_files,
+            'links': links,
+            'removed_links': removed_links,
+            'next_cursor': str(next_cursor),
+            'has_more': has_more
+        })
+        
+    except Exception as e:
+        print(f"Error listing changes for user {user_folder}: {e}")
+        return jsonify({'message': f'Error retrieving changes: {str(e)}'}), 500
+
 @app.route("/api/files/new-link", methods=['POST'])
 @token_required  
 def generate_new_download_link(decoded_token):
@@ -656,33 +1600,18 @@ def generate_new_download_link(decoded_token):
     try:
         print(f"Generating new link for file: {file_key}")
         
-        # Check if file exists in S3
-        s3.head_object(Bucket=S3_BUCKET_NAME, Key=file_key)
+        # Check if file exists (file catalog, no S3 call)
+        ensure_user_catalog(s3, S3_BUCKET_NAME, user_folder)
+        if not get_catalog_file(file_key):
+            return jsonify({'message': 'File not found'}), 404
         
         # Use user-specified expiration days (1-7 days for Premium)
         expiration_seconds = expiration_days * 86400  # Convert days to seconds
         tier = 'premium'
         
-        print(f"Generating presigned URL with {expiration_days} days ({expiration_seconds} seconds) expiration")
-        
-        # Generate new presigned URL
-        presigned_url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': S3_BUCKET_NAME, 'Key': file_key},
-            ExpiresIn=expiration_seconds
-        )
+        print(f"Creating download link with {expiration_days} days ({expiration_seconds} seconds) expiration")
         
-        # Create short URL for the presigned URL
-        user_email = decoded_token.get('email', 'unknown')
-        filename = file_key.split('/')[-1] if '/' in file_key else file_key
-        
-        short_url_result = create_short_url(
-            full_url=presigned_url,
-            user_email=user_email,
-            file_key=file_key,
-            filename=filename,
-            expires_in_days=expiration_days  # Use user-specified days
-        )
+        short_url_result = create_download_short_url(decoded_token, file_key, expiration_seconds)
         
         # Build short URL using CloudFront domain
         base_url = get_short_url_base()
@@ -699,13 +1628,110 @@ def generate_new_download_link(decoded_token):
             'message': 'New short download URL created'
         })
         
-    except s3.exceptions.NoSuchKey:
-        return jsonify({'message': 'File not found'}), 404
+    except CatalogNotReadyError:
+        raise
     except Exception as e:
         print(f"Error generating new link for {file_key}: {e}")
         return jsonify({'message': f'Error generating download link: {e}'}), 500
 
 
+MAX_BULK_LINK_FILES = int(os.environ.get('MAX_BULK_LINK_FILES', 200))
+
+def find_existing_user_keys(user_folder, file_keys):
+    """Return which of file_keys exist in a user's folder, looking up only those keys"""
+    ensure_user_catalog(s3, S3_BUCKET_NAME, user_folder)
+    return set(get_catalog_files(user_folder, file_keys))
+
+@app.route("/api/files/new-links", methods=['POST'])
+@token_required
+def generate_new_download_links(decoded_token):
+    """
+    Generate download links for many files at once (Premium feature)
+    
+    Takes {'file_keys': [...], 'expiration_days': 1-7}. Ownership is checked
+    against the user's folder, existence against the file catalog, and all
+    links are created in a single database transaction. Returns one result per
+    file; 207 on partial success.
+    """
+    user_groups = decoded_token.get('cognito:groups', [])
+    if 'premium-tier' not in user_groups and 'premium-trial' not in user_groups:
+        return jsonify({'message': 'Premium feature - please upgrade your account'}), 403
+    
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('file_keys'), list) or not data['file_keys']:
+        return jsonify({'message': 'Missing file_keys parameter'}), 400
+    if not all(isinstance(file_key, str) for file_key in data['file_keys']):
+        return jsonify({'message': 'file_keys must be a list of strings'}), 400
+    
+    file_keys = list(dict.fromkeys(data['file_keys']))
+    if len(file_keys) > MAX_BULK_LINK_FILES:
+        return jsonify({'message': f'Too many files - maximum is {MAX_BULK_LINK_FILES} per request'}), 400
+    
+    # Same expiration rules as /api/files/new-link
+    expiration_days = data.get('expiration_days', 3)
+    try:
+        expiration_days = int(expiration_days)
+        if expiration_days < 1 or expiration_days > 7:
+            expiration_days = 3
+    except (ValueError, TypeError):
+        expiration_days = 3
+    expiration_seconds = expiration_days * 86400
+    
+    user_folder = get_user_folder_name(decoded_token)
+    user_email = decoded_token.get('email', 'unknown')
+    print(f"Bulk link request: {len(file_keys)} files, expiration_days={expiration_days}")
+    
+    try:
+        existing_keys = find_existing_user_keys(user_folder, file_keys)
+        
+        results = {}
+        linkable_keys = []
+        for file_key in file_keys:
+            if not file_key.startswith(f"{user_folder}/"):
+                results[file_key] = {'file_key': file_key, 'success': False,
+                                     'error': 'Access denied - file does not belong to user'}
+            elif file_key not in existing_keys:
+                results[file_key] = {'file_key': file_key, 'success': False, 'error': 'File not found'}
+            else:
+                linkable_keys.append(file_key)
+        
+        if linkable_keys:
+            base_url = get_short_url_base()
+            link_results = create_file_short_urls(S3_BUCKET_NAME, linkable_keys, user_email, expiration_days)
+            for file_key, link_result in link_results.items():
+                results[file_key] = {
+                    'file_key': file_key,
+                    'success': True,
+                    'download_url': f"{base_url}/s/{link_result['short_code']}",
+                    'short_code': link_result['short_code'],
+                    'created': link_result['created'],
+                    'expires_in_seconds': expiration_seconds,
+                    'expires_in_days': expiration_days
+                }
+    except CatalogNotReadyError:
+        raise
+    except Exception as e:
+        print(f"Error generating bulk links: {e}")
+        return jsonify({'message': f'Error generating download links: {e}'}), 500
+    
+    ordered_results = [results[file_key] for file_key in file_keys]
+    success_count = len(linkable_keys)
+    if success_count == len(ordered_results):
+        status_code = 200
+    elif success_count:
+        status_code = 207
+    else:
+        status_code = 400
+    
+    return jsonify({
+        'message': f'Created links for {success_count} of {len(ordered_results)} files',
+        'results': ordered_results,
+        'success_count': success_count,
+        'failure_count': len(ordered_results) - success_count,
+        'tier': 'premium'
+    }), status_code
+
+
 @app.route("/api/files/<path:file_key>", methods=['DELETE'])
 @token_required
 def delete_user_file(decoded_token, file_key):
@@ -725,25 +1751,140 @@ def delete_user_file(decoded_token, file_key):
     try:
         print(f"Deleting file: {file_key}")
         
-        # Check if file exists before trying to delete
-        s3.head_object(Bucket=S3_BUCKET_NAME, Key=file_key)
+        # Check if file exists before trying to delete (file catalog, no S3 call)
+        ensure_user_catalog(s3, S3_BUCKET_NAME, user_folder)
+        if not get_catalog_file(file_key):
+            return jsonify({'message': 'File not found'}), 404
         
         # Delete the file from S3
         s3.delete_object(Bucket=S3_BUCKET_NAME, Key=file_key)
+        delete_file_hash(file_key)
+        remove_catalog_file(file_key)
+        deleted_codes = delete_file_links([file_key])
         
         print(f"Successfully deleted file: {file_key}")
         return jsonify({
             'message': 'File successfully deleted',
-            'deleted_file': file_key
+            'deleted_file': file_key,
+            'deleted_links': len(deleted_codes)
         })
         
-    except s3.exceptions.NoSuchKey:
-        return jsonify({'message': 'File not found'}), 404
+    except CatalogNotReadyError:
+        raise
     except Exception as e:
         print(f"Error deleting file {file_key}: {e}")
         return jsonify({'message': f'Error deleting file: {e}'}), 500
 
 
+MAX_BULK_DELETE_FILES = int(os.environ.get('MAX_BULK_DELETE_FILES', 5000))
+S3_DELETE_BATCH_SIZE = 1000  # Keys per DeleteObjects call (S3 maximum)
+
+def delete_file_links(file_keys):
+    """Delete the short links of deleted files and purge their cached redirects"""
+    deleted_codes = delete_file_short_urls(file_keys)
+    for short_code in deleted_codes:
+        queue_redirect_invalidation(short_code)
+    return deleted_codes
+
+@app.route("/api/files/delete", methods=['POST'])
+@token_required
+def delete_user_files(decoded_token):
+    """
+    Delete many files at once (Premium feature)
+
+    Takes {'file_keys': [...]}. Ownership is checked against the user's folder
+    and existence against the file catalog; objects are removed with
+    DeleteObjects, 1000 keys per call, and the short links of every deleted
+    file are removed in a single database transaction. Returns one result per
+    file; 207 on partial success.
+    """
+    user_groups = decoded_token.get('cognito:groups', [])
+    if 'premium-tier' not in user_groups and 'premium-trial' not in user_groups:
+        return jsonify({'message': 'Premium feature - please upgrade your account'}), 403
+
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('file_keys'), list) or not data['file_keys']:
+        return jsonify({'message': 'Missing file_keys parameter'}), 400
+    if not all(isinstance(file_key, str) for file_key in data['file_keys']):
+        return jsonify({'message': 'file_keys must be a list of strings'}), 400
+
+    file_keys = list(dict.fromkeys(data['file_keys']))
+    if len(file_keys) > MAX_BULK_DELETE_FILES:
+        return jsonify({'message': f'Too many files - maximum is {MAX_BULK_DELETE_FILES} per request'}), 400
+
+    user_folder = get_user_folder_name(decoded_token)
+    print(f"Bulk delete request: {len(file_keys)} files")
+
+    results = {}
+    deleted_keys = []
+    try:
+        existing_keys = find_existing_user_keys(user_folder, file_keys)
+
+        deletable_keys = []
+        for file_key in file_keys:
+            if not file_key.startswith(f"{user_folder}/"):
+                results[file_key] = {'file_key': file_key, 'success': False,
+                                     'error': 'Access denied - file does not belong to user'}
+            elif file_key not in existing_keys:
+                results[file_key] = {'file_key': file_key, 'success': False, 'error': 'File not found'}
+            else:
+                deletable_keys.append(file_key)
+
+        for start in range(0, len(deletable_keys), S3_DELETE_BATCH_SIZE):
+            batch = deletable_keys[start:start + S3_DELETE_BATCH_SIZE]
+            try:
+                # Quiet mode: only the keys that failed are listed in the response
+                response = s3.delete_objects(
+                    Bucket=S3_BUCKET_NAME,
+                    Delete={'Objects': [{'Key': file_key} for file_key in batch], 'Quiet': True}
+                )
+            except ClientError as e:
+                print(f"Error deleting batch of {len(batch)} files: {e}")
+                for file_key in batch:
+                    results[file_key] = {'file_key': file_key, 'success': False, 'error': f'Error deleting file: {e}'}
+                continue
+
+            for error in response.get('Errors', []):
+                results[error['Key']] = {'file_key': error['Key'], 'success': False,
+                                         'error': f"Error deleting file: {error.get('Code')} {error.get('Message', '')}".strip()}
+            for file_key in batch:
+                if file_key not in results:
+                    results[file_key] = {'file_key': file_key, 'success': True}
+                    deleted_keys.append(file_key)
+    except CatalogNotReadyError:
+        raise
+    except Exception as e:
+        print(f"Error deleting files: {e}")
+        if not deleted_keys:
+            return jsonify({'message': f'Error deleting files: {e}'}), 500
+        for file_key in file_keys:
+            results.setdefault(file_key, {'file_key': file_key, 'success': False, 'error': f'Error deleting file: {e}'})
+
+    deleted_links = 0
+    if deleted_keys:
+        delete_file_hashes(deleted_keys)
+        remove_catalog_files(deleted_keys)
+        deleted_links = len(delete_file_links(deleted_keys))
+
+    ordered_results = [results[file_key] for file_key in file_keys]
+    success_count = len(deleted_keys)
+    if success_count == len(ordered_results):
+        status_code = 200
+    elif success_count:
+        status_code = 207
+    else:
+        status_code = 400
+
+    print(f"Bulk delete: {success_count} of {len(ordered_results)} files deleted, {deleted_links} links removed")
+    return jsonify({
+        'message': f'Deleted {success_count} of {len(ordered_results)} files',
+        'results': ordered_results,
+        'success_count': success_count,
+        'failure_count': len(ordered_results) - success_count,
+        'deleted_links': deleted_links
+    }), status_code
+
+
 # ========================================
 # URL Shortener Endpoints
 # ========================================
@@ -786,10 +1927,32 @@ def shorten_url(decoded_token):
             'message': result['message']
         })
         
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         print(f"Error creating short URL: {e}")
         return jsonify({'message': f'Error creating short URL: {e}'}), 500
 
+# Redirects are cacheable at the CDN for at most this long (never past the link's expiry)
+REDIRECT_CACHE_MAX_AGE = int(os.environ.get('REDIRECT_CACHE_MAX_AGE', 3600))
+# Serve 301s for links that never change (no expiry, not presigned on click)
+PERMANENT_REDIRECTS = os.environ.get('PERMANENT_REDIRECTS', 'false').lower() == 'true'
+
+def get_redirect_max_age(result, signed_on_click):
+    """Seconds a redirect may be cached: capped by the link expiry and, for file links, the signature TTL"""
+    max_age = REDIRECT_CACHE_MAX_AGE
+    if signed_on_click:
+        # Leave the client time to follow the presigned URL after a CDN hit
+        max_age = min(max_age, LINK_PRESIGN_TTL // 2)
+    
+    try:
+        expires_at = get_expiry_timestamp(result.get('expires_at'))
+    except (TypeError, ValueError):
+        return 0
+    if expires_at is not None:
+        max_age = min(max_age, int(expires_at - time.time()))
+    return max(0, max_age)
+
 @app.route('/s/<short_code>')
 def redirect_short_url(short_code):
     """Redirect short URL to full URL"""
@@ -797,16 +1960,46 @@ def redirect_short_url(short_code):
         result = get_full_url(short_code)
         
         if not result:
-            return jsonify({
+            response = jsonify({
                 'message': 'Short URL not found or expired',
                 'error': 'NOT_FOUND'
-            }), 404
+            })
+            response.headers['Cache-Control'] = 'no-store'
+            return response, 404
             
         # Log the redirect for analytics
         print(f"Redirecting {short_code} to {result['full_url']} (click #{result['click_count']})")
         
-        # Redirect to the full URL
-        return redirect(result['full_url'])
+        target_url = result['full_url']
+        s3_link = parse_s3_link(target_url)
+        if s3_link:
+            bucket, file_key = s3_link
+            if bucket != S3_BUCKET_NAME:
+                response = jsonify({
+                    'message': 'Short URL not found or expired',
+                    'error': 'NOT_FOUND'
+                })
+                response.headers['Cache-Control'] = 'no-store'
+                return response, 404
+            # Sign on click; the signature only has to outlive the start of the download
+            target_url = s3.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': bucket, 'Key': file_key},
+                ExpiresIn=LINK_PRESIGN_TTL
+            )
+        
+        # Redirect to the full URL. Only the CDN caches it (s-maxage), so a
+        # deleted link can still be purged; browsers always come back.
+        max_age = get_redirect_max_age(result, signed_on_click=bool(s3_link))
+        immutable = PERMANENT_REDIRECTS and not s3_link and not result.get('expires_at')
+        response = redirect(target_url, code=301 if immutable else 302)
+        if immutable:
+            response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        elif max_age > 0:
+            response.headers['Cache-Control'] = f'public, max-age=0, s-maxage={max_age}'
+        else:
+            response.headers['Cache-Control'] = 'no-store'
+        return response
         
     except Exception as e:
         print(f"Error redirecting short URL {short_code}: {e}")
@@ -819,15 +2012,24 @@ def list_short_urls(decoded_token):
     try:
         user_email = decoded_token.get('email', 'unknown')
         limit = int(request.args.get('limit', 100))
+        base_url = request.host_url.rstrip('/')
+        
+        # Every link write is logged and lapsed links move the next expiry, so the
+        # validator is known before the query; link rows are per database
+        etag = get_listing_etag(
+            user_email, base_url, limit, get_change_cursor(user_email),
+            get_next_link_expiry(user_email), get_store_id()
+        )
+        if request.if_none_match.contains(etag):
+            return listing_response(etag)
         
         urls = get_user_urls(user_email, limit)
         
         # Add full short URLs
-        base_url = request.host_url.rstrip('/')
         for url in urls:
             url['short_url'] = f"{base_url}/s/{url['short_code']}"
         
-        return jsonify({
+        return listing_response(etag, {
             'urls': urls,
             'count': len(urls)
         })
@@ -846,6 +2048,7 @@ def delete_short_url_endpoint(decoded_token, short_code):
         deleted = delete_short_url(short_code, user_email)
         
         if deleted:
+            queue_redirect_invalidation(short_code)
             return jsonify({
                 'message': 'Short URL deleted successfully',
                 'short_code': short_code
@@ -1015,11 +2218,19 @@ def health_check():
             'jwks_url': JWKS_URL
         }
         
-        # Test JWKS client availability
+        # Report JWKS key registry state (does not fetch keys)
         try:
-            client = get_or_initialize_jwks_client()
-            jwt_details['jwks_client_available'] = client is not None
-            jwt_details['jwks_cache_available'] = jwks_data_cache is not None
+            registry = get_jwks_key_registry()
+            jwt_details['jwks_client_available'] = registry is not None
+            jwt_details['jwks_cache_available'] = bool(registry and registry.keys)
+            if registry:
+                jwt_details['jwks_key_count'] = len(registry.keys)
+                jwt_details['jwks_last_refresh'] = registry.last_refresh
+                jwt_details['jwks_last_error'] = registry.last_error
+                jwt_details['jwks_fetch_count'] = registry.fetch_count
+                jwt_details['jwks_coalesced_waiters'] = registry.coalesced_waiters
+            jwt_details['verified_token_cache'] = get_verified_token_cache_stats()
+            jwt_details['failed_token_cache'] = get_failed_token_cache_stats()
         except Exception as e:
             jwt_details['jwks_client_available'] = False
             jwt_details['jwks_error'] = str(e)
@@ -1036,7 +2247,11 @@ def health_check():
         'timestamp': datetime.now().isoformat(),
         'version': 'v0.7.1-jwt-fix',
         'jwt_status': jwt_status,
-        'jwt_details': jwt_details
+        'jwt_details': jwt_details,
+        'trial_status_cache': get_trial_status_cache_stats(),
+        'redirect_cache': get_redirect_cache_stats(),
+        'click_counter': get_click_counter_stats(),
+        'cdn_invalidation': get_cdn_invalidation_stats()
     })
 
 @app.route('/api/debug/test-imports', methods=['GET'])
@@ -1219,6 +2434,14 @@ def internal_error(error):
     """Handle 500 errors with JSON response"""
     return jsonify({'message': 'Internal server error occurred'}), 500
 
+@app.errorhandler(CatalogNotReadyError)
+def catalog_not_ready(error):
+    """A user's first request is still cataloguing their folder; ask the client to retry"""
+    response = jsonify({'message': 'Your files are still being indexed - please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '2'
+    return response
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     """Handle all other exceptions with JSON response"""
@@ -1318,12 +2541,9 @@ def test_fallback():
 def check_db_tables():
     """Check if database tables exist"""
     try:
-        import sqlite3
-        import os
-        
-        db_path = os.path.join(os.path.dirname(__file__), 'url_shortener.db')
+        from database import get_db_connection, DB_PATH as db_path
         
-        with sqlite3.connect(db_path) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Check if tables exist
@@ -1370,5 +2590,46 @@ def cleanup_expired_urls_endpoint():
             'deleted_count': 0
         }), 500
 
+# Uploads younger than this are never aborted, whatever the caller asks for
+MIN_STALE_UPLOAD_AGE_HOURS = int(os.environ.get('MIN_STALE_UPLOAD_AGE_HOURS', 24))
+
+@app.route('/api/admin/cleanup-stale-uploads', methods=['POST'])
+@admin_required
+def cleanup_stale_uploads_endpoint():
+    """Administrative endpoint for aborting stale multipart uploads - should be called by scheduled tasks"""
+    try:
+        max_age_hours = int(request.args.get('max_age_hours', MIN_STALE_UPLOAD_AGE_HOURS))
+    except ValueError:
+        return jsonify({'message': 'Invalid max_age_hours parameter', 'aborted_count': 0}), 400
+    max_age_hours = max(max_age_hours, MIN_STALE_UPLOAD_AGE_HOURS)
+    
+    try:
+        aborted_count = abort_stale_multipart_uploads(s3, S3_BUCKET_NAME, max_age_hours)
+        return jsonify({
+            'message': 'Stale upload cleanup completed successfully',
+            'aborted_count': aborted_count,
+            'max_age_hours': max_age_hours
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'message': f'Stale upload cleanup failed: {str(e)}',
+            'aborted_count': 0
+        }), 500
+
+@app.route('/api/admin/reconcile-file-catalog', methods=['POST'])
+@admin_required
+def reconcile_file_catalog_endpoint():
+    """Administrative endpoint for syncing the file catalog with S3 - should be called by scheduled tasks"""
+    try:
+        result = reconcile_file_catalog(s3, S3_BUCKET_NAME)
+        return jsonify({
+            'message': 'File catalog reconciliation completed successfully',
+            **result
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'message': f'File catalog reconciliation failed: {str(e)}'
+        }), 500
+
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=5000)
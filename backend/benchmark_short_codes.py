@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark short URL creation against a large url_mappings table
+
+Compares the old random-code + SELECT probing approach with the leased-block
+allocator. Runs against a scratch database, never the application's own.
+
+Usage:
+    python benchmark_short_codes.py [--rows 10000000] [--creates 5000] [--db /tmp/bench.db] [--no-sync]
+
+Each create commits on its own, as the app does, so results are usually bound by
+fsync; --no-sync turns synchronous off to show the cost of code selection itself.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Imported in main() once SQLITE_DB_PATH points at the scratch database, since
+# database creates its tables on import
+database = None
+short_code_allocator = None
+generate_short_code = None
+
+def fill_table(db_path, rows):
+    """Fill url_mappings with rows using old-style random 6-character codes"""
+    with sqlite3.connect(db_path) as conn:
+        existing = conn.execute('SELECT COUNT(*) FROM url_mappings').fetchone()[0]
+        if existing >= rows:
+            print(f"Reusing {existing:,} existing rows")
+            return
+        print(f"Inserting {rows - existing:,} rows...")
+        started = time.time()
+        batch = []
+        for i in range(existing, rows):
+            batch.append((generate_short_code(), f"https://example.com/file/{i}", 'bench@example.com'))
+            if len(batch) == 100000:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO url_mappings (short_code, full_url, created_by_user) VALUES (?, ?, ?)',
+                    batch
+                )
+                conn.commit()
+                batch = []
+        if batch:
+            conn.executemany(
+                'INSERT OR IGNORE INTO url_mappings (short_code, full_url, created_by_user) VALUES (?, ?, ?)',
+                batch
+            )
+            conn.commit()
+        print(f"Filled table in {time.time() - started:.1f}s")
+
+def create_with_probing(conn):
+    for attempt in range(10):
+        short_code = generate_short_code()
+        if not conn.execute('SELECT 1 FROM url_mappings WHERE short_code = ?', (short_code,)).fetchone():
+            break
+    conn.execute(
+        'INSERT INTO url_mappings (short_code, full_url, created_by_user) VALUES (?, ?, ?)',
+        (short_code, 'https://example.com/new', 'bench@example.com')
+    )
+    conn.commit()
+
+def create_with_allocator(conn):
+    short_code = short_code_allocator.allocate_short_code()
+    try:
+        conn.execute(
+            'INSERT INTO url_mappings (short_code, full_url, created_by_user) VALUES (?, ?, ?)',
+            (short_code, 'https://example.com/new', 'bench@example.com')
+        )
+    except sqlite3.IntegrityError:
+        # Only possible against codes left by the random generator
+        return create_with_allocator(conn)
+    conn.commit()
+
+def run(label, create, db_path, creates, no_sync=False):
+    with sqlite3.connect(db_path) as conn:
+        if no_sync:
+            conn.execute('PRAGMA synchronous = OFF')
+        started = time.perf_counter()
+        for _ in range(creates):
+            create(conn)
+        elapsed = time.perf_counter() - started
+    print(f"{label:<28} {creates / elapsed:>10,.0f} creates/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--creates', type=int, default=5000)
+    parser.add_argument('--db', default='/tmp/short_code_benchmark.db')
+    parser.add_argument('--no-sync', action='store_true', help='disable fsync on the benchmark connections')
+    args = parser.parse_args()
+
+    global database, short_code_allocator, generate_short_code
+    os.environ['SQLITE_DB_PATH'] = args.db
+    import database
+    import short_code_allocator
+    from url_shortener import generate_short_code
+
+    database.init_database()
+    fill_table(args.db, args.rows)
+
+    started = time.perf_counter()
+    codes = short_code_allocator.allocate_short_codes(args.creates)
+    elapsed = time.perf_counter() - started
+    print(f"{'allocator only (no insert)':<28} {len(codes) / elapsed:>10,.0f} codes/s")
+
+    run('random code + SELECT probe', create_with_probing, args.db, args.creates, args.no_sync)
+    run('leased-block allocator', create_with_allocator, args.db, args.creates, args.no_sync)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
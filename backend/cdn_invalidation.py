@@ -0,0 +1,131 @@
+"""
+Batched CloudFront invalidations for cached short URL redirects
+"""
+import os
+import atexit
+import threading
+import time
+import uuid
+import logging
+import boto3
+
+logger = logging.getLogger(__name__)
+
+CLOUDFRONT_DISTRIBUTION_ID = os.getenv('CLOUDFRONT_DISTRIBUTION_ID', '')
+CDN_INVALIDATION_INTERVAL = float(os.getenv('CDN_INVALIDATION_INTERVAL', 30))  # seconds
+CDN_INVALIDATION_BATCH_SIZE = 1000  # Paths per CreateInvalidation call
+
+class LocalInvalidationClient:
+    """
+    Stand-in for the CloudFront client when no distribution is configured
+
+    Accepts the same create_invalidation call and keeps the batches in memory
+    so local runs and tests can see what would have been purged.
+    """
+
+    def __init__(self):
+        self.invalidations = []
+
+    def create_invalidation(self, DistributionId, InvalidationBatch):
+        paths = list(InvalidationBatch['Paths']['Items'])
+        invalidation_id = f"LOCAL{len(self.invalidations) + 1}"
+        self.invalidations.append({'Id': invalidation_id, 'DistributionId': DistributionId, 'Paths': paths})
+        logger.info(f"[local CDN] invalidation {invalidation_id}: {len(paths)} paths")
+        return {'Invalidation': {'Id': invalidation_id, 'Status': 'Completed'}}
+
+class InvalidationQueue:
+    """Collects paths to purge and sends them in batches from a background thread"""
+
+    def __init__(self, client=None, distribution_id=CLOUDFRONT_DISTRIBUTION_ID,
+                 interval=CDN_INVALIDATION_INTERVAL, batch_size=CDN_INVALIDATION_BATCH_SIZE):
+        self.client = client
+        self.distribution_id = distribution_id
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._paths = set()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.stats = {'queued': 0, 'invalidated': 0, 'batches': 0, 'errors': 0}
+
+    def queue(self, path):
+        """Schedule a path (e.g. /s/abc123) for invalidation"""
+        with self._lock:
+            if path not in self._paths:
+                self._paths.add(path)
+                self.stats['queued'] += 1
+            if len(self._paths) >= self.batch_size:
+                self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cdn-invalidation', daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Send all queued paths now; returns the number of paths invalidated"""
+        with self._lock:
+            paths = sorted(self._paths)
+            self._paths.clear()
+        if not paths:
+            return 0
+
+        client = self._get_client()
+        sent = 0
+        for start in range(0, len(paths), self.batch_size):
+            batch = paths[start:start + self.batch_size]
+            try:
+                client.create_invalidation(
+                    DistributionId=self.distribution_id or 'local',
+                    InvalidationBatch={
+                        'Paths': {'Quantity': len(batch), 'Items': batch},
+                        'CallerReference': f"{int(time.time())}-{uuid.uuid4().hex}"
+                    }
+                )
+                sent += len(batch)
+                with self._lock:
+                    self.stats['batches'] += 1
+                    self.stats['invalidated'] += len(batch)
+            except Exception as e:
+                logger.error(f"CloudFront invalidation of {len(batch)} paths failed, will retry: {e}")
+                with self._lock:
+                    self._paths.update(batch)
+                    self.stats['errors'] += 1
+        return sent
+
+    def get_stats(self):
+        """Queue counters, including paths still waiting for the next batch"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending'] = len(self._paths)
+        stats['distribution_id'] = self.distribution_id or 'local'
+        stats['interval_seconds'] = self.interval
+        return stats
+
+    def _get_client(self):
+        if self.client is None:
+            if self.distribution_id:
+                self.client = boto3.client('cloudfront')
+            else:
+                self.client = LocalInvalidationClient()
+        return self.client
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"CDN invalidation worker error: {e}")
+
+invalidation_queue = InvalidationQueue()
+
+def queue_redirect_invalidation(short_code):
+    """Purge the cached /s/<short_code> redirect at the CDN with the next batch"""
+    invalidation_queue.queue(f"/s/{short_code}")
+
+def get_cdn_invalidation_stats():
+    """Stats for the process-wide invalidation queue"""
+    return invalidation_queue.get_stats()
+
+# Send whatever is still queued when the worker shuts down
+atexit.register(invalidation_queue.flush)
@@ -0,0 +1,92 @@
+"""
+Change log for delta-sync clients
+
+Every file and short link write appends (user_key, item_type, item_key,
+change[, payload]) entries, which /api/files/changes reads back by seq. With
+DynamoDB the log is the shared changes table, where seqs are allocated per
+user, so a cursor minted by one task means the same thing to every other task
+behind the load balancer. SQLite keeps it in the local database for
+development.
+
+Logging failures are raised, never swallowed: the change cursor doubles as the
+/api/files ETag, so a write whose change went missing would otherwise keep
+serving stale 304s.
+"""
+import os
+
+# Determine which database to use
+USE_DYNAMODB = os.getenv('USE_DYNAMODB', 'false').lower() == 'true'
+
+if USE_DYNAMODB:
+    # Use DynamoDB for production
+    from dynamodb_adapter import db_adapter
+
+    def _record_in_transaction(changes, cursor):
+        # The shared log cannot join a SQLite transaction; written by _record_after_commit
+        pass
+
+    _record_after_commit = db_adapter.record_changes
+    _record = db_adapter.record_changes
+    _get_since = db_adapter.get_changes_since
+    _get_cursor = db_adapter.get_change_cursor
+    _get_pruned_through = db_adapter.get_change_log_pruned_through
+    _prune = db_adapter.prune_change_log
+
+else:
+    # Use SQLite for development
+    import database
+
+    def _record_after_commit(changes):
+        # Already written by _record_in_transaction
+        pass
+
+    _record_in_transaction = database.record_changes
+    _record = database.record_changes
+    _get_since = database.get_changes_since
+    _get_cursor = database.get_change_cursor
+    _get_pruned_through = database.get_change_log_pruned_through
+    _prune = database.prune_change_log
+
+def record_changes(changes, cursor=None):
+    """
+    Append (user_key, item_type, item_key, change[, payload]) entries to the change log
+
+    item_type is 'file' (item_key is the S3 key) or 'link' (the short code);
+    change is 'upsert' or 'delete'; link upserts carry the link's state as
+    payload. Callers inside a SQLite transaction pass its cursor and call
+    record_committed_changes with the same changes once it commits: SQLite
+    logs them atomically with the write, while the shared DynamoDB log is
+    written after the commit, so no reader sees a change before its data.
+    """
+    if not changes:
+        return
+    if cursor is not None:
+        _record_in_transaction(changes, cursor)
+    else:
+        _record(changes)
+
+def record_committed_changes(changes):
+    """Finish logging changes passed to record_changes with a transaction cursor"""
+    if changes:
+        _record_after_commit(changes)
+
+def get_changes_since(user_key, since_seq, limit):
+    """Return up to limit change log entries for a user with seq > since_seq, oldest first"""
+    return _get_since(user_key, since_seq, limit)
+
+def get_change_cursor(user_key):
+    """
+    Return the delta-sync cursor for a user's current state
+
+    That is the user's newest change log seq, raised to their watermark so a
+    quiet user's cursor does not look expired after old entries are pruned.
+    """
+    return _get_cursor(user_key)
+
+def get_change_log_pruned_through(user_key):
+    """Return the seq below which a user's cursors have expired (0 if none have)"""
+    return _get_pruned_through(user_key)
+
+def prune_change_log(retention_days):
+    """Delete change log entries older than retention_days; returns the number removed"""
+    return _prune(retention_days)
@@ -0,0 +1,144 @@
+"""
+Write-behind click counter for short URL redirects
+"""
+import os
+import atexit
+import threading
+import time
+import logging
+from database import get_db_connection, link_upsert_changes
+from change_log import record_changes, record_committed_changes
+from redirect_cache import add_cached_clicks
+
+logger = logging.getLogger(__name__)
+
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', 5))  # seconds
+CLICK_FLUSH_THRESHOLD = int(os.getenv('CLICK_FLUSH_THRESHOLD', 1000))  # pending clicks
+
+_lock = threading.Lock()
+_pending = {}  # short_code -> clicks not yet written
+_pending_total = 0
+_in_flight = {}  # short_code -> clicks being written by the current flush
+_flush_generation = 0  # Odd while a flush is running
+_flush_requested = threading.Event()
+_flush_lock = threading.Lock()  # One flush at a time
+_flusher_thread = None
+_stats = {'clicks_recorded': 0, 'clicks_flushed': 0, 'flushes': 0, 'flush_errors': 0, 'last_flush_ms': None}
+
+def record_click(short_code):
+    """
+    Count one click in memory; it is written by the next batched flush
+
+    Returns:
+        Clicks for this short code not yet in its stored count (as seen by
+        the redirect cache), including this one
+    """
+    global _pending_total
+    _ensure_flusher_started()
+    with _lock:
+        clicks = _pending.get(short_code, 0) + 1
+        _pending[short_code] = clicks
+        _pending_total += 1
+        _stats['clicks_recorded'] += 1
+        if _pending_total >= CLICK_FLUSH_THRESHOLD:
+            _flush_requested.set()
+        return clicks + _in_flight.get(short_code, 0)
+
+def flush_clicks():
+    """
+    Write all pending clicks to url_mappings in one transaction
+
+    Until the cached redirects have the new counts, the batch still counts as
+    pending, so a redirect never misses or repeats a click.
+
+    Returns:
+        Number of clicks written
+    """
+    global _pending_total, _flush_generation
+    with _flush_lock:
+        with _lock:
+            batch = list(_pending.items())
+            if not batch:
+                return 0
+            _in_flight.update(batch)
+            _pending.clear()
+            _pending_total = 0
+            _flush_generation += 1
+
+        started = time.perf_counter()
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    UPDATE url_mappings
+                    SET click_count = click_count + ?
+                    WHERE short_code = ?
+                ''', [(clicks, short_code) for short_code, clicks in batch])
+                # One change log entry per clicked link, so delta-sync clients see new counts
+                changes = link_upsert_changes(cursor, [short_code for short_code, _ in batch])
+                record_changes(changes, cursor)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to flush {len(batch)} click counts, will retry: {e}")
+            with _lock:
+                _in_flight.clear()
+                _flush_generation += 1
+                for short_code, clicks in batch:
+                    _pending[short_code] = _pending.get(short_code, 0) + clicks
+                    _pending_total += clicks
+                _stats['flush_errors'] += 1
+            return 0
+
+        flushed = sum(clicks for _, clicks in batch)
+        with _lock:
+            add_cached_clicks(_in_flight)
+            _in_flight.clear()
+            _flush_generation += 1
+            _stats['flushes'] += 1
+            _stats['clicks_flushed'] += flushed
+            _stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        logger.debug(f"Flushed {flushed} clicks for {len(batch)} short codes")
+        # Outside the retry above: the counts are written, and a retry would add them twice
+        record_committed_changes(changes)
+        return flushed
+
+def get_flush_generation():
+    """
+    Return a token that changes with every flush, or None while one is running
+
+    A stored click count read between two equal tokens matches what the
+    redirect cache expects, so only such reads may be cached.
+    """
+    with _lock:
+        return None if _flush_generation % 2 else _flush_generation
+
+def get_click_counter_stats():
+    """Counters for the write-behind click counter"""
+    with _lock:
+        stats = dict(_stats)
+        stats['pending_clicks'] = _pending_total
+        stats['pending_short_codes'] = len(_pending)
+    stats['flush_interval_seconds'] = CLICK_FLUSH_INTERVAL
+    stats['flush_threshold'] = CLICK_FLUSH_THRESHOLD
+    return stats
+
+def _flush_loop():
+    while True:
+        _flush_requested.wait(CLICK_FLUSH_INTERVAL)
+        _flush_requested.clear()
+        try:
+            flush_clicks()
+        except Exception as e:
+            logger.error(f"Click flusher error: {e}")
+
+def _ensure_flusher_started():
+    global _flusher_thread
+    if _flusher_thread is not None:
+        return
+    with _lock:
+        if _flusher_thread is None:
+            _flusher_thread = threading.Thread(target=_flush_loop, name='click-flusher', daemon=True)
+            _flusher_thread.start()
+
+# Write whatever is left when the worker shuts down
+atexit.register(flush_clicks)
@@ -0,0 +1,70 @@
+"""
+Content hashing for upload deduplication
+"""
+import hashlib
+import logging
+import os
+from tempfile import SpooledTemporaryFile
+from flask import Request
+
+logger = logging.getLogger(__name__)
+
+# Files up to this size stay in memory while the form is parsed (same as Werkzeug's default)
+SPOOL_MAX_MEMORY_SIZE = 500 * 1024
+
+# When enabled, identical content uploaded by another user is copied server-side
+# instead of being sent to S3 again
+DEDUPE_ACROSS_USERS = os.environ.get('DEDUPE_ACROSS_USERS', 'false').lower() == 'true'
+
+class HashingFileStream:
+    """
+    Spooled temporary file that hashes bytes as the form parser writes them
+
+    The digest is ready as soon as the request body has been parsed, so no
+    second pass over the upload is needed.
+    """
+
+    def __init__(self):
+        self._file = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_SIZE)
+        self._hash = hashlib.sha256()
+        self.size_bytes = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size_bytes += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+class HashingRequest(Request):
+    """Flask request that stores uploaded files in HashingFileStream containers"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFileStream()
+
+def get_upload_content_hash(file):
+    """
+    Return (sha256 hex digest, size in bytes) for an uploaded FileStorage
+
+    Uses the digest computed during parsing when available and falls back to
+    reading the stream once otherwise. The stream is left at position 0.
+    """
+    stream = file.stream
+    if isinstance(stream, HashingFileStream):
+        return stream.hexdigest(), stream.size_bytes
+
+    content_hash = hashlib.sha256()
+    size_bytes = 0
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        content_hash.update(chunk)
+        size_bytes += len(chunk)
+    stream.seek(0)
+    return content_hash.hexdigest(), size_bytes
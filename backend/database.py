@@ -3,13 +3,19 @@ Database setup and management for URL shortener
 """
 import sqlite3
 import os
+import json
+import secrets
+import uuid
+import atexit
+import threading
 import logging
 from contextlib import contextmanager
+from trial_status_cache import invalidate_trial_status, clear_trial_status_cache
 
 logger = logging.getLogger(__name__)
 
-# Database file path
-DB_PATH = os.path.join(os.path.dirname(__file__), 'url_shortener.db')
+# Database file path (SQLITE_DB_PATH points scripts and tests at a scratch database)
+DB_PATH = os.getenv('SQLITE_DB_PATH') or os.path.join(os.path.dirname(__file__), 'url_shortener.db')
 
 def init_database():
     """Initialize the database with required tables"""
@@ -52,6 +58,87 @@ def init_database():
             ''')
             logger.info("URL mappings table created successfully")
             
+            # Create file_hashes table (content hash index for upload dedupe)
+            logger.info("Creating file_hashes table...")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    file_key VARCHAR(255) PRIMARY KEY,
+                    content_hash CHAR(64) NOT NULL,
+                    user_email VARCHAR(255) NOT NULL,
+                    size_bytes INTEGER,
+                    etag VARCHAR(255),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            logger.info("File hashes table created successfully")
+            
+            # Create file_catalog table (per-user index of stored objects, mirrors S3)
+            logger.info("Creating file_catalog table...")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS file_catalog (
+                    file_key VARCHAR(1024) PRIMARY KEY,
+                    user_folder VARCHAR(255) NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    content_hash CHAR(64),
+                    etag VARCHAR(255),
+                    last_modified TIMESTAMP NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP NOT NULL
+                )
+            ''')
+            
+            # Users whose catalog has been reconciled against S3 at least once
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS file_catalog_sync (
+                    user_folder VARCHAR(255) PRIMARY KEY,
+                    reconciled_at TIMESTAMP NOT NULL
+                )
+            ''')
+            logger.info("File catalog tables created successfully")
+            
+            # Create change_log table (per-user file and link changes for delta sync);
+            # AUTOINCREMENT keeps seq strictly increasing, so it can serve as a sync cursor
+            logger.info("Creating change_log table...")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS change_log (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_key VARCHAR(255) NOT NULL,
+                    item_type VARCHAR(10) NOT NULL,
+                    item_key VARCHAR(1024) NOT NULL,
+                    change VARCHAR(10) NOT NULL,
+                    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    payload TEXT
+                )
+            ''')
+            
+            # Highest seq removed from change_log by pruning (single row)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS change_log_pruned (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    through_seq INTEGER NOT NULL
+                )
+            ''')
+            logger.info("Change log tables created successfully")
+            
+            # Identifies this database: link rows live only here, so listings built
+            # from them are validated per database (single row)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS store_info (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    store_id CHAR(32) NOT NULL
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO store_info (id, store_id) VALUES (1, ?)', (uuid.uuid4().hex,))
+            
+            # Create short_code_allocator table (leased counters, one row per code length)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS short_code_allocator (
+                    code_length INTEGER PRIMARY KEY,
+                    next_value INTEGER NOT NULL DEFAULT 0,
+                    permutation_key CHAR(64) NOT NULL
+                )
+            ''')
+            
             # Create indexes for performance
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_users_email 
@@ -68,16 +155,57 @@ def init_database():
                 ON users(trial_expires_at)
             ''')
             
+            # url_mappings indexes match the statements in url_shortener.py (see
+            # tests/test_query_plans.py); idx_url_mappings_user_created supersedes the
+            # old single-column created_by_user index
+            cursor.execute('DROP INDEX IF EXISTS idx_created_by_user')
+
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_created_by_user 
-                ON url_mappings(created_by_user)
+                CREATE INDEX IF NOT EXISTS idx_url_mappings_url_user
+                ON url_mappings(full_url, created_by_user, expires_in_days, expires_at, short_code)
             ''')
-            
+
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_url_mappings_user_created
+                ON url_mappings(created_by_user, created_at, expires_at)
+            ''')
+
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_url_mappings_file
+                ON url_mappings(file_key, created_by_user)
+            ''')
+
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_url_mappings_user_expires
+                ON url_mappings(created_by_user, expires_at)
+            ''')
+
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_expires_at 
+                CREATE INDEX IF NOT EXISTS idx_expires_at
                 ON url_mappings(expires_at)
             ''')
             
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_file_hashes_content_hash 
+                ON file_hashes(content_hash, user_email)
+            ''')
+            
+            # Keyset pages of a folder: newest first and by name (see list_catalog_page)
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_file_catalog_user_modified 
+                ON file_catalog(user_folder, last_modified DESC, file_key)
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_file_catalog_user_key
+                ON file_catalog(user_folder, file_key)
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_change_log_user_seq 
+                ON change_log(user_key, seq)
+            ''')
+            
             conn.commit()
             logger.info("Database initialized successfully")
             
@@ -107,6 +235,16 @@ def migrate_database(conn):
             conn.commit()
             logger.info("Migration completed: expires_in_days column added")
         
+        # Link changes carry the link's state (JSON) since the change log gained payloads
+        cursor.execute("PRAGMA table_info(change_log)")
+        change_log_columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'payload' not in change_log_columns:
+            logger.info("Adding payload column to change_log table")
+            cursor.execute('ALTER TABLE change_log ADD COLUMN payload TEXT')
+            conn.commit()
+            logger.info("Migration completed: payload column added")
+        
         # Check if users table exists and has trial columns
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
         users_table_exists = cursor.fetchone() is not None
@@ -128,13 +266,83 @@ def migrate_database(conn):
         logger.error(f"Database migration failed: {e}")
         raise
 
+# Connection tuning, applied once when a connection is opened
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384))  # Page cache per connection
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 8))  # Idle connections kept open per process
+
+_pool_lock = threading.Lock()
+_idle_connections = []  # (db_path, pid, conn), most recently used last
+
+def _open_connection():
+    """Open a connection with WAL journaling and the tuned pragmas"""
+    conn = sqlite3.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.row_factory = sqlite3.Row  # Enable dict-like access
+    # WAL lets readers run alongside the writer; NORMAL only syncs at checkpoints,
+    # which WAL keeps safe against corruption
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = {-SQLITE_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+    return conn
+
+def _checkout_connection():
+    """Take an idle connection for this process and DB_PATH, or open a new one"""
+    pid = os.getpid()
+    with _pool_lock:
+        while _idle_connections:
+            db_path, conn_pid, conn = _idle_connections.pop()
+            if db_path == DB_PATH and conn_pid == pid:
+                return conn
+            if conn_pid == pid:
+                conn.close()
+            # Connections inherited across a fork are dropped without closing,
+            # the parent still owns them
+    return _open_connection()
+
+def _release_connection(conn):
+    """Return a connection to the pool, discarding any uncommitted work"""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error as e:
+        logger.warning(f"Closing SQLite connection that could not be reset: {e}")
+        conn.close()
+        return
+
+    with _pool_lock:
+        if len(_idle_connections) < SQLITE_POOL_SIZE:
+            _idle_connections.append((DB_PATH, os.getpid(), conn))
+            return
+    conn.close()
+
+def close_db_connections():
+    """Close this process's idle pooled connections"""
+    pid = os.getpid()
+    with _pool_lock:
+        connections = [conn for _, conn_pid, conn in _idle_connections if conn_pid == pid]
+        _idle_connections.clear()
+    for conn in connections:
+        conn.close()
+
+# Closing the last connection checkpoints the WAL back into the database file
+atexit.register(close_db_connections)
+
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
+    """
+    Context manager for database connections
+    
+    Connections come from a small per-process pool, so the connect and pragma
+    setup happens once per connection rather than once per operation. Work left
+    uncommitted when the block exits is rolled back, as closing the connection
+    used to do. Nested blocks get a connection of their own.
+    """
     conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access
+        conn = _checkout_connection()
         yield conn
     except Exception as e:
         if conn:
@@ -143,26 +351,7 @@ def get_db_connection():
         raise
     finally:
         if conn:
-            conn.close()
-
-def cleanup_expired_urls():
-    """Remove expired URLs from database"""
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                DELETE FROM url_mappings 
-                WHERE expires_at IS NOT NULL 
-                AND expires_at < CURRENT_TIMESTAMP
-            ''')
-            deleted_count = cursor.rowcount
-            conn.commit()
-            
-            if deleted_count > 0:
-                logger.info(f"Cleaned up {deleted_count} expired URLs")
-                
-    except Exception as e:
-        logger.error(f"Failed to cleanup expired URLs: {e}")
+            _release_connection(conn)
 
 # User management functions for Premium Trial system
 def create_or_update_user(user_id, email, user_tier='Free'):
@@ -234,6 +423,7 @@ def start_premium_trial(user_id):
             ''', (user_id,))
             
             conn.commit()
+            invalidate_trial_status(user_id=user_id)
             logger.info(f"Premium trial started for user {user_id}")
             return True
             
@@ -315,6 +505,7 @@ def expire_trials():
             conn.commit()
             
             if expired_count > 0:
+                clear_trial_status_cache()
                 logger.info(f"Expired {expired_count} Premium trials")
             
             return expired_count
@@ -345,5 +536,391 @@ def get_users_with_expiring_trials(days_ahead=3):
         logger.error(f"Failed to get users with expiring trials: {e}")
         return []
 
+# Content hash index for upload deduplication
+def record_file_hash(file_key, content_hash, user_email, size_bytes, etag=None):
+    """
+    Record (or replace) the content hash of the object stored at file_key
+    
+    The S3 ETag is kept so callers can detect objects that were overwritten
+    by an upload path that does not update this index.
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO file_hashes (file_key, content_hash, user_email, size_bytes, etag, created_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (file_key, content_hash, user_email, size_bytes, etag))
+            conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Failed to record hash for {file_key}: {e}")
+        return False
+
+def get_file_hash(file_key):
+    """Return the hash index entry for the object at file_key, or None"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM file_hashes WHERE file_key = ?', (file_key,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"Failed to look up the hash of {file_key}: {e}")
+        return None
+
+def find_file_by_hash(content_hash, user_email=None):
+    """
+    Find a stored object with the given content hash
+    
+    When user_email is given only that user's files are considered, otherwise
+    any user's copy may be returned.
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if user_email:
+                cursor.execute('''
+                    SELECT * FROM file_hashes
+                    WHERE content_hash = ? AND user_email = ?
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ''', (content_hash, user_email))
+            else:
+                cursor.execute('''
+                    SELECT * FROM file_hashes
+                    WHERE content_hash = ?
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ''', (content_hash,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"Failed to look up content hash {content_hash}: {e}")
+        return None
+
+def delete_file_hash(file_key):
+    """Remove the hash index entry for a deleted object"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM file_hashes WHERE file_key = ?', (file_key,))
+            conn.commit()
+            return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"Failed to delete hash for {file_key}: {e}")
+        return False
+
+def delete_file_hashes(file_keys):
+    """Remove the hash index entries for many deleted objects in one transaction"""
+    file_keys = list(file_keys)
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            deleted = 0
+            for start in range(0, len(file_keys), 500):
+                chunk = file_keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'DELETE FROM file_hashes WHERE file_key IN ({placeholders})', chunk)
+                deleted += cursor.rowcount
+            conn.commit()
+            return deleted
+    except Exception as e:
+        logger.error(f"Failed to delete hashes for {len(file_keys)} files: {e}")
+        return 0
+
+def upsert_catalog_file(file_key, user_folder, size_bytes, last_modified, updated_at,
+                        etag=None, content_hash=None, listed_at=None):
+    """
+    Add or replace the catalog entry for the object stored at file_key
+    
+    Timestamps are UTC ISO strings (see file_catalog.format_timestamp). When
+    listed_at is given (reconciliation), entries written after the S3 listing
+    started are left alone.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        if listed_at is None:
+            cursor.execute('''
+                INSERT OR REPLACE INTO file_catalog
+                    (file_key, user_folder, size_bytes, content_hash, etag, last_modified, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (file_key, user_folder, size_bytes, content_hash, etag, last_modified, updated_at))
+        else:
+            cursor.execute('''
+                INSERT INTO file_catalog
+                    (file_key, user_folder, size_bytes, content_hash, etag, last_modified, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(file_key) DO UPDATE SET
+                    size_bytes = excluded.size_bytes,
+                    content_hash = excluded.content_hash,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    updated_at = excluded.updated_at
+                WHERE file_catalog.updated_at < ?
+            ''', (file_key, user_folder, size_bytes, content_hash, etag, last_modified, updated_at, listed_at))
+        conn.commit()
+        return cursor.rowcount > 0
+
+def delete_catalog_file(file_key, listed_at=None):
+    """Remove a catalog entry; with listed_at, only if it was written before that listing"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        if listed_at is None:
+            cursor.execute('DELETE FROM file_catalog WHERE file_key = ?', (file_key,))
+        else:
+            cursor.execute('DELETE FROM file_catalog WHERE file_key = ? AND updated_at < ?', (file_key, listed_at))
+        conn.commit()
+        return cursor.rowcount > 0
+
+def get_catalog_file(file_key):
+    """Return the catalog entry for file_key, or None"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM file_catalog WHERE file_key = ?', (file_key,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+def get_catalog_files(file_keys):
+    """Return the catalog entries for the given keys that exist, by primary key lookups"""
+    entries = []
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for start in range(0, len(file_keys), 500):
+            chunk = file_keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'SELECT * FROM file_catalog WHERE file_key IN ({placeholders})', chunk)
+            entries.extend(dict(row) for row in cursor.fetchall())
+    return entries
+
+def list_catalog_files(user_folder):
+    """Return every catalog entry in a user's folder, newest first"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM file_catalog
+            WHERE user_folder = ?
+            ORDER BY last_modified DESC, file_key
+        ''', (user_folder,))
+        return [dict(row) for row in cursor.fetchall()]
+
+def list_catalog_page(user_folder, sort, after=None, limit=None):
+    """
+    Return up to limit catalog entries of a user's folder, starting after a position
+    
+    sort 'name' orders by file_key and after is the last file_key returned;
+    'newest' orders by last_modified DESC, file_key and after is the last
+    (last_modified, file_key). Each page is a range read on an index, so its
+    cost does not depend on how many files the folder holds.
+    """
+    conditions = ['user_folder = ?']
+    params = [user_folder]
+    if sort == 'name':
+        order_by = 'file_key'
+        if after is not None:
+            conditions.append('file_key > ?')
+            params.append(after)
+    else:
+        order_by = 'last_modified DESC, file_key'
+        if after is not None:
+            # The <= bound lets the index seek to the position; the OR breaks ties on file_key
+            conditions.append('last_modified <= ? AND (last_modified < ? OR file_key > ?)')
+            params.extend([after[0], after[0], after[1]])
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT * FROM file_catalog
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order_by}
+            LIMIT ?
+        ''', (*params, -1 if limit is None else limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+def count_catalog_files(user_folder):
+    """Return the number of catalog entries in a user's folder"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) AS file_count FROM file_catalog WHERE user_folder = ?', (user_folder,))
+        return cursor.fetchone()['file_count']
+
+def list_catalog_folders():
+    """Return every user folder that has catalog entries or has been reconciled"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_folder FROM file_catalog_sync
+            UNION
+            SELECT DISTINCT user_folder FROM file_catalog
+        ''')
+        return [row['user_folder'] for row in cursor.fetchall()]
+
+def get_catalog_reconciled_at(user_folder):
+    """Return when a user's catalog was last reconciled against S3, or None"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT reconciled_at FROM file_catalog_sync WHERE user_folder = ?', (user_folder,))
+        row = cursor.fetchone()
+        return row['reconciled_at'] if row else None
+
+def set_catalog_reconciled_at(user_folder, reconciled_at):
+    """Record a completed reconciliation for a user's folder"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR REPLACE INTO file_catalog_sync (user_folder, reconciled_at) VALUES (?, ?)',
+            (user_folder, reconciled_at)
+        )
+        conn.commit()
+
+def record_changes(changes, cursor=None):
+    """
+    Append (user_key, item_type, item_key, change[, payload]) rows to the change log
+    
+    item_type is 'file' (item_key is the S3 key) or 'link' (the short code);
+    change is 'upsert' or 'delete'. payload is an optional dict stored as
+    JSON (link upserts carry the link's state). Pass the cursor of an open
+    transaction to log the changes atomically with the write that caused them.
+    """
+    if not changes:
+        return
+    sql = 'INSERT INTO change_log (user_key, item_type, item_key, change, payload) VALUES (?, ?, ?, ?, ?)'
+    rows = [(*change[:4], json.dumps(change[4]) if len(change) > 4 and change[4] else None) for change in changes]
+    if cursor is not None:
+        cursor.executemany(sql, rows)
+        return
+    with get_db_connection() as conn:
+        conn.executemany(sql, rows)
+        conn.commit()
+
+def lease_short_code_block(code_length, size, limit):
+    """
+    Lease up to size counter values for a code length below limit
+
+    BEGIN IMMEDIATE takes SQLite's write lock up front, so concurrent leases
+    from other workers are serialized and never overlap. Returns (start, end,
+    permutation_key), or None once the length has reached its limit.
+    """
+    with get_db_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(
+            'INSERT OR IGNORE INTO short_code_allocator (code_length, next_value, permutation_key) VALUES (?, 0, ?)',
+            (code_length, secrets.token_hex(32))
+        )
+        row = conn.execute(
+            'SELECT next_value, permutation_key FROM short_code_allocator WHERE code_length = ?',
+            (code_length,)
+        ).fetchone()
+        start = row['next_value']
+        if start >= limit:
+            conn.commit()
+            return None
+        end = min(start + size, limit)
+        conn.execute('UPDATE short_code_allocator SET next_value = ? WHERE code_length = ?', (end, code_length))
+        conn.commit()
+        return start, end, row['permutation_key']
+
+def link_upsert_changes(cursor, short_codes):
+    """
+    Change log entries for links just written on cursor, each carrying the link's state
+    
+    The payload has the columns /api/files/changes reports for a link, so the
+    change can be served without a url_mappings lookup.
+    """
+    changes = []
+    for start in range(0, len(short_codes), 500):
+        chunk = short_codes[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'''
+            SELECT created_by_user, short_code, full_url, file_key, filename,
+                   click_count, created_at, expires_at, expires_in_days
+            FROM url_mappings
+            WHERE short_code IN ({placeholders}) AND created_by_user IS NOT NULL
+        ''', chunk)
+        for row in cursor.fetchall():
+            payload = dict(row)
+            user_key = payload.pop('created_by_user')
+            changes.append((user_key, 'link', payload['short_code'], 'upsert', payload))
+    return changes
+
+def get_changes_since(user_key, since_seq, limit):
+    """Return up to limit change log rows for a user with seq > since_seq, oldest first"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT seq, item_type, item_key, change, payload FROM change_log
+            WHERE user_key = ? AND seq > ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (user_key, since_seq, limit))
+        changes = []
+        for row in cursor.fetchall():
+            change = dict(row)
+            change['payload'] = json.loads(change['payload']) if change['payload'] else None
+            changes.append(change)
+        return changes
+
+_store_id = None
+
+def get_store_id():
+    """Return the id of this database, which changes if it is recreated"""
+    global _store_id
+    if _store_id is None:
+        with get_db_connection() as conn:
+            _store_id = conn.execute('SELECT store_id FROM store_info WHERE id = 1').fetchone()['store_id']
+    return _store_id
+
+def get_latest_change_seq(user_key):
+    """Return the highest change log seq for a user (0 if none)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT MAX(seq) AS seq FROM change_log WHERE user_key = ?', (user_key,))
+        row = cursor.fetchone()
+        return row['seq'] or 0
+
+def get_change_log_pruned_through(user_key):
+    """
+    Return the seq below which a user's cursors have expired (0 if none have)
+    
+    seq is global here, so one watermark (the highest seq pruned) covers
+    every user.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT through_seq FROM change_log_pruned WHERE id = 1')
+        row = cursor.fetchone()
+        return row['through_seq'] if row else 0
+
+def get_change_cursor(user_key):
+    """Return the delta-sync cursor for a user's current state"""
+    return max(get_latest_change_seq(user_key), get_change_log_pruned_through(user_key))
+
+def prune_change_log(retention_days):
+    """Delete change log rows older than retention_days; returns the number removed"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT MAX(seq) AS through_seq FROM change_log
+                WHERE changed_at < datetime('now', ?)
+            ''', (f'-{int(retention_days)} days',))
+            through_seq = cursor.fetchone()['through_seq']
+            if through_seq is None:
+                return 0
+            
+            cursor.execute('DELETE FROM change_log WHERE seq <= ?', (through_seq,))
+            pruned_count = cursor.rowcount
+            cursor.execute('''
+                INSERT INTO change_log_pruned (id, through_seq) VALUES (1, ?)
+                ON CONFLICT(id) DO UPDATE SET through_seq = MAX(through_seq, excluded.through_seq)
+            ''', (through_seq,))
+            conn.commit()
+            
+            logger.info(f"Pruned {pruned_count} change log entries through seq {through_seq}")
+            return pruned_count
+    except Exception as e:
+        logger.error(f"Failed to prune change log: {e}")
+        return 0
+
 # Initialize database on import
 init_database()
@@ -6,8 +6,12 @@ Provides database operations for user management and trial system
 import boto3
 import os
 import logging
+import secrets
 from datetime import datetime, timedelta
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
+from trial_status_cache import invalidate_trial_status
 
 logger = logging.getLogger(__name__)
 
@@ -23,12 +27,16 @@ class DynamoDBAdapter:
         
         self.users_table_name = os.getenv('DYNAMODB_USERS_TABLE', f"{project_name}-{environment}-users")
         self.short_urls_table_name = os.getenv('DYNAMODB_SHORT_URLS_TABLE', f"{project_name}-{environment}-urls")
+        self.files_table_name = os.getenv('DYNAMODB_FILES_TABLE', f"{project_name}-{environment}-files")
+        self.changes_table_name = os.getenv('DYNAMODB_CHANGES_TABLE', f"{project_name}-{environment}-changes")
         
         # Initialize table references
         self.users_table = self.dynamodb.Table(self.users_table_name)
         self.short_urls_table = self.dynamodb.Table(self.short_urls_table_name)
+        self.files_table = self.dynamodb.Table(self.files_table_name)
+        self.changes_table = self.dynamodb.Table(self.changes_table_name)
         
-        logger.info(f"DynamoDB adapter initialized with tables: {self.users_table_name}, {self.short_urls_table_name}")
+        logger.info(f"DynamoDB adapter initialized with tables: {self.users_table_name}, {self.short_urls_table_name}, {self.files_table_name}, {self.changes_table_name}")
 
     def get_user_trial_status(self, user_email, user_id):
         """Get comprehensive trial status for a user"""
@@ -64,15 +72,8 @@ class DynamoDBAdapter:
         except Exception as e:
             print(f"[DYNAMODB] Error getting trial status for user {user_email}: {e}")
             logger.error(f"Error getting trial status for user {user_email}: {e}")
-            # Return default status for new user
-            return {
-                'user_tier': 'Free',
-                'trial_status': 'not_started',
-                'can_start_trial': True,
-                'days_remaining': 0,
-                'trial_started_at': None,
-                'trial_expires_at': None
-            }
+            # Let the caller decide on a fallback; it must not be cached as the user's status
+            raise
 
     def _create_new_user(self, user_id, user_email):
         """Create a new user in DynamoDB"""
@@ -229,6 +230,7 @@ class DynamoDBAdapter:
                 ExpressionAttributeValues=expression_values
             )
             
+            invalidate_trial_status(user_email, user_id)
             logger.info(f"Started Premium trial for user {user_email}")
             return True
             
@@ -278,6 +280,7 @@ class DynamoDBAdapter:
                                 ExpressionAttributeValues=expression_values
                             )
                             
+                            invalidate_trial_status(user.get('email'), user['user_id'])
                             expired_count += 1
                             logger.info(f"Expired trial for user {user.get('email', 'unknown')}")
                             
@@ -332,5 +335,376 @@ class DynamoDBAdapter:
             logger.error(f"Error initializing user {user_email}: {e}")
             return None
 
+    # --- File catalog ---
+    # Items are keyed by (user_folder, file_key). Each reconciled folder also has
+    # one marker item whose file_key (CATALOG_SYNC_MARKER) cannot be an S3 key
+    # in that folder, so folder listings use begins_with(file_key, folder + '/').
+    CATALOG_SYNC_MARKER = '#reconciled'
+    CATALOG_MODIFIED_INDEX = 'modified-index'
+
+    def upsert_catalog_file(self, file_key, user_folder, size_bytes, last_modified, updated_at,
+                            etag=None, content_hash=None, listed_at=None):
+        """Add or replace a catalog entry; with listed_at, skip entries written after that listing"""
+        item = {
+            'user_folder': user_folder,
+            'file_key': file_key,
+            'size_bytes': size_bytes,
+            'last_modified': last_modified,
+            'updated_at': updated_at
+        }
+        if etag:
+            item['etag'] = etag
+        if content_hash:
+            item['content_hash'] = content_hash
+        
+        params = {'Item': item}
+        if listed_at is not None:
+            params['ConditionExpression'] = Attr('file_key').not_exists() | Attr('updated_at').lt(listed_at)
+        try:
+            self.files_table.put_item(**params)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def delete_catalog_file(self, file_key, user_folder, listed_at=None):
+        """Remove a catalog entry; with listed_at, only if it was written before that listing"""
+        params = {'Key': {'user_folder': user_folder, 'file_key': file_key}, 'ReturnValues': 'ALL_OLD'}
+        if listed_at is not None:
+            params['ConditionExpression'] = Attr('updated_at').lt(listed_at)
+        try:
+            return 'Attributes' in self.files_table.delete_item(**params)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def get_catalog_file(self, file_key, user_folder):
+        """Return the catalog entry for file_key, or None"""
+        response = self.files_table.get_item(Key={'user_folder': user_folder, 'file_key': file_key})
+        item = response.get('Item')
+        return self._format_catalog_item(item) if item else None
+
+    def get_catalog_files(self, file_keys, user_folder):
+        """Return the catalog entries for the given keys that exist, with BatchGetItem"""
+        entries = []
+        for start in range(0, len(file_keys), 100):
+            request_items = {self.files_table_name: {
+                'Keys': [{'user_folder': user_folder, 'file_key': file_key}
+                         for file_key in file_keys[start:start + 100]]
+            }}
+            while request_items:
+                response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                items = response['Responses'].get(self.files_table_name, [])
+                entries.extend(self._format_catalog_item(item) for item in items)
+                request_items = response.get('UnprocessedKeys')
+        return entries
+
+    def list_catalog_files(self, user_folder):
+        """Return every catalog entry in a user's folder, newest first"""
+        items = []
+        params = {
+            'KeyConditionExpression': Key('user_folder').eq(user_folder) & Key('file_key').begins_with(f"{user_folder}/")
+        }
+        while True:
+            response = self.files_table.query(**params)
+            items.extend(self._format_catalog_item(item) for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        
+        items.sort(key=lambda item: item['file_key'])
+        items.sort(key=lambda item: item['last_modified'], reverse=True)
+        return items
+
+    def list_catalog_page(self, user_folder, sort, after=None, limit=None):
+        """
+        Return up to limit catalog entries of a user's folder, starting after a position
+        
+        sort 'name' queries the table in file_key order; 'newest' queries the
+        modified-index GSI (user_folder, last_modified) backwards. after is the
+        last file_key, or the last (last_modified, file_key), returned. Each page
+        reads only the items it returns.
+        """
+        if sort == 'name':
+            params = {
+                'KeyConditionExpression': Key('user_folder').eq(user_folder) & Key('file_key').begins_with(f"{user_folder}/")
+            }
+            if after is not None:
+                params['ExclusiveStartKey'] = {'user_folder': user_folder, 'file_key': after}
+        else:
+            # The reconciliation marker has no last_modified, so the sparse index leaves it out
+            params = {
+                'IndexName': self.CATALOG_MODIFIED_INDEX,
+                'KeyConditionExpression': Key('user_folder').eq(user_folder),
+                'ScanIndexForward': False
+            }
+            if after is not None:
+                params['ExclusiveStartKey'] = {
+                    'user_folder': user_folder,
+                    'last_modified': after[0],
+                    'file_key': after[1]
+                }
+        
+        items = []
+        while limit is None or len(items) < limit:
+            if limit is not None:
+                params['Limit'] = limit - len(items)
+            response = self.files_table.query(**params)
+            items.extend(self._format_catalog_item(item) for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return items
+
+    def count_catalog_files(self, user_folder):
+        """Return the number of catalog entries in a user's folder"""
+        file_count = 0
+        params = {
+            'KeyConditionExpression': Key('user_folder').eq(user_folder) & Key('file_key').begins_with(f"{user_folder}/"),
+            'Select': 'COUNT'
+        }
+        while True:
+            response = self.files_table.query(**params)
+            file_count += response['Count']
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return file_count
+
+    def list_catalog_folders(self):
+        """Return every user folder that has catalog entries or has been reconciled"""
+        folders = set()
+        params = {'ProjectionExpression': 'user_folder'}
+        while True:
+            response = self.files_table.scan(**params)
+            folders.update(item['user_folder'] for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return sorted(folders)
+
+    def get_catalog_reconciled_at(self, user_folder):
+        """Return when a user's catalog was last reconciled against S3, or None"""
+        response = self.files_table.get_item(
+            Key={'user_folder': user_folder, 'file_key': self.CATALOG_SYNC_MARKER}
+        )
+        return response.get('Item', {}).get('reconciled_at')
+
+    def set_catalog_reconciled_at(self, user_folder, reconciled_at):
+        """Record a completed reconciliation for a user's folder"""
+        self.files_table.put_item(Item={
+            'user_folder': user_folder,
+            'file_key': self.CATALOG_SYNC_MARKER,
+            'reconciled_at': reconciled_at
+        })
+
+    def _format_catalog_item(self, item):
+        """Convert a DynamoDB item to the same shape as a SQLite catalog row"""
+        return {
+            'file_key': item['file_key'],
+            'user_folder': item['user_folder'],
+            'size_bytes': int(item['size_bytes']),
+            'content_hash': item.get('content_hash'),
+            'etag': item.get('etag'),
+            'last_modified': item['last_modified'],
+            'updated_at': item.get('updated_at')
+        }
+
+    # Short code allocator counters live in the urls table, one item per code
+    # length; '#' is not a base62 character, so they never clash with a code
+    SHORT_CODE_COUNTER_PREFIX = '#allocator-'
+
+    def lease_short_code_block(self, code_length, size, limit):
+        """
+        Lease up to size counter values for a code length below limit
+
+        One UpdateItem ADD advances the shared counter, so every value is
+        handed out once across all tasks; the permutation key is set by
+        whichever task leases first. Returns (start, end, permutation_key),
+        or None once the length has reached its limit.
+        """
+        response = self.short_urls_table.update_item(
+            Key={'short_code': f"{self.SHORT_CODE_COUNTER_PREFIX}{code_length}"},
+            UpdateExpression='SET permutation_key = if_not_exists(permutation_key, :key) ADD next_value :size',
+            ExpressionAttributeValues={':key': secrets.token_hex(32), ':size': size},
+            ReturnValues='ALL_NEW'
+        )
+        end = int(response['Attributes']['next_value'])
+        start = end - size
+        if start >= limit:
+            return None
+        return start, min(end, limit), response['Attributes']['permutation_key']
+
+    # Change log items are keyed by (user_key, seq). Each user has a counter
+    # item at seq 0 holding last_seq (the highest seq handed out) and
+    # pruned_through (cursors below it must reload), so seqs are allocated per
+    # user with an atomic ADD and there is no service-wide hot item.
+    CHANGE_COUNTER_SEQ = 0
+    # A missing seq older than this is taken as a write that never landed
+    CHANGE_GAP_GRACE_SECONDS = 60
+
+    def record_changes(self, changes):
+        """
+        Append (user_key, item_type, item_key, change[, payload]) entries to the change log
+        
+        Seqs are allocated per user with one ADD on the user's counter, then
+        the entries are written under them. If an allocated entry cannot be
+        written, the user's watermark is raised past it so their clients
+        reload instead of missing it; if that fails too, the error is raised.
+        """
+        by_user = {}
+        for change in changes:
+            by_user.setdefault(change[0], []).append(change)
+        for user_key, user_changes in by_user.items():
+            self._append_user_changes(user_key, user_changes)
+
+    def _append_user_changes(self, user_key, changes):
+        """Allocate seqs for one user's entries and write them"""
+        response = self.changes_table.update_item(
+            Key={'user_key': user_key, 'seq': self.CHANGE_COUNTER_SEQ},
+            UpdateExpression='ADD last_seq :count',
+            ExpressionAttributeValues={':count': len(changes)},
+            ReturnValues='UPDATED_NEW'
+        )
+        last_seq = int(response['Attributes']['last_seq'])
+        
+        try:
+            changed_at = datetime.utcnow().isoformat()
+            with self.changes_table.batch_writer() as batch:
+                for seq, change in enumerate(changes, start=last_seq - len(changes) + 1):
+                    item = {
+                        'user_key': user_key,
+                        'seq': seq,
+                        'item_type': change[1],
+                        'item_key': change[2],
+                        'change': change[3],
+                        'changed_at': changed_at
+                    }
+                    if len(change) > 4 and change[4]:
+                        item['payload'] = change[4]
+                    batch.put_item(Item=item)
+        except Exception as e:
+            logger.error(f"Failed to write change log seqs up to {last_seq} for {user_key}: {e}")
+            self._raise_change_watermark(user_key, last_seq)
+
+    def _raise_change_watermark(self, user_key, through_seq):
+        """Make a user's cursors below through_seq expire, so their clients reload"""
+        try:
+            self.changes_table.update_item(
+                Key={'user_key': user_key, 'seq': self.CHANGE_COUNTER_SEQ},
+                UpdateExpression='SET pruned_through = :through',
+                ConditionExpression=Attr('pruned_through').not_exists() | Attr('pruned_through').lt(through_seq),
+                ExpressionAttributeValues={':through': through_seq}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    def get_changes_since(self, user_key, since_seq, limit):
+        """
+        Return up to limit change log entries for a user with seq > since_seq, oldest first
+        
+        Seqs are handed out before their entries are written, so a later seq
+        can land first. Only the unbroken run after since_seq is returned; a
+        hole older than CHANGE_GAP_GRACE_SECONDS is a lost write, and raises
+        the user's watermark so the caller's cursor expires.
+        """
+        params = {
+            'KeyConditionExpression': Key('user_key').eq(user_key) & Key('seq').gt(since_seq),
+            'ConsistentRead': True
+        }
+        items = []
+        while len(items) < limit:
+            params['Limit'] = limit - len(items)
+            response = self.changes_table.query(**params)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        
+        changes = []
+        for item in items:
+            expected_seq = since_seq + len(changes) + 1
+            if int(item['seq']) != expected_seq:
+                written_at = datetime.fromisoformat(item['changed_at'])
+                if datetime.utcnow() - written_at > timedelta(seconds=self.CHANGE_GAP_GRACE_SECONDS):
+                    logger.error(f"Change log seq {expected_seq} for {user_key} was never written")
+                    self._raise_change_watermark(user_key, expected_seq)
+                break
+            changes.append(self._format_change_item(item))
+        return changes
+
+    def _get_change_counter(self, user_key):
+        response = self.changes_table.get_item(
+            Key={'user_key': user_key, 'seq': self.CHANGE_COUNTER_SEQ},
+            ConsistentRead=True
+        )
+        return response.get('Item', {})
+
+    def get_latest_change_seq(self, user_key):
+        """Return the highest change log seq handed out for a user (0 if none)"""
+        return int(self._get_change_counter(user_key).get('last_seq', 0))
+
+    def get_change_log_pruned_through(self, user_key):
+        """Return the seq below which a user's cursors have expired (0 if none have)"""
+        return int(self._get_change_counter(user_key).get('pruned_through', 0))
+
+    def get_change_cursor(self, user_key):
+        """Return the delta-sync cursor for a user's current state, from one read of their counter"""
+        counter = self._get_change_counter(user_key)
+        return int(max(counter.get('last_seq', 0), counter.get('pruned_through', 0)))
+
+    def prune_change_log(self, retention_days):
+        """Delete change log entries older than retention_days; returns the number removed"""
+        try:
+            cutoff = (datetime.utcnow() - timedelta(days=int(retention_days))).isoformat()
+            expired = []
+            # Counter items have no changed_at, so the filter skips them
+            params = {
+                'FilterExpression': Attr('changed_at').lt(cutoff),
+                'ProjectionExpression': 'user_key, seq'
+            }
+            while True:
+                response = self.changes_table.scan(**params)
+                expired.extend(response['Items'])
+                if 'LastEvaluatedKey' not in response:
+                    break
+                params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            if not expired:
+                return 0
+            
+            # Raise the watermarks first, so no reader treats the gap as "no changes"
+            pruned_through = {}
+            for item in expired:
+                pruned_through[item['user_key']] = max(pruned_through.get(item['user_key'], 0), int(item['seq']))
+            for user_key, through_seq in pruned_through.items():
+                self._raise_change_watermark(user_key, through_seq)
+            
+            with self.changes_table.batch_writer() as batch:
+                for item in expired:
+                    batch.delete_item(Key={'user_key': item['user_key'], 'seq': item['seq']})
+            
+            logger.info(f"Pruned {len(expired)} change log entries for {len(pruned_through)} users")
+            return len(expired)
+        except Exception as e:
+            logger.error(f"Failed to prune change log: {e}")
+            return 0
+
+    def _format_change_item(self, item):
+        """Convert a DynamoDB item to the same shape as a SQLite change log row"""
+        payload = item.get('payload')
+        if payload:
+            # Numbers come back as Decimal; payload numbers are all integers
+            payload = {key: int(value) if isinstance(value, Decimal) else value for key, value in payload.items()}
+        return {
+            'seq': int(item['seq']),
+            'item_type': item['item_type'],
+            'item_key': item['item_key'],
+            'change': item['change'],
+            'payload': payload
+        }
+
 # Create a global instance
 db_adapter = DynamoDBAdapter() 
\ No newline at end of file
@@ -0,0 +1,324 @@
+"""
+Per-user file catalog
+
+Keeps an index of every stored object (key, size, ETag, content hash and
+timestamps) so file listings and existence checks do not need S3 calls. Upload
+and delete paths update it as they go; reconciliation against an S3 listing
+repairs anything written to the bucket by other means.
+"""
+import os
+import threading
+import logging
+from datetime import datetime, timezone
+from change_log import record_changes
+
+logger = logging.getLogger(__name__)
+
+# Determine which database to use
+USE_DYNAMODB = os.getenv('USE_DYNAMODB', 'false').lower() == 'true'
+
+if USE_DYNAMODB:
+    # Use DynamoDB for production
+    from dynamodb_adapter import db_adapter
+
+    def _upsert(file_key, user_folder, **fields):
+        return db_adapter.upsert_catalog_file(file_key, user_folder, **fields)
+
+    def _delete(file_key, user_folder, listed_at=None):
+        return db_adapter.delete_catalog_file(file_key, user_folder, listed_at)
+
+    def _get(file_key, user_folder):
+        return db_adapter.get_catalog_file(file_key, user_folder)
+
+    def _get_many(file_keys, user_folder):
+        return db_adapter.get_catalog_files(file_keys, user_folder)
+
+    _list = db_adapter.list_catalog_files
+    _list_page = db_adapter.list_catalog_page
+    _count = db_adapter.count_catalog_files
+    _list_folders = db_adapter.list_catalog_folders
+    _get_reconciled_at = db_adapter.get_catalog_reconciled_at
+    _set_reconciled_at = db_adapter.set_catalog_reconciled_at
+
+else:
+    # Use SQLite for development
+    import database
+
+    def _upsert(file_key, user_folder, **fields):
+        return database.upsert_catalog_file(file_key, user_folder, **fields)
+
+    def _delete(file_key, user_folder, listed_at=None):
+        return database.delete_catalog_file(file_key, listed_at)
+
+    def _get(file_key, user_folder):
+        return database.get_catalog_file(file_key)
+
+    def _get_many(file_keys, user_folder):
+        return database.get_catalog_files(file_keys)
+
+    _list = database.list_catalog_files
+    _list_page = database.list_catalog_page
+    _count = database.count_catalog_files
+    _list_folders = database.list_catalog_folders
+    _get_reconciled_at = database.get_catalog_reconciled_at
+    _set_reconciled_at = database.set_catalog_reconciled_at
+
+# How long a request waits for its folder's first reconcile before giving up
+CATALOG_RECONCILE_WAIT_SECONDS = float(os.getenv('CATALOG_RECONCILE_WAIT_SECONDS', 5))
+
+_reconciled_folders = set()  # Folders known to be reconciled, so the check skips the database
+_reconciles_lock = threading.Lock()
+_reconciles = {}  # user_folder -> first reconcile in progress ({'done': Event, 'error': exception})
+
+class CatalogNotReadyError(Exception):
+    """A folder's first reconcile is still running; the request can be retried shortly"""
+
+def format_timestamp(dt=None):
+    """UTC timestamp in a fixed-width ISO format, so stored values sort as strings"""
+    dt = dt or datetime.now(timezone.utc)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+def get_catalog_folder(file_key):
+    """Return the user folder a key belongs to, or None for keys outside any folder"""
+    user_folder, separator, filename = file_key.partition('/')
+    return user_folder if separator and filename else None
+
+def _to_object(entry):
+    """Catalog entry in the shape of an S3 list_objects_v2 item (plus content_hash)"""
+    return {
+        'Key': entry['file_key'],
+        'Size': entry['size_bytes'],
+        'LastModified': datetime.fromisoformat(entry['last_modified']),
+        'ETag': entry['etag'],
+        'content_hash': entry['content_hash']
+    }
+
+def add_catalog_file(file_key, size_bytes, etag=None, content_hash=None, last_modified=None):
+    """
+    Record an object that was just stored in S3
+
+    last_modified defaults to now; reconciliation later replaces it with S3's
+    own value. Catalog write failures are logged rather than raised because
+    the object is already stored, and reconciliation will pick it up. Failing
+    to log a change that was written is raised: the change cursor is the
+    listing's ETag, so a lost change would keep serving stale 304s.
+    """
+    user_folder = get_catalog_folder(file_key)
+    if not user_folder:
+        return False
+    try:
+        now = format_timestamp()
+        _upsert(
+            file_key, user_folder,
+            size_bytes=size_bytes,
+            last_modified=format_timestamp(last_modified) if last_modified else now,
+            updated_at=now,
+            etag=etag,
+            content_hash=content_hash
+        )
+    except Exception as e:
+        logger.error(f"Failed to add {file_key} to the file catalog: {e}")
+        return False
+    record_changes([(user_folder, 'file', file_key, 'upsert')])
+    return True
+
+def remove_catalog_file(file_key):
+    """Remove a deleted object from the catalog (failures are handled like add_catalog_file)"""
+    user_folder = get_catalog_folder(file_key)
+    if not user_folder:
+        return False
+    try:
+        removed = _delete(file_key, user_folder)
+    except Exception as e:
+        logger.error(f"Failed to remove {file_key} from the file catalog: {e}")
+        return False
+    if removed:
+        record_changes([(user_folder, 'file', file_key, 'delete')])
+    return removed
+
+def remove_catalog_files(file_keys):
+    """Remove many deleted objects from the catalog; returns how many entries were removed"""
+    changes = []
+    for file_key in file_keys:
+        user_folder = get_catalog_folder(file_key)
+        if not user_folder:
+            continue
+        try:
+            if _delete(file_key, user_folder):
+                changes.append((user_folder, 'file', file_key, 'delete'))
+        except Exception as e:
+            logger.error(f"Failed to remove {file_key} from the file catalog: {e}")
+    record_changes(changes)
+    return len(changes)
+
+def get_catalog_file(file_key):
+    """Return the catalogued object at file_key (S3 list item shape), or None"""
+    user_folder = get_catalog_folder(file_key)
+    if not user_folder:
+        return None
+    entry = _get(file_key, user_folder)
+    return _to_object(entry) if entry else None
+
+def get_catalog_files(user_folder, file_keys):
+    """
+    Return the catalogued objects at the given keys in a user's folder, by key
+
+    Looks up only the requested keys, so the cost does not depend on how many
+    files the folder holds. Keys outside the folder and missing keys are left out.
+    """
+    file_keys = list(dict.fromkeys(key for key in file_keys if get_catalog_folder(key) == user_folder))
+    if not file_keys:
+        return {}
+    return {entry['file_key']: _to_object(entry) for entry in _get_many(file_keys, user_folder)}
+
+def list_catalog_files(user_folder):
+    """Return a user's catalogued objects (S3 list item shape), newest first"""
+    return [_to_object(entry) for entry in _list(user_folder)]
+
+def list_catalog_page(user_folder, sort, after=None, limit=None):
+    """
+    Return one keyset page of a user's catalogued objects (S3 list item shape)
+
+    sort is 'newest' (after is the last (last_modified, file_key) returned,
+    with last_modified as stored, see catalog_position) or 'name' (after is
+    the last file_key). Without limit the rest of the folder is returned.
+    """
+    return [_to_object(entry) for entry in _list_page(user_folder, sort, after, limit)]
+
+def catalog_position(obj, sort):
+    """The keyset position of a listed object, to pass back as list_catalog_page's after"""
+    if sort == 'name':
+        return obj['Key']
+    return [format_timestamp(obj['LastModified']), obj['Key']]
+
+def count_catalog_files(user_folder):
+    """Return how many objects a user's folder holds"""
+    return _count(user_folder)
+
+def ensure_user_catalog(s3, bucket, user_folder):
+    """
+    Reconcile a user's folder the first time it is used, so existing files are catalogued
+
+    The reconcile runs in a background thread, one per folder, so users do
+    not queue behind each other's first listing. Callers wait up to
+    CATALOG_RECONCILE_WAIT_SECONDS for it; if it is still running,
+    CatalogNotReadyError is raised and a later request picks up the result.
+    """
+    if user_folder in _reconciled_folders:
+        return
+    if _get_reconciled_at(user_folder) is None:
+        with _reconciles_lock:
+            reconcile = _reconciles.get(user_folder)
+            if reconcile is None:
+                reconcile = {'done': threading.Event(), 'error': None}
+                _reconciles[user_folder] = reconcile
+                threading.Thread(target=_reconcile_first_use, args=(s3, bucket, user_folder, reconcile),
+                                 daemon=True).start()
+        if not reconcile['done'].wait(CATALOG_RECONCILE_WAIT_SECONDS):
+            raise CatalogNotReadyError(f"File catalog for {user_folder} is still being built")
+        if reconcile['error'] is not None:
+            raise reconcile['error']
+    _reconciled_folders.add(user_folder)
+
+def _reconcile_first_use(s3, bucket, user_folder, reconcile):
+    """Background half of ensure_user_catalog"""
+    try:
+        if _get_reconciled_at(user_folder) is None:
+            reconcile_user_catalog(s3, bucket, user_folder)
+    except Exception as e:
+        logger.error(f"Failed to reconcile the file catalog for {user_folder}: {e}")
+        reconcile['error'] = e
+    finally:
+        with _reconciles_lock:
+            _reconciles.pop(user_folder, None)
+        reconcile['done'].set()
+
+def _list_bucket_objects(s3, bucket, prefix=''):
+    """Yield every object under prefix, skipping folder placeholder keys"""
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if not obj['Key'].endswith('/'):
+                yield obj
+
+def reconcile_user_catalog(s3, bucket, user_folder, objects=None, listed_at=None):
+    """
+    Bring a user's catalog in line with S3
+
+    objects is the folder's S3 listing and listed_at the time that listing
+    started; the listing is fetched when not given. Only entries that differ
+    are written, and entries written after listed_at (uploads and deletes
+    racing the job) are left alone.
+
+    Returns:
+        Dict with added, updated and removed counts
+    """
+    if objects is None:
+        listed_at = format_timestamp()
+        objects = _list_bucket_objects(s3, bucket, f"{user_folder}/")
+
+    existing = {entry['file_key']: entry for entry in _list(user_folder)}
+    counts = {'added': 0, 'updated': 0, 'removed': 0}
+    changes = []
+
+    for obj in objects:
+        entry = existing.pop(obj['Key'], None)
+        last_modified = format_timestamp(obj['LastModified'])
+        # Entries written without an ETag are trusted to match while the size does
+        same_content = (entry is not None and entry['etag'] in (obj['ETag'], None)
+                        and entry['size_bytes'] == obj['Size'])
+        if same_content and entry['etag'] == obj['ETag'] and entry['last_modified'] == last_modified:
+            continue
+
+        written = _upsert(
+            obj['Key'], user_folder,
+            size_bytes=obj['Size'],
+            last_modified=last_modified,
+            updated_at=format_timestamp(),
+            etag=obj['ETag'],
+            content_hash=entry['content_hash'] if same_content else None,
+            listed_at=listed_at
+        )
+        if written:
+            counts['updated' if entry else 'added'] += 1
+            changes.append((user_folder, 'file', obj['Key'], 'upsert'))
+
+    for file_key in existing:
+        if _delete(file_key, user_folder, listed_at):
+            counts['removed'] += 1
+            changes.append((user_folder, 'file', file_key, 'delete'))
+
+    record_changes(changes)
+
+    _set_reconciled_at(user_folder, listed_at)
+    _reconciled_folders.add(user_folder)
+    if any(counts.values()):
+        logger.info(f"Reconciled file catalog for {user_folder}: {counts}")
+    return counts
+
+def reconcile_file_catalog(s3, bucket):
+    """
+    Reconcile every user's catalog with one pass over the bucket listing
+
+    Folders that are catalogued but no longer have any objects are emptied.
+
+    Returns:
+        Dict with the number of folders checked and added, updated and removed counts
+    """
+    listed_at = format_timestamp()
+    objects_by_folder = {folder: [] for folder in _list_folders()}
+    for obj in _list_bucket_objects(s3, bucket):
+        user_folder = get_catalog_folder(obj['Key'])
+        if user_folder:
+            objects_by_folder.setdefault(user_folder, []).append(obj)
+
+    totals = {'folders': len(objects_by_folder), 'added': 0, 'updated': 0, 'removed': 0}
+    for user_folder, objects in objects_by_folder.items():
+        counts = reconcile_user_catalog(s3, bucket, user_folder, objects, listed_at)
+        for name, count in counts.items():
+            totals[name] += count
+
+    logger.info(f"File catalog reconciliation completed: {totals}")
+    return totals
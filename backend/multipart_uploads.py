@@ -0,0 +1,221 @@
+"""
+S3 multipart upload helpers for resumable, parallel uploads
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# S3 limits: parts are 5 MiB - 5 GiB (except the last one), at most 10,000 per upload
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+MAX_PARTS = 10000
+MAX_PRESIGN_BATCH = 100  # Part URLs returned per request
+PART_URL_EXPIRATION = 3600  # 1 hour
+STREAM_PART_SIZE = 8 * 1024 * 1024  # Chunk size for server-side streaming uploads
+STREAM_MAX_PARTS_IN_FLIGHT = 4
+
+class UploadTooLargeError(Exception):
+    """Raised when a streamed upload exceeds its size limit"""
+
+def choose_part_size(file_size):
+    """Pick a part size that keeps the upload under S3's part-count limit"""
+    part_size = DEFAULT_PART_SIZE
+    while file_size and file_size / part_size > MAX_PARTS:
+        part_size *= 2
+    return part_size
+
+def start_multipart_upload(s3, bucket, file_key, content_type=None):
+    """Create a multipart upload and return its upload ID"""
+    params = {'Bucket': bucket, 'Key': file_key}
+    if content_type:
+        params['ContentType'] = content_type
+    
+    response = s3.create_multipart_upload(**params)
+    logger.info(f"Started multipart upload {response['UploadId']} for {file_key}")
+    return response['UploadId']
+
+def presign_upload_parts(s3, bucket, file_key, upload_id, part_numbers, expires_in=PART_URL_EXPIRATION):
+    """
+    Presign upload_part URLs for a batch of part numbers
+    
+    Returns:
+        list of {'part_number', 'url'} in the order requested
+    """
+    urls = []
+    for part_number in part_numbers:
+        url = s3.generate_presigned_url(
+            'upload_part',
+            Params={
+                'Bucket': bucket,
+                'Key': file_key,
+                'UploadId': upload_id,
+                'PartNumber': part_number
+            },
+            ExpiresIn=expires_in
+        )
+        urls.append({'part_number': part_number, 'url': url})
+    return urls
+
+def list_uploaded_parts(s3, bucket, file_key, upload_id):
+    """
+    List every part already uploaded (follows list_parts pagination)
+    
+    Returns:
+        list of {'part_number', 'etag', 'size'} sorted by part number
+    """
+    parts = []
+    params = {'Bucket': bucket, 'Key': file_key, 'UploadId': upload_id}
+    while True:
+        response = s3.list_parts(**params)
+        for part in response.get('Parts', []):
+            parts.append({
+                'part_number': part['PartNumber'],
+                'etag': part['ETag'],
+                'size': part['Size']
+            })
+        
+        if not response.get('IsTruncated'):
+            break
+        params['PartNumberMarker'] = response['NextPartNumberMarker']
+    
+    return sorted(parts, key=lambda part: part['part_number'])
+
+def complete_multipart_upload(s3, bucket, file_key, upload_id, parts):
+    """Complete a multipart upload from a list of {'part_number', 'etag'}; returns the object's ETag"""
+    response = s3.complete_multipart_upload(
+        Bucket=bucket,
+        Key=file_key,
+        UploadId=upload_id,
+        MultipartUpload={
+            'Parts': [
+                {'PartNumber': part['part_number'], 'ETag': part['etag']}
+                for part in sorted(parts, key=lambda part: part['part_number'])
+            ]
+        }
+    )
+    logger.info(f"Completed multipart upload {upload_id} for {file_key} ({len(parts)} parts)")
+    return response.get('ETag')
+
+def abort_multipart_upload(s3, bucket, file_key, upload_id):
+    """Abort a multipart upload and discard its parts"""
+    s3.abort_multipart_upload(Bucket=bucket, Key=file_key, UploadId=upload_id)
+    logger.info(f"Aborted multipart upload {upload_id} for {file_key}")
+
+def abort_stale_multipart_uploads(s3, bucket, max_age_hours=24):
+    """
+    Abort incomplete multipart uploads older than max_age_hours
+    Should be called by a scheduled task; returns the number aborted
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+    aborted_count = 0
+    params = {'Bucket': bucket}
+    
+    while True:
+        response = s3.list_multipart_uploads(**params)
+        for upload in response.get('Uploads', []):
+            if upload['Initiated'] < cutoff:
+                try:
+                    abort_multipart_upload(s3, bucket, upload['Key'], upload['UploadId'])
+                    aborted_count += 1
+                except Exception as e:
+                    logger.error(f"Failed to abort stale upload {upload['UploadId']}: {e}")
+        
+        if not response.get('IsTruncated'):
+            break
+        params['KeyMarker'] = response.get('NextKeyMarker')
+        params['UploadIdMarker'] = response.get('NextUploadIdMarker')
+    
+    logger.info(f"Aborted {aborted_count} stale multipart uploads")
+    return aborted_count
+
+def read_chunk(stream, size):
+    """Read up to size bytes, looping over short reads; returns b'' at EOF"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        data = stream.read(remaining)
+        if not data:
+            break
+        chunks.append(data)
+        remaining -= len(data)
+    return b''.join(chunks)
+
+def stream_to_s3(s3, bucket, file_key, stream, content_type=None, max_size=None,
+                 part_size=STREAM_PART_SIZE, max_in_flight=STREAM_MAX_PARTS_IN_FLIGHT):
+    """
+    Upload a file-like stream to S3 in fixed-size parts without buffering it
+    
+    Each chunk is sent as a multipart part as soon as it is full, with at most
+    max_in_flight parts being uploaded at once, so memory use stays around
+    part_size * (max_in_flight + 1) regardless of the file size. Files that fit
+    in a single chunk are written with one put_object call.
+    
+    Returns:
+        int: number of bytes uploaded
+    """
+    extra_args = {'ContentType': content_type} if content_type else {}
+    
+    first_chunk = read_chunk(stream, part_size)
+    if len(first_chunk) < part_size:
+        if max_size is not None and len(first_chunk) > max_size:
+            raise UploadTooLargeError(f"Upload exceeds {max_size} bytes")
+        s3.put_object(Bucket=bucket, Key=file_key, Body=first_chunk, **extra_args)
+        return len(first_chunk)
+    
+    upload_id = start_multipart_upload(s3, bucket, file_key, content_type)
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    
+    def upload_part(part_number, chunk):
+        try:
+            response = s3.upload_part(
+                Bucket=bucket,
+                Key=file_key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=chunk
+            )
+            return {'part_number': part_number, 'etag': response['ETag']}
+        finally:
+            in_flight.release()
+    
+    futures = []
+    total_size = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            chunk = first_chunk
+            part_number = 1
+            while chunk:
+                total_size += len(chunk)
+                if max_size is not None and total_size > max_size:
+                    raise UploadTooLargeError(f"Upload exceeds {max_size} bytes")
+                if part_number > MAX_PARTS:
+                    raise UploadTooLargeError(f"Upload exceeds {MAX_PARTS} parts")
+                
+                # Wait for a free slot before reading more, which bounds memory
+                in_flight.acquire()
+                futures.append(executor.submit(upload_part, part_number, chunk))
+                
+                # Surface part failures early instead of reading the rest of the body
+                for future in futures:
+                    if future.done() and future.exception():
+                        raise future.exception()
+                
+                part_number += 1
+                chunk = read_chunk(stream, part_size)
+            
+            parts = [future.result() for future in futures]
+        
+        complete_multipart_upload(s3, bucket, file_key, upload_id, parts)
+        return total_size
+    
+    except Exception:
+        for future in futures:
+            future.cancel()
+        try:
+            abort_multipart_upload(s3, bucket, file_key, upload_id)
+        except Exception as abort_error:
+            logger.error(f"Failed to abort streamed upload {upload_id}: {abort_error}")
+        raise
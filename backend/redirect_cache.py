@@ -0,0 +1,115 @@
+"""
+In-process LRU cache for short URL redirects
+"""
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+REDIRECT_CACHE_SIZE = int(os.getenv('REDIRECT_CACHE_SIZE', 10000))
+# Upper bound on how long a cached link can outlive a delete made by another worker
+REDIRECT_CACHE_TTL = int(os.getenv('REDIRECT_CACHE_TTL', 300))
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # short_code -> (evict_at, url_info)
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'invalidations': 0,
+    'hit_seconds': 0.0,
+    'miss_seconds': 0.0
+}
+
+def get_expiry_timestamp(expires_at):
+    """Return a link's expires_at as epoch seconds, or None if it never expires"""
+    if not expires_at:
+        return None
+
+    if isinstance(expires_at, str):
+        expires_at = datetime.fromisoformat(expires_at)
+    # Links are created with naive local timestamps (datetime.now())
+    if expires_at.tzinfo:
+        return expires_at.timestamp()
+    return time.mktime(expires_at.timetuple()) + expires_at.microsecond / 1e6
+
+def get_cached_redirect(short_code):
+    """Return a copy of the cached link info for a short code, or None"""
+    with _lock:
+        entry = _entries.get(short_code)
+        if entry is None:
+            return None
+
+        evict_at, url_info = entry
+        if time.time() >= evict_at:
+            del _entries[short_code]
+            _stats['evictions'] += 1
+            return None
+
+        _entries.move_to_end(short_code)
+        return dict(url_info)
+
+def cache_redirect(short_code, url_info):
+    """Cache link info until the earlier of the TTL and the link's own expiry"""
+    if REDIRECT_CACHE_SIZE <= 0 or REDIRECT_CACHE_TTL <= 0:
+        return
+
+    evict_at = time.time() + REDIRECT_CACHE_TTL
+    try:
+        link_expiry = get_expiry_timestamp(url_info.get('expires_at'))
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Not caching {short_code}, unparseable expires_at: {e}")
+        return
+    if link_expiry is not None:
+        evict_at = min(evict_at, link_expiry)
+
+    with _lock:
+        _entries[short_code] = (evict_at, dict(url_info))
+        _entries.move_to_end(short_code)
+        while len(_entries) > REDIRECT_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats['evictions'] += 1
+
+def add_cached_clicks(clicks_by_code):
+    """Add clicks just written to the database to the stored counts of cached entries"""
+    with _lock:
+        for short_code, clicks in clicks_by_code.items():
+            entry = _entries.get(short_code)
+            if entry is not None:
+                entry[1]['click_count'] += clicks
+
+def invalidate_redirect(short_code):
+    """Drop a short code from the cache (e.g. after it was deleted)"""
+    with _lock:
+        if _entries.pop(short_code, None) is not None:
+            _stats['invalidations'] += 1
+
+def record_redirect_lookup(hit, elapsed_seconds):
+    """Record the outcome and latency of one redirect lookup"""
+    with _lock:
+        if hit:
+            _stats['hits'] += 1
+            _stats['hit_seconds'] += elapsed_seconds
+        else:
+            _stats['misses'] += 1
+            _stats['miss_seconds'] += elapsed_seconds
+
+def get_redirect_cache_stats():
+    """Hit ratio, lookup latency and size of the redirect cache"""
+    with _lock:
+        stats = dict(_stats)
+        stats['size'] = len(_entries)
+
+    hit_seconds = stats.pop('hit_seconds')
+    miss_seconds = stats.pop('miss_seconds')
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+    stats['avg_hit_ms'] = round(hit_seconds * 1000 / stats['hits'], 3) if stats['hits'] else None
+    stats['avg_miss_ms'] = round(miss_seconds * 1000 / stats['misses'], 3) if stats['misses'] else None
+    stats['max_size'] = REDIRECT_CACHE_SIZE
+    stats['ttl_seconds'] = REDIRECT_CACHE_TTL
+    return stats
@@ -8,7 +8,7 @@ import sys
 import os
 
 # Database file path
-DB_PATH = os.path.join(os.path.dirname(__file__), 'url_shortener.db')
+DB_PATH = os.getenv('SQLITE_DB_PATH') or os.path.join(os.path.dirname(__file__), 'url_shortener.db')
 
 def reset_user_trial(email):
     """Reset a user's trial status to allow them to start a trial again"""
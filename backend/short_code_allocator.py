@@ -0,0 +1,124 @@
+"""
+Collision-free short code allocation
+
+Each code length has a shared counter: an item in the DynamoDB urls table in
+production, a row of the short_code_allocator table with SQLite. Workers lease
+blocks of counter values with one atomic write, so every value is handed out
+once across all tasks. Values are mapped
+to codes through a keyed permutation of the base62 space (a Feistel network with
+cycle walking), so codes are unique by construction without looking like a
+sequence. When a length reaches its fill limit, allocation moves to the next
+length.
+"""
+import hashlib
+import os
+import string
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Determine which database to use
+USE_DYNAMODB = os.getenv('USE_DYNAMODB', 'false').lower() == 'true'
+
+if USE_DYNAMODB:
+    # Use DynamoDB for production
+    from dynamodb_adapter import db_adapter
+    _lease = db_adapter.lease_short_code_block
+else:
+    # Use SQLite for development
+    import database
+    _lease = database.lease_short_code_block
+
+BASE62_CHARS = string.digits + string.ascii_lowercase + string.ascii_uppercase
+
+SHORT_CODE_MIN_LENGTH = int(os.getenv('SHORT_CODE_MIN_LENGTH', 6))
+SHORT_CODE_BLOCK_SIZE = int(os.getenv('SHORT_CODE_BLOCK_SIZE', 1000))  # Values leased per transaction
+# Fraction of a length's code space handed out before moving to the next length;
+# keeps the odds of guessing a live code low
+SHORT_CODE_MAX_FILL = float(os.getenv('SHORT_CODE_MAX_FILL', 0.01))
+FEISTEL_ROUNDS = 4
+
+class ShortCodeAllocator:
+    """Hands out unique short codes from leased counter blocks"""
+
+    def __init__(self, block_size=SHORT_CODE_BLOCK_SIZE, min_length=SHORT_CODE_MIN_LENGTH,
+                 max_fill=SHORT_CODE_MAX_FILL):
+        self.block_size = block_size
+        self.min_length = min_length
+        self.max_fill = max_fill
+        self._lock = threading.Lock()
+        self._length = None
+        self._key = None
+        self._next = 0
+        self._end = 0
+
+    def allocate(self):
+        """Return one new short code"""
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count):
+        """Return count new short codes (fewer database round trips than calling allocate)"""
+        codes = []
+        with self._lock:
+            while len(codes) < count:
+                if self._next >= self._end:
+                    self._lease_block(max(self.block_size, count - len(codes)))
+                codes.append(self._encode(self._next))
+                self._next += 1
+        return codes
+
+    def _limit(self, length):
+        return max(1, int((62 ** length) * self.max_fill))
+
+    def _lease_block(self, size):
+        length = self._length or self.min_length
+        while True:
+            lease = _lease(length, size, self._limit(length))
+            if lease is not None:
+                break
+            length += 1
+        start, end, permutation_key = lease
+
+        if length != self._length:
+            logger.info(f"Short code allocator now issuing {length}-character codes")
+        self._length = length
+        self._key = bytes.fromhex(permutation_key)
+        self._next, self._end = start, end
+
+    def _encode(self, value):
+        permuted = permute(value, 62 ** self._length, self._key)
+        chars = []
+        for _ in range(self._length):
+            permuted, remainder = divmod(permuted, 62)
+            chars.append(BASE62_CHARS[remainder])
+        return ''.join(reversed(chars))
+
+def permute(value, domain_size, key):
+    """
+    Keyed bijection on [0, domain_size)
+
+    A balanced Feistel network over the smallest even bit width covering the
+    domain; outputs outside the domain are re-encrypted (cycle walking) until
+    they land inside it, which keeps the mapping a permutation.
+    """
+    half_bits = ((domain_size - 1).bit_length() + 1) // 2
+    mask = (1 << half_bits) - 1
+    while True:
+        left, right = value >> half_bits, value & mask
+        for round_number in range(FEISTEL_ROUNDS):
+            digest = hashlib.blake2b(bytes([round_number]) + right.to_bytes(16, 'big'), key=key, digest_size=16).digest()
+            left, right = right, left ^ (int.from_bytes(digest, 'big') & mask)
+        value = (left << half_bits) | right
+        if value < domain_size:
+            return value
+
+_allocator = ShortCodeAllocator()
+
+def allocate_short_code():
+    """Return a new, never-before-issued short code"""
+    return _allocator.allocate()
+
+def allocate_short_codes(count):
+    """Return count new short codes; call before opening a write transaction"""
+    return _allocator.allocate_many(count)
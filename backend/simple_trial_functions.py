@@ -1,15 +1,13 @@
 # Simple trial functions to get the trial system working
 from datetime import datetime, timedelta
-import sqlite3
 import os
-
-# Database file path
-DB_PATH = os.path.join(os.path.dirname(__file__), 'url_shortener.db')
+from trial_status_cache import invalidate_trial_status
+from database import get_db_connection
 
 def simple_create_or_update_user(user_id, email, user_tier='Free'):
     """Simple user creation/update function"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO users (user_id, email, user_tier, updated_at)
@@ -24,7 +22,7 @@ def simple_create_or_update_user(user_id, email, user_tier='Free'):
 def simple_get_user_by_email(email):
     """Simple user lookup by email"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
             row = cursor.fetchone()
@@ -41,7 +39,7 @@ def simple_start_trial(user_id, user_email):
     """Simple trial start function"""
     try:
         # Ensure trial columns exist
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             
             # Check if trial columns exist, add if missing
@@ -64,10 +62,14 @@ def simple_start_trial(user_id, user_email):
                     trial_expires_at = ?,
                     trial_used = TRUE,
                     updated_at = CURRENT_TIMESTAMP
-                WHERE user_id = ? OR email = ?
+                WHERE (user_id = ? OR email = ?) AND (trial_used IS NULL OR NOT trial_used)
             ''', (expires_at.isoformat(), user_id, user_email))
             
             if cursor.rowcount == 0:
+                cursor.execute('SELECT 1 FROM users WHERE user_id = ? OR email = ?', (user_id, user_email))
+                if cursor.fetchone():
+                    # Re-checked here so a stale eligibility read can't restart a used trial
+                    return {'success': False, 'error': 'Trial already used or currently active'}
                 # User doesn't exist, create them
                 cursor.execute('''
                     INSERT INTO users (user_id, email, user_tier, trial_started_at, trial_expires_at, trial_used)
@@ -75,6 +77,7 @@ def simple_start_trial(user_id, user_email):
                 ''', (user_id, user_email, expires_at.isoformat()))
             
             conn.commit()
+            invalidate_trial_status(user_email, user_id)
             return {
                 'success': True,
                 'trial_expires_at': expires_at.isoformat(),
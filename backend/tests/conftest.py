@@ -0,0 +1,192 @@
+"""
+Shared test setup
+
+The backend modules read their configuration at import time and database
+creates its tables on import, so the environment is pointed at a scratch
+database and fake AWS settings before any test module imports them. AWS calls
+go to moto for the whole session, since app builds its boto3 clients on import.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+from moto import mock_aws
+
+_TEST_DIR = tempfile.mkdtemp(prefix='fileshare-tests-')
+
+os.environ['SQLITE_DB_PATH'] = os.path.join(_TEST_DIR, 'url_shortener.db')
+os.environ['USE_DYNAMODB'] = 'false'
+os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
+os.environ['AWS_REGION'] = 'us-east-1'
+os.environ['COGNITO_USER_POOL_ID'] = 'us-east-1_TESTPOOL'
+os.environ['COGNITO_CLIENT_ID'] = 'test-client-id'
+os.environ['S3_BUCKET_NAME'] = 'fileshare-test-bucket'
+
+TOKEN_ISSUER = f"https://cognito-idp.{os.environ['AWS_REGION']}.amazonaws.com/{os.environ['COGNITO_USER_POOL_ID']}"
+SIGNING_KID = 'test-key-1'
+
+_aws_mock = mock_aws()
+_aws_mock.start()
+
+def pytest_unconfigure(config):
+    _aws_mock.stop()
+
+@pytest.fixture(scope='session')
+def signing_key():
+    """RSA key the stub Cognito pool signs tokens with"""
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+class StubJWKSServer:
+    """Local HTTP server serving a JWKS document, with a fetch counter and injectable delay or failure"""
+
+    def __init__(self, private_key):
+        jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+        jwk.update(kid=SIGNING_KID, alg='RS256', use='sig')
+        self.document = {'keys': [jwk]}
+        self.delay = 0.0
+        self.status = 200
+        self.fetches = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.fetches += 1
+                time.sleep(stub.delay)
+                body = json.dumps(stub.document).encode() if stub.status == 200 else b'{}'
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_port}/.well-known/jwks.json'
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+@pytest.fixture
+def jwks_server(signing_key):
+    server = StubJWKSServer(signing_key)
+    yield server
+    server.close()
+
+@pytest.fixture
+def make_token(signing_key):
+    """Build a signed Cognito-style ID token; keyword arguments override claims"""
+    def make(kid=SIGNING_KID, **claims):
+        now = int(time.time())
+        payload = {
+            'sub': 'user-sub-1',
+            'email': 'user@example.com',
+            'aud': os.environ['COGNITO_CLIENT_ID'],
+            'iss': TOKEN_ISSUER,
+            'token_use': 'id',
+            'iat': now,
+            'exp': now + 3600,
+        }
+        payload.update(claims)
+        return jwt.encode(payload, signing_key, algorithm='RS256', headers={'kid': kid})
+    return make
+
+@pytest.fixture
+def s3_bucket():
+    """An empty moto bucket named S3_BUCKET_NAME; all moto state is dropped afterwards"""
+    import boto3
+    bucket = os.environ['S3_BUCKET_NAME']
+    boto3.client('s3', region_name=os.environ['AWS_REGION']).create_bucket(Bucket=bucket)
+    yield bucket
+    _aws_mock.reset()
+
+@pytest.fixture
+def client():
+    import app
+    app.app.config['TESTING'] = True
+    return app.app.test_client()
+
+@pytest.fixture
+def auth_headers(jwks_server, make_token, monkeypatch):
+    """Build Authorization headers for a user; tokens verify against the stub JWKS server"""
+    import app
+    monkeypatch.setattr(app, 'jwks_registry', app.JWKSKeyRegistry(jwks_server.url))
+    app.clear_verified_token_cache()
+
+    def headers(email='user@example.com', groups=('premium-tier',)):
+        token = make_token(sub=f'sub-{email}', email=email, **{'cognito:groups': list(groups)})
+        return {'Authorization': f'Bearer {token}'}
+    return headers
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    """Enable the admin endpoints and return headers carrying their token"""
+    import app
+    monkeypatch.setattr(app, 'ADMIN_API_TOKEN', 'test-admin-token')
+    return {'X-Admin-Token': 'test-admin-token'}
+
+@pytest.fixture
+def dynamodb_adapter():
+    """A DynamoDBAdapter over moto tables shaped like terraform/modules/dynamodb; moto state is dropped afterwards"""
+    import boto3
+    from dynamodb_adapter import DynamoDBAdapter
+
+    adapter = DynamoDBAdapter()
+    dynamodb = boto3.client('dynamodb', region_name=os.environ['AWS_REGION'])
+    dynamodb.create_table(
+        TableName=adapter.files_table_name,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': 'user_folder', 'AttributeType': 'S'},
+            {'AttributeName': 'file_key', 'AttributeType': 'S'},
+            {'AttributeName': 'last_modified', 'AttributeType': 'S'},
+        ],
+        KeySchema=[
+            {'AttributeName': 'user_folder', 'KeyType': 'HASH'},
+            {'AttributeName': 'file_key', 'KeyType': 'RANGE'},
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': adapter.CATALOG_MODIFIED_INDEX,
+            'KeySchema': [
+                {'AttributeName': 'user_folder', 'KeyType': 'HASH'},
+                {'AttributeName': 'last_modified', 'KeyType': 'RANGE'},
+            ],
+            'Projection': {'ProjectionType': 'ALL'},
+        }],
+    )
+    dynamodb.create_table(
+        TableName=adapter.short_urls_table_name,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[{'AttributeName': 'short_code', 'AttributeType': 'S'}],
+        KeySchema=[{'AttributeName': 'short_code', 'KeyType': 'HASH'}],
+    )
+    dynamodb.create_table(
+        TableName=adapter.changes_table_name,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': 'user_key', 'AttributeType': 'S'},
+            {'AttributeName': 'seq', 'AttributeType': 'N'},
+        ],
+        KeySchema=[
+            {'AttributeName': 'user_key', 'KeyType': 'HASH'},
+            {'AttributeName': 'seq', 'KeyType': 'RANGE'},
+        ],
+    )
+    yield adapter
+    _aws_mock.reset()
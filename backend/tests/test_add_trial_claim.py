@@ -0,0 +1,115 @@
+"""
+Cognito pre-token-generation handler (terraform/modules/cognito-user-management/add_trial_claim.py)
+"""
+import copy
+import importlib.util
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+HANDLER_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'terraform', 'modules',
+                            'cognito-user-management', 'add_trial_claim.py')
+
+@pytest.fixture
+def add_trial_claim():
+    """A fresh copy of the Lambda module, so its cached table handle never leaks between tests"""
+    spec = importlib.util.spec_from_file_location('add_trial_claim', HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class FakeUsersTable:
+    """Stands in for the DynamoDB users table; records every key it is asked for"""
+
+    def __init__(self, items=None, error=None):
+        self.items = items or {}
+        self.error = error
+        self.requested = []
+
+    def get_item(self, Key):
+        self.requested.append(Key)
+        if self.error:
+            raise self.error
+        item = self.items.get(Key['user_id'])
+        return {'Item': item} if item else {}
+
+def cognito_event(groups, sub='user-sub-1', claims_override=None):
+    """A TokenGeneration_HostedAuth-style event as Cognito sends it"""
+    return {
+        'version': '1',
+        'triggerSource': 'TokenGeneration_HostedAuth',
+        'region': 'us-east-1',
+        'userPoolId': 'us-east-1_TESTPOOL',
+        'userName': sub,
+        'callerContext': {'awsSdkVersion': 'aws-sdk-unknown-unknown', 'clientId': 'test-client-id'},
+        'request': {
+            'userAttributes': {'sub': sub, 'email': 'user@example.com'},
+            'groupConfiguration': {
+                'groupsToOverride': groups,
+                'iamRolesToOverride': [],
+                'preferredRole': None
+            }
+        },
+        'response': {'claimsOverrideDetails': claims_override}
+    }
+
+def added_claims(event):
+    return ((event.get('response') or {}).get('claimsOverrideDetails') or {}).get('claimsToAddOrOverride') or {}
+
+def test_trial_user_gets_expiry_claim_in_epoch_seconds(add_trial_claim):
+    add_trial_claim.users_table = FakeUsersTable({'user-sub-1': {'trial_expires_at': '2026-11-01T12:00:00+00:00'}})
+
+    event = add_trial_claim.handler(cognito_event(['premium-trial']), None)
+
+    expected = int(datetime(2026, 11, 1, 12, tzinfo=timezone.utc).timestamp())
+    assert added_claims(event) == {'trial_expires_at': str(expected)}
+    assert add_trial_claim.users_table.requested == [{'user_id': 'user-sub-1'}]
+
+def test_naive_timestamps_are_read_as_utc(add_trial_claim):
+    add_trial_claim.users_table = FakeUsersTable({'user-sub-1': {'trial_expires_at': '2026-11-01T12:00:00'}})
+
+    event = add_trial_claim.handler(cognito_event(['premium-trial']), None)
+
+    assert added_claims(event)['trial_expires_at'] == str(int(datetime(2026, 11, 1, 12, tzinfo=timezone.utc).timestamp()))
+
+def test_existing_claim_overrides_are_kept(add_trial_claim):
+    add_trial_claim.users_table = FakeUsersTable({'user-sub-1': {'trial_expires_at': 1790000000}})
+    claims_override = {'claimsToAddOrOverride': {'plan': 'trial'}, 'claimsToSuppress': ['phone_number']}
+
+    event = add_trial_claim.handler(cognito_event(['free-tier', 'premium-trial'], claims_override=claims_override), None)
+
+    details = event['response']['claimsOverrideDetails']
+    assert details['claimsToAddOrOverride'] == {'plan': 'trial', 'trial_expires_at': '1790000000'}
+    assert details['claimsToSuppress'] == ['phone_number']
+
+@pytest.mark.parametrize('groups', [['free-tier'], ['premium-tier'], []])
+def test_non_trial_users_are_left_alone_without_a_lookup(add_trial_claim, groups):
+    add_trial_claim.users_table = FakeUsersTable()
+    event = cognito_event(groups)
+
+    result = add_trial_claim.handler(copy.deepcopy(event), None)
+
+    assert result == event
+    assert add_trial_claim.users_table.requested == []
+
+def test_trial_user_without_stored_expiry_gets_no_claim(add_trial_claim):
+    add_trial_claim.users_table = FakeUsersTable()
+
+    event = add_trial_claim.handler(cognito_event(['premium-trial']), None)
+
+    assert added_claims(event) == {}
+
+def test_table_errors_do_not_block_sign_in(add_trial_claim):
+    add_trial_claim.users_table = FakeUsersTable(error=RuntimeError('DynamoDB unavailable'))
+
+    event = add_trial_claim.handler(cognito_event(['premium-trial']), None)
+
+    assert event['request']['userAttributes']['sub'] == 'user-sub-1'
+    assert added_claims(event) == {}
+
+def test_event_without_group_configuration(add_trial_claim):
+    add_trial_claim.users_table = FakeUsersTable()
+    event = {'request': {'userAttributes': {'sub': 'user-sub-1'}}, 'response': {}}
+
+    assert add_trial_claim.handler(event, None) == event
@@ -0,0 +1,58 @@
+"""
+Batch uploads (/api/upload/batch) against moto S3
+"""
+import hashlib
+import io
+
+import app
+import url_shortener
+from database import find_file_by_hash
+from file_catalog import get_catalog_file
+
+def batch_files(*contents):
+    return {'files': [(io.BytesIO(body), f'file{i}.txt') for i, body in enumerate(contents)]}
+
+def test_batch_uploads_are_indexed_for_dedupe_and_catalogued_with_etags(client, auth_headers, s3_bucket):
+    response = client.post('/api/upload/batch', headers=auth_headers('batch@example.com'),
+                           data=batch_files(b'first', b'second'), content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    for i, body in enumerate((b'first', b'second')):
+        file_key = f'batch@example.com/file{i}.txt'
+        etag = app.s3.head_object(Bucket=s3_bucket, Key=file_key)['ETag']
+        indexed = find_file_by_hash(hashlib.sha256(body).hexdigest(), 'batch@example.com')
+        assert (indexed['file_key'], indexed['etag']) == (file_key, etag)
+        assert get_catalog_file(file_key)['ETag'] == etag
+
+def test_batch_links_are_created_in_one_call(client, auth_headers, s3_bucket, monkeypatch):
+    calls = []
+    create_file_short_urls = app.create_file_short_urls
+
+    def counting_create(bucket, file_keys, *args):
+        calls.append(list(file_keys))
+        return create_file_short_urls(bucket, file_keys, *args)
+    monkeypatch.setattr(app, 'create_file_short_urls', counting_create)
+
+    response = client.post('/api/upload/batch', headers=auth_headers('batchlinks@example.com'),
+                           data={**batch_files(b'a', b'b', b'c'), 'create_links': 'true'},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert calls == [[f'batchlinks@example.com/file{i}.txt' for i in range(3)]]
+    for result in response.get_json()['results']:
+        link = url_shortener.get_full_url(result['short_code'])
+        assert link['file_key'] == result['file_name']
+        assert result['download_url'].endswith(f"/s/{result['short_code']}")
+
+def test_names_that_sanitize_alike_are_not_uploaded_twice(client, auth_headers, s3_bucket):
+    files = [(io.BytesIO(b'first'), 'a&b.txt'), (io.BytesIO(b'second'), 'a#b.txt'), (io.BytesIO(b'third'), 'c.txt')]
+
+    response = client.post('/api/upload/batch', headers=auth_headers('batchdupes@example.com'),
+                           data={'files': files}, content_type='multipart/form-data')
+
+    assert response.status_code == 207
+    results = response.get_json()['results']
+    assert [result['success'] for result in results] == [True, False, True]
+    assert results[1]['file_name'] == 'batchdupes@example.com/a-b.txt'
+    stored = app.s3.get_object(Bucket=s3_bucket, Key='batchdupes@example.com/a-b.txt')['Body'].read()
+    assert stored == b'first'
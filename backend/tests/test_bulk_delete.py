@@ -0,0 +1,49 @@
+"""
+Bulk file deletion (/api/files/delete)
+"""
+import app
+import url_shortener
+from file_catalog import add_catalog_file, ensure_user_catalog, get_catalog_file
+
+def store_files(s3_bucket, user_folder, names):
+    ensure_user_catalog(app.s3, s3_bucket, user_folder)
+    for name in names:
+        app.s3.put_object(Bucket=s3_bucket, Key=f'{user_folder}/{name}', Body=b'data')
+        add_catalog_file(f'{user_folder}/{name}', 4)
+    return [f'{user_folder}/{name}' for name in names]
+
+def delete_files(client, headers, file_keys):
+    return client.post('/api/files/delete', headers=headers, json={'file_keys': file_keys})
+
+def test_only_the_callers_files_are_deleted(client, auth_headers, s3_bucket):
+    mine = store_files(s3_bucket, 'delete-mine@example.com', ['a.txt', 'b.txt', 'keep.txt'])
+    theirs = store_files(s3_bucket, 'delete-theirs@example.com', ['a.txt'])
+    link = url_shortener.create_file_short_url(s3_bucket, mine[0], 'delete-mine@example.com', 3)
+
+    response = delete_files(client, auth_headers('delete-mine@example.com'),
+                            mine[:2] + theirs + ['delete-mine@example.com/missing.txt'])
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [result['success'] for result in body['results']] == [True, True, False, False]
+    assert body['results'][2]['error'] == 'Access denied - file does not belong to user'
+    assert body['results'][3]['error'] == 'File not found'
+    assert body['deleted_links'] == 1
+    assert get_catalog_file(mine[0]) is None and get_catalog_file(mine[1]) is None
+    assert get_catalog_file(mine[2]) is not None and get_catalog_file(theirs[0]) is not None
+    remaining = {obj['Key'] for obj in app.s3.list_objects_v2(Bucket=s3_bucket)['Contents']}
+    assert remaining == {mine[2], theirs[0]}
+    assert url_shortener.get_full_url(link['short_code']) is None
+
+def test_existence_is_checked_without_listing_the_folder(client, auth_headers, s3_bucket, monkeypatch):
+    file_keys = store_files(s3_bucket, 'delete-keyed@example.com', [f'{i}.txt' for i in range(10)])
+
+    def no_listing(*args, **kwargs):
+        raise AssertionError('whole catalog listed for a bulk delete')
+    monkeypatch.setattr(app, 'list_catalog_page', no_listing)
+    monkeypatch.setattr('file_catalog.list_catalog_files', no_listing)
+
+    response = delete_files(client, auth_headers('delete-keyed@example.com'), file_keys[:2])
+
+    assert response.status_code == 200
+    assert get_catalog_file(file_keys[2]) is not None
@@ -0,0 +1,135 @@
+"""
+Keyset pagination of file listings (/api/files and both catalog stores)
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app
+from file_catalog import add_catalog_file, remove_catalog_file, ensure_user_catalog, format_timestamp
+
+BASE_TIME = datetime(2026, 1, 1, tzinfo=timezone.utc)
+FILE_COUNT = 23
+PAGE_SIZE = 5
+
+def catalog_entries(user_folder, count=FILE_COUNT):
+    """(file_key, last_modified) pairs; files come in pairs sharing a timestamp, to exercise tie-breaking"""
+    return [(f'{user_folder}/file{i:03d}.txt', BASE_TIME + timedelta(minutes=i // 2)) for i in range(count)]
+
+def expected_order(entries, sort):
+    if sort == 'name':
+        return sorted(file_key for file_key, _ in entries)
+    return [file_key for file_key, _ in sorted(sorted(entries), key=lambda entry: entry[1], reverse=True)]
+
+@pytest.fixture
+def catalogued_folder(s3_bucket):
+    """Catalog FILE_COUNT files for a user whose (empty) S3 folder is already reconciled"""
+    def make(user_folder):
+        ensure_user_catalog(app.s3, s3_bucket, user_folder)
+        entries = catalog_entries(user_folder)
+        for file_key, last_modified in entries:
+            add_catalog_file(file_key, 10, last_modified=last_modified)
+        return entries
+    return make
+
+def fetch_page(client, headers, sort, cursor=None):
+    query = {'page_size': PAGE_SIZE, 'sort': sort}
+    if cursor:
+        query['cursor'] = cursor
+    response = client.get('/api/files', headers=headers, query_string=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+@pytest.mark.parametrize('sort', ['newest', 'name'])
+def test_pages_cover_the_folder_once_in_order(client, auth_headers, catalogued_folder, sort):
+    user_folder = f'pages-{sort}@example.com'
+    entries = catalogued_folder(user_folder)
+    headers = auth_headers(user_folder)
+
+    pages = [fetch_page(client, headers, sort)]
+    while pages[-1]['next_cursor']:
+        pages.append(fetch_page(client, headers, sort, pages[-1]['next_cursor']))
+
+    assert [f['key'] for page in pages for f in page['files']] == expected_order(entries, sort)
+    assert [len(page['files']) for page in pages] == [5, 5, 5, 5, 3]
+    assert pages[0]['total_count'] == FILE_COUNT
+    assert all(page['total_count'] is None for page in pages[1:])
+
+@pytest.mark.parametrize('sort', ['newest', 'name'])
+def test_changes_between_requests_do_not_shift_later_pages(client, auth_headers, catalogued_folder, sort):
+    user_folder = f'pages-shift-{sort}@example.com'
+    entries = catalogued_folder(user_folder)
+    headers = auth_headers(user_folder)
+    order = expected_order(entries, sort)
+
+    first = fetch_page(client, headers, sort)
+    # A new upload sorting before the cursor, and a delete of an already-listed file
+    add_catalog_file(f'{user_folder}/000-new.txt', 10)
+    remove_catalog_file(order[0])
+    second = fetch_page(client, headers, sort, first['next_cursor'])
+
+    assert [f['key'] for f in second['files']] == order[PAGE_SIZE:PAGE_SIZE * 2]
+
+def test_cursor_for_another_sort_is_rejected(client, auth_headers, catalogued_folder):
+    user_folder = 'pages-mixed@example.com'
+    catalogued_folder(user_folder)
+    headers = auth_headers(user_folder)
+    cursor = fetch_page(client, headers, 'name')['next_cursor']
+
+    response = client.get('/api/files', headers=headers,
+                          query_string={'page_size': PAGE_SIZE, 'sort': 'newest', 'cursor': cursor})
+
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('sort', ['newest', 'name'])
+def test_dynamodb_pages_are_read_with_bounded_queries(dynamodb_adapter, monkeypatch, sort):
+    user_folder = f'dynamo-{sort}@example.com'
+    entries = catalog_entries(user_folder)
+    for file_key, last_modified in entries:
+        dynamodb_adapter.upsert_catalog_file(file_key, user_folder, 10, format_timestamp(last_modified),
+                                             format_timestamp())
+    dynamodb_adapter.set_catalog_reconciled_at(user_folder, format_timestamp())
+
+    queries = []
+    query = dynamodb_adapter.files_table.query
+
+    def recording_query(**params):
+        response = query(**params)
+        queries.append((params.get('Limit'), len(response.get('Items', []))))
+        return response
+    monkeypatch.setattr(dynamodb_adapter.files_table, 'query', recording_query)
+
+    listed, after = [], None
+    while True:
+        page = dynamodb_adapter.list_catalog_page(user_folder, sort, after, PAGE_SIZE)
+        listed.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+        last = page[-1]
+        after = last['file_key'] if sort == 'name' else [last['last_modified'], last['file_key']]
+
+    keys = [entry['file_key'] for entry in listed]
+    assert sorted(keys) == sorted(file_key for file_key, _ in entries)  # Marker item left out, nothing repeated
+    if sort == 'name':
+        assert keys == expected_order(entries, sort)
+    else:
+        modified = [entry['last_modified'] for entry in listed]
+        assert modified == sorted(modified, reverse=True)
+    assert queries and all(limit == PAGE_SIZE and returned <= PAGE_SIZE for limit, returned in queries)
+    assert dynamodb_adapter.count_catalog_files(user_folder) == FILE_COUNT
+
+def test_dynamodb_keyed_lookup_reads_only_the_requested_items(dynamodb_adapter, monkeypatch):
+    user_folder = 'dynamo-keyed@example.com'
+    entries = catalog_entries(user_folder, 150)
+    for file_key, last_modified in entries:
+        dynamodb_adapter.upsert_catalog_file(file_key, user_folder, 10, format_timestamp(last_modified),
+                                             format_timestamp())
+
+    def no_query(**params):
+        raise AssertionError('folder queried for a keyed lookup')
+    monkeypatch.setattr(dynamodb_adapter.files_table, 'query', no_query)
+    wanted = [file_key for file_key, _ in entries[::2]] + [f'{user_folder}/missing.txt']
+
+    found = dynamodb_adapter.get_catalog_files(wanted, user_folder)
+
+    assert sorted(entry['file_key'] for entry in found) == sorted(wanted[:-1])
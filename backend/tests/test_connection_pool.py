@@ -0,0 +1,32 @@
+"""
+Pooled SQLite connections (database.get_db_connection)
+"""
+import database
+
+def test_pooled_connections_use_wal_and_the_tuned_pragmas():
+    with database.get_db_connection() as conn:
+        pragmas = {name: conn.execute(f'PRAGMA {name}').fetchone()[0]
+                   for name in ('journal_mode', 'busy_timeout', 'synchronous', 'cache_size')}
+
+    assert pragmas == {
+        'journal_mode': 'wal',
+        'busy_timeout': database.SQLITE_BUSY_TIMEOUT_MS,
+        'synchronous': 1,  # NORMAL
+        'cache_size': -database.SQLITE_CACHE_SIZE_KB
+    }
+
+def test_connections_are_reused_and_reset(monkeypatch):
+    opened = []
+    open_connection = database._open_connection
+    monkeypatch.setattr(database, '_open_connection', lambda: opened.append(1) or open_connection())
+    database.close_db_connections()
+
+    with database.get_db_connection() as conn:
+        first = conn
+        conn.execute("INSERT INTO url_mappings (short_code, full_url) VALUES ('pool01', 'https://example.com')")
+    with database.get_db_connection() as conn:
+        assert conn is first
+        # Work left uncommitted by the previous block was rolled back
+        assert conn.execute("SELECT 1 FROM url_mappings WHERE short_code = 'pool01'").fetchone() is None
+
+    assert len(opened) == 1
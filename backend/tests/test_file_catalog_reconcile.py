@@ -0,0 +1,61 @@
+"""
+File catalog reconciliation (admin endpoint and first use), against moto S3
+"""
+import threading
+import time
+
+import pytest
+
+import app
+import file_catalog
+from file_catalog import list_catalog_files
+
+@pytest.mark.parametrize('headers', [{}, {'X-Admin-Token': 'wrong'}])
+def test_reconcile_requires_the_admin_token(client, admin_token, s3_bucket, monkeypatch, headers):
+    calls = []
+    monkeypatch.setattr(app, 'reconcile_file_catalog', lambda *args: calls.append(args) or {})
+
+    response = client.post('/api/admin/reconcile-file-catalog', headers=headers)
+
+    assert response.status_code == 401
+    assert calls == []
+
+def test_reconcile_is_disabled_without_an_admin_token(client, s3_bucket, monkeypatch):
+    monkeypatch.setattr(app, 'ADMIN_API_TOKEN', None)
+
+    response = client.post('/api/admin/reconcile-file-catalog', headers={'X-Admin-Token': ''})
+
+    assert response.status_code == 403
+
+def test_reconcile_catalogues_existing_objects(client, admin_token, s3_bucket):
+    app.s3.put_object(Bucket=s3_bucket, Key='reconcile@example.com/a.txt', Body=b'hello')
+
+    response = client.post('/api/admin/reconcile-file-catalog', headers=admin_token)
+
+    assert response.status_code == 200
+    assert [obj['Key'] for obj in list_catalog_files('reconcile@example.com')] == ['reconcile@example.com/a.txt']
+
+def test_first_use_reconciles_do_not_block_other_folders(client, auth_headers, s3_bucket, monkeypatch):
+    release = threading.Event()
+    reconcile = file_catalog.reconcile_user_catalog
+
+    def slow_reconcile(s3, bucket, user_folder, *args, **kwargs):
+        if user_folder == 'reconcile-slow@example.com':
+            release.wait(10)
+        return reconcile(s3, bucket, user_folder, *args, **kwargs)
+    monkeypatch.setattr(file_catalog, 'reconcile_user_catalog', slow_reconcile)
+    monkeypatch.setattr(file_catalog, 'CATALOG_RECONCILE_WAIT_SECONDS', 0.2)
+    headers = auth_headers('reconcile-slow@example.com')
+
+    busy = client.get('/api/files', headers=headers)
+    assert busy.status_code == 503
+    assert busy.headers['Retry-After']
+
+    # Another user's first request is not queued behind the slow folder
+    started = time.monotonic()
+    file_catalog.ensure_user_catalog(app.s3, s3_bucket, 'reconcile-quick@example.com')
+    assert time.monotonic() - started < 1
+
+    release.set()
+    monkeypatch.setattr(file_catalog, 'CATALOG_RECONCILE_WAIT_SECONDS', 5)
+    assert client.get('/api/files', headers=headers).status_code == 200
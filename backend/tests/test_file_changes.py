@@ -0,0 +1,166 @@
+"""
+Delta sync (/api/files/changes) and the shared DynamoDB change log
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+import change_log
+import click_counter
+import url_shortener
+from dynamodb_adapter import DynamoDBAdapter
+from file_catalog import add_catalog_file, ensure_user_catalog, remove_catalog_file
+
+@pytest.fixture
+def shared_change_log(dynamodb_adapter, monkeypatch):
+    """Point change_log at the DynamoDB table, as with USE_DYNAMODB=true"""
+    monkeypatch.setattr(change_log, '_record_in_transaction', lambda changes, cursor: None)
+    monkeypatch.setattr(change_log, '_record_after_commit', dynamodb_adapter.record_changes)
+    monkeypatch.setattr(change_log, '_record', dynamodb_adapter.record_changes)
+    monkeypatch.setattr(change_log, '_get_since', dynamodb_adapter.get_changes_since)
+    monkeypatch.setattr(change_log, '_get_cursor', dynamodb_adapter.get_change_cursor)
+    monkeypatch.setattr(change_log, '_get_pruned_through', dynamodb_adapter.get_change_log_pruned_through)
+    monkeypatch.setattr(change_log, '_prune', dynamodb_adapter.prune_change_log)
+    return dynamodb_adapter
+
+def changes_cursor(client, headers):
+    response = client.get('/api/files', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['changes_cursor']
+
+def fetch_changes(client, headers, since):
+    return client.get('/api/files/changes', headers=headers, query_string={'since': since})
+
+@pytest.mark.parametrize('store', ['sqlite', 'dynamodb'])
+def test_changes_since_the_listing_cursor(client, auth_headers, s3_bucket, request, store):
+    if store == 'dynamodb':
+        request.getfixturevalue('shared_change_log')
+    user_folder = f'changes-{store}@example.com'
+    headers = auth_headers(user_folder)
+    ensure_user_catalog(app.s3, s3_bucket, user_folder)
+    add_catalog_file(f'{user_folder}/old.txt', 10)
+    since = changes_cursor(client, headers)
+
+    add_catalog_file(f'{user_folder}/new.txt', 20)
+    remove_catalog_file(f'{user_folder}/old.txt')
+    response = fetch_changes(client, headers, since)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [f['key'] for f in body['files']] == [f'{user_folder}/new.txt']
+    assert body['removed_files'] == [f'{user_folder}/old.txt']
+    assert fetch_changes(client, headers, body['next_cursor']).get_json()['files'] == []
+
+def test_link_writes_and_clicks_reach_the_shared_log(shared_change_log):
+    user_email = 'links-shared@example.com'
+    short_code = url_shortener.create_short_url('https://example.com/shared', user_email)['short_code']
+    url_shortener.get_full_url(short_code)
+    click_counter.flush_clicks()
+    url_shortener.delete_short_url(short_code, user_email)
+
+    changes = shared_change_log.get_changes_since(user_email, 0, 10)
+    assert [(change['item_key'], change['change']) for change in changes] == [
+        (short_code, 'upsert'), (short_code, 'upsert'), (short_code, 'delete')]
+    assert [change['payload']['click_count'] for change in changes[:2]] == [0, 1]
+    assert changes[0]['payload']['full_url'] == 'https://example.com/shared'
+
+def test_links_are_served_from_the_logged_state(client, auth_headers, s3_bucket, shared_change_log, monkeypatch):
+    user_email = 'links-payload@example.com'
+    headers = auth_headers(user_email)
+    since = changes_cursor(client, headers)
+    kept = url_shortener.create_short_url('https://example.com/kept', user_email)['short_code']
+    gone = url_shortener.create_short_url('https://example.com/gone', user_email)['short_code']
+    url_shortener.delete_short_url(gone, user_email)
+
+    # Another task has none of these links in its own table
+    def no_local_links(*args, **kwargs):
+        raise AssertionError('link resolved from the local table')
+    monkeypatch.setattr(url_shortener, 'get_db_connection', no_local_links)
+    body = fetch_changes(client, headers, since).get_json()
+
+    assert [(link['short_code'], link['full_url']) for link in body['links']] == [(kept, 'https://example.com/kept')]
+    assert body['links'][0]['short_url'].endswith(f'/s/{kept}')
+    assert body['removed_links'] == [gone]
+
+def test_seqs_are_allocated_per_user(dynamodb_adapter):
+    other_task = DynamoDBAdapter()
+
+    dynamodb_adapter.record_changes([('a@example.com', 'file', 'a@example.com/1.txt', 'upsert')])
+    other_task.record_changes([('a@example.com', 'file', 'a@example.com/2.txt', 'upsert'),
+                               ('b@example.com', 'link', 'abc123', 'upsert')])
+    dynamodb_adapter.record_changes([('a@example.com', 'file', 'a@example.com/1.txt', 'delete')])
+
+    changes = other_task.get_changes_since('a@example.com', 0, 10)
+    assert [change['seq'] for change in changes] == [1, 2, 3]
+    assert [change['item_key'] for change in changes] == ['a@example.com/1.txt', 'a@example.com/2.txt',
+                                                         'a@example.com/1.txt']
+    assert dynamodb_adapter.get_changes_since('a@example.com', 2, 10)[0]['change'] == 'delete'
+    assert dynamodb_adapter.get_change_cursor('a@example.com') == 3
+    assert dynamodb_adapter.get_change_cursor('b@example.com') == 1
+
+def test_large_batches_get_consecutive_seqs(dynamodb_adapter):
+    changes = [('bulk@example.com', 'file', f'bulk@example.com/{i}.txt', 'upsert') for i in range(250)]
+
+    dynamodb_adapter.record_changes(changes)
+
+    listed = dynamodb_adapter.get_changes_since('bulk@example.com', 0, 1000)
+    assert [change['seq'] for change in listed] == list(range(1, 251))
+    assert len(dynamodb_adapter.get_changes_since('bulk@example.com', 0, 100)) == 100
+
+def test_unwritten_entries_expire_cursors(client, auth_headers, shared_change_log, monkeypatch):
+    headers = auth_headers('lost-write@example.com')
+    shared_change_log.record_changes([('lost-write@example.com', 'file', 'lost-write@example.com/a.txt', 'upsert')])
+
+    def failing_batch_writer(*args, **kwargs):
+        raise RuntimeError('throttled')
+    with monkeypatch.context() as patched:
+        patched.setattr(shared_change_log.changes_table, 'batch_writer', failing_batch_writer)
+        shared_change_log.record_changes([('lost-write@example.com', 'file', 'lost-write@example.com/b.txt', 'upsert')])
+
+    assert shared_change_log.get_change_log_pruned_through('lost-write@example.com') == 2
+    assert fetch_changes(client, headers, 1).status_code == 410
+    assert fetch_changes(client, headers, 2).status_code == 200
+
+def test_logging_failures_are_raised(dynamodb_adapter, monkeypatch):
+    def failing(*args, **kwargs):
+        raise RuntimeError('throttled')
+    monkeypatch.setattr(dynamodb_adapter.changes_table, 'batch_writer', failing)
+    monkeypatch.setattr(dynamodb_adapter.changes_table, 'update_item', failing)
+
+    with pytest.raises(RuntimeError):
+        dynamodb_adapter.record_changes([('raise@example.com', 'file', 'raise@example.com/a.txt', 'upsert')])
+
+def test_reads_stop_at_a_missing_seq(dynamodb_adapter):
+    user_key = 'gap@example.com'
+    dynamodb_adapter.record_changes([(user_key, 'file', f'{user_key}/a.txt', 'upsert')])
+    # Seq 2 is allocated but its entry has not landed yet
+    dynamodb_adapter.changes_table.update_item(Key={'user_key': user_key, 'seq': 0},
+                                               UpdateExpression='ADD last_seq :one',
+                                               ExpressionAttributeValues={':one': 1})
+    dynamodb_adapter.record_changes([(user_key, 'file', f'{user_key}/c.txt', 'upsert')])
+
+    assert [change['seq'] for change in dynamodb_adapter.get_changes_since(user_key, 0, 10)] == [1]
+    assert dynamodb_adapter.get_change_log_pruned_through(user_key) == 0
+
+    # Once the grace period has passed, the hole is a lost write
+    changed_at = (datetime.utcnow() - timedelta(minutes=5)).isoformat()
+    dynamodb_adapter.changes_table.update_item(Key={'user_key': user_key, 'seq': 3},
+                                               UpdateExpression='SET changed_at = :at',
+                                               ExpressionAttributeValues={':at': changed_at})
+    assert [change['seq'] for change in dynamodb_adapter.get_changes_since(user_key, 1, 10)] == []
+    assert dynamodb_adapter.get_change_log_pruned_through(user_key) == 2
+
+def test_pruning_raises_the_watermark(client, auth_headers, shared_change_log):
+    headers = auth_headers('pruned@example.com')
+    shared_change_log.record_changes([('pruned@example.com', 'file', 'pruned@example.com/a.txt', 'upsert')] * 3)
+
+    assert shared_change_log.prune_change_log(0) == 3
+
+    assert shared_change_log.get_change_log_pruned_through('pruned@example.com') == 3
+    assert shared_change_log.get_changes_since('pruned@example.com', 0, 10) == []
+    assert fetch_changes(client, headers, 2).status_code == 410
+    assert fetch_changes(client, headers, 3).status_code == 200
+    # The counter survives pruning, so seqs keep rising
+    shared_change_log.record_changes([('pruned@example.com', 'file', 'pruned@example.com/b.txt', 'upsert')])
+    assert shared_change_log.get_latest_change_seq('pruned@example.com') == 4
@@ -0,0 +1,53 @@
+"""
+Bulk file link creation (url_shortener.create_file_short_urls and /api/files/new-links)
+"""
+from datetime import datetime
+
+import app
+import url_shortener
+from file_catalog import add_catalog_file, ensure_user_catalog
+
+def test_reused_and_new_links_report_expiry_in_the_same_format():
+    first_key, second_key = 'links@example.com/a.txt', 'links@example.com/b.txt'
+    created = url_shortener.create_file_short_urls('bucket', [first_key], 'links@example.com', 3)
+
+    results = url_shortener.create_file_short_urls('bucket', [first_key, second_key], 'links@example.com', 3)
+
+    assert results[first_key]['created'] is False
+    assert results[second_key]['created'] is True
+    assert results[first_key]['short_code'] == created[first_key]['short_code']
+    assert results[first_key]['expires_at'] == created[first_key]['expires_at']
+    for result in results.values():
+        assert datetime.fromisoformat(result['expires_at']).isoformat() == result['expires_at']
+
+def test_latest_expiring_link_is_reused(monkeypatch):
+    file_key = 'links-latest@example.com/a.txt'
+    url_shortener.create_file_short_urls('bucket', [file_key], 'links-latest@example.com', 3)
+    with monkeypatch.context() as patch:
+        # Without a dedupe window the second request gets its own, later-expiring link
+        patch.setattr(url_shortener, 'FILE_LINK_DEDUPE_WINDOW', 0)
+        later = url_shortener.create_file_short_urls('bucket', [file_key], 'links-latest@example.com', 3)[file_key]
+    assert later['created'] is True
+
+    reused = url_shortener.create_file_short_urls('bucket', [file_key], 'links-latest@example.com', 3)[file_key]
+
+    assert reused['created'] is False
+    assert reused['short_code'] == later['short_code']
+
+def test_bulk_links_look_up_only_the_requested_files(client, auth_headers, s3_bucket, monkeypatch):
+    user_folder = 'links-keyed@example.com'
+    ensure_user_catalog(app.s3, s3_bucket, user_folder)
+    for i in range(20):
+        add_catalog_file(f'{user_folder}/{i}.txt', 10)
+
+    def no_listing(*args, **kwargs):
+        raise AssertionError('whole catalog listed for a bulk request')
+    monkeypatch.setattr('file_catalog.list_catalog_files', no_listing)
+    file_keys = [f'{user_folder}/3.txt', f'{user_folder}/missing.txt', 'someone-else@example.com/3.txt']
+    response = client.post('/api/files/new-links', headers=auth_headers(user_folder),
+                           json={'file_keys': file_keys, 'expiration_days': 3})
+
+    results = {result['file_key']: result for result in response.get_json()['results']}
+    assert results[f'{user_folder}/3.txt']['success'] is True
+    assert results[f'{user_folder}/missing.txt']['error'] == 'File not found'
+    assert results['someone-else@example.com/3.txt']['error'] == 'Access denied - file does not belong to user'
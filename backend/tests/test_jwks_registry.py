@@ -0,0 +1,115 @@
+"""
+Single-flight JWKS fetching against a local stub JWKS server
+"""
+import threading
+import time
+
+import pytest
+
+import app
+from conftest import SIGNING_KID
+
+CONCURRENT_CALLERS = 20
+
+def run_concurrently(target, count=CONCURRENT_CALLERS):
+    """Start count threads on target at the same moment; returns (results, errors)"""
+    barrier = threading.Barrier(count)
+    results, errors = [], []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        try:
+            result = target()
+            with lock:
+                results.append(result)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    return results, errors
+
+@pytest.fixture
+def registry(jwks_server, monkeypatch):
+    """A cold registry (no keys, no refresh timer) installed as the app's registry"""
+    registry = app.JWKSKeyRegistry(jwks_server.url)
+    monkeypatch.setattr(app, 'jwks_registry', registry)
+    app.clear_verified_token_cache()
+    return registry
+
+def test_concurrent_cold_lookups_share_one_fetch(jwks_server, registry):
+    jwks_server.delay = 0.3  # Keep the fetch in flight while every caller arrives
+
+    results, errors = run_concurrently(lambda: registry.get_signing_key(SIGNING_KID))
+
+    assert errors == []
+    assert len(results) == CONCURRENT_CALLERS
+    assert jwks_server.fetches == 1
+    assert registry.fetch_count == 1
+    assert registry.coalesced_waiters == CONCURRENT_CALLERS - 1
+
+def test_concurrent_cold_verifications_share_one_fetch(jwks_server, registry, make_token):
+    jwks_server.delay = 0.3
+    tokens = [make_token(sub=f'user-{i}') for i in range(CONCURRENT_CALLERS)]
+    next_token = iter(tokens)
+    token_lock = threading.Lock()
+
+    def verify():
+        with token_lock:
+            token = next(next_token)
+        return app.verify_jwt_token(token)
+
+    results, errors = run_concurrently(verify)
+
+    assert errors == []
+    assert sorted(claims['sub'] for claims in results) == sorted(f'user-{i}' for i in range(CONCURRENT_CALLERS))
+    assert jwks_server.fetches == 1
+
+def test_failed_fetch_fails_every_waiter_fast(jwks_server, registry):
+    jwks_server.status = 500
+    jwks_server.delay = 0.3
+
+    started = time.monotonic()
+    results, errors = run_concurrently(lambda: registry.get_signing_key(SIGNING_KID))
+    elapsed = time.monotonic() - started
+
+    assert results == []
+    assert len(errors) == CONCURRENT_CALLERS
+    assert all(isinstance(error, app.SigningKeyNotFoundError) for error in errors)
+    assert jwks_server.fetches == 1
+    assert registry.last_error is not None
+    # Waiters get the leader's failure instead of retrying or waiting out their timeout
+    assert elapsed < app.JWKS_FETCH_WAIT_TIMEOUT
+
+def test_waiters_give_up_after_bounded_wait(jwks_server, registry, monkeypatch):
+    monkeypatch.setattr(app, 'JWKS_FETCH_WAIT_TIMEOUT', 0.2)
+    jwks_server.delay = 1.0
+
+    leader = threading.Thread(target=registry.refresh)
+    leader.start()
+    while registry._inflight_fetch is None:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    assert registry.refresh() is False
+    assert time.monotonic() - started < 0.9
+    leader.join()
+    assert jwks_server.fetches == 1
+
+def test_unknown_kid_after_failed_fetch_is_not_cached_as_bad_token(jwks_server, registry, make_token):
+    jwks_server.status = 500
+    token = make_token()
+
+    with pytest.raises(app.SigningKeyNotFoundError):
+        app.verify_jwt_token(token)
+
+    # JWKS recovers: the same token verifies once the keys can be fetched
+    jwks_server.status = 200
+    registry._last_fetch_attempt = 0
+    assert app.verify_jwt_token(token)['sub'] == 'user-sub-1'
+    assert app.get_cached_token_failure(token) is None
@@ -0,0 +1,114 @@
+"""
+Conditional GETs of /api/files
+"""
+import pytest
+
+import app
+import change_log
+import click_counter
+import database
+import url_shortener
+from file_catalog import add_catalog_file
+
+def get_files(client, headers, etag=None):
+    if etag:
+        headers = {**headers, 'If-None-Match': etag}
+    return client.get('/api/files', headers=headers, query_string={'page_size': 10})
+
+@pytest.fixture
+def folder_with_file(s3_bucket):
+    """Put one object in a user's folder directly, so the first listing has to reconcile it"""
+    def make(user_folder):
+        app.s3.put_object(Bucket=s3_bucket, Key=f'{user_folder}/report.txt', Body=b'report')
+        return f'{user_folder}/report.txt'
+    return make
+
+def test_first_revalidation_is_not_modified(client, auth_headers, folder_with_file):
+    headers = auth_headers('etag-first@example.com')
+    folder_with_file('etag-first@example.com')
+
+    first = get_files(client, headers)
+    second = get_files(client, headers, first.headers['ETag'])
+
+    assert first.status_code == 200
+    assert [f['filename'] for f in first.get_json()['files']] == ['report.txt']
+    assert second.status_code == 304
+    assert second.headers['ETag'] == first.headers['ETag']
+
+def test_not_modified_skips_the_listing(client, auth_headers, folder_with_file, monkeypatch):
+    headers = auth_headers('etag-cheap@example.com')
+    folder_with_file('etag-cheap@example.com')
+    etag = get_files(client, headers).headers['ETag']
+
+    def no_listing(*args, **kwargs):
+        raise AssertionError('listing built for a matching ETag')
+    monkeypatch.setattr(app, 'list_user_objects_page', no_listing)
+    monkeypatch.setattr(app, 'get_user_urls_for_files', no_listing)
+
+    assert get_files(client, headers, etag).status_code == 304
+
+def test_writes_and_lapsed_links_change_the_etag(client, auth_headers, folder_with_file):
+    user_email = 'etag-writes@example.com'
+    headers = auth_headers(user_email)
+    file_key = folder_with_file(user_email)
+    etags = [get_files(client, headers).headers['ETag']]
+
+    def changed():
+        response = get_files(client, headers, etags[-1])
+        etags.append(response.headers['ETag'])
+        return response.status_code == 200
+
+    add_catalog_file(f'{user_email}/second.txt', 5)
+    assert changed()
+
+    short_code = url_shortener.create_file_short_url(app.S3_BUCKET_NAME, file_key, user_email, 3)['short_code']
+    assert changed()
+
+    url_shortener.get_full_url(short_code)
+    click_counter.flush_clicks()
+    assert changed()
+
+    # Expiry removes the link from listings without any write
+    with database.get_db_connection() as conn:
+        conn.execute("UPDATE url_mappings SET expires_at = datetime('now', '-1 minute') WHERE short_code = ?",
+                     (short_code,))
+        conn.commit()
+    assert changed()
+    assert not changed()
+
+def test_pages_have_their_own_etags(client, auth_headers, folder_with_file, s3_bucket):
+    headers = auth_headers('etag-pages@example.com')
+    folder_with_file('etag-pages@example.com')
+    app.s3.put_object(Bucket=s3_bucket, Key='etag-pages@example.com/other.txt', Body=b'other')
+
+    first = client.get('/api/files', headers=headers, query_string={'page_size': 1})
+    second = client.get('/api/files', headers={**headers, 'If-None-Match': first.headers['ETag']},
+                        query_string={'page_size': 1, 'cursor': first.get_json()['next_cursor']})
+
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+
+def test_short_url_revalidation_skips_the_query(client, auth_headers, monkeypatch):
+    user_email = 'etag-links@example.com'
+    headers = auth_headers(user_email)
+    url_shortener.create_short_url('https://example.com/etag', user_email)
+    etag = client.get('/api/short-urls', headers=headers).headers['ETag']
+
+    def no_query(*args, **kwargs):
+        raise AssertionError('links queried for a matching ETag')
+    with monkeypatch.context() as patched:
+        patched.setattr(app, 'get_user_urls', no_query)
+        assert client.get('/api/short-urls', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    url_shortener.create_short_url('https://example.com/etag-2', user_email)
+    response = client.get('/api/short-urls', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 2
+
+def test_unlogged_writes_fail_instead_of_serving_stale_listings(monkeypatch):
+    def failing_log(changes):
+        raise RuntimeError('change log unavailable')
+    monkeypatch.setattr(change_log, '_record', failing_log)
+
+    with pytest.raises(RuntimeError):
+        add_catalog_file('etag-unlogged@example.com/a.txt', 5)
@@ -0,0 +1,126 @@
+"""
+Resumable multipart upload endpoints and the stale-upload cleanup, against moto S3
+"""
+import pytest
+
+import app
+from file_catalog import list_catalog_files
+
+PART = b'x' * (5 * 1024 * 1024)  # S3's minimum size for every part but the last
+
+def start_upload(client, headers, filename='big.bin', file_size=len(PART) + 3):
+    response = client.post('/api/upload/multipart/start', headers=headers,
+                           json={'filename': filename, 'file_size': file_size})
+    assert response.status_code == 200
+    return response.get_json()
+
+def upload_part(bucket, upload, part_number, body):
+    app.s3.upload_part(Bucket=bucket, Key=upload['file_key'], UploadId=upload['upload_id'],
+                       PartNumber=part_number, Body=body)
+
+def open_uploads(bucket):
+    return app.s3.list_multipart_uploads(Bucket=bucket).get('Uploads', [])
+
+def test_upload_resumes_from_listed_parts_and_completes(client, auth_headers, s3_bucket):
+    headers = auth_headers('multipart@example.com')
+    upload = start_upload(client, headers)
+    assert upload['file_key'] == 'multipart@example.com/big.bin'
+
+    part_urls = client.post('/api/upload/multipart/part-urls', headers=headers,
+                            json={**upload, 'part_numbers': [1, 2]}).get_json()
+    assert [part['part_number'] for part in part_urls['parts']] == [1, 2]
+    assert all(upload['upload_id'] in part['url'] for part in part_urls['parts'])
+
+    # Only the first part arrives before the connection drops
+    upload_part(s3_bucket, upload, 1, PART)
+    listed = client.get('/api/upload/multipart/parts', headers=headers, query_string=upload).get_json()
+    assert [part['part_number'] for part in listed['parts']] == [1]
+    assert listed['uploaded_bytes'] == len(PART)
+
+    upload_part(s3_bucket, upload, 2, b'end')
+    response = client.post('/api/upload/multipart/complete', headers=headers, json=upload)
+
+    assert response.status_code == 200
+    assert response.get_json()['size_bytes'] == len(PART) + 3
+    assert response.get_json()['part_count'] == 2
+    stored = app.s3.head_object(Bucket=s3_bucket, Key=upload['file_key'])
+    assert stored['ContentLength'] == len(PART) + 3
+    assert [obj['Key'] for obj in list_catalog_files('multipart@example.com')] == [upload['file_key']]
+    assert open_uploads(s3_bucket) == []
+
+def test_complete_without_parts_is_rejected(client, auth_headers, s3_bucket):
+    headers = auth_headers('noparts@example.com')
+    upload = start_upload(client, headers)
+
+    response = client.post('/api/upload/multipart/complete', headers=headers, json=upload)
+
+    assert response.status_code == 400
+
+def test_abort_discards_the_upload(client, auth_headers, s3_bucket):
+    headers = auth_headers('abort@example.com')
+    upload = start_upload(client, headers)
+    upload_part(s3_bucket, upload, 1, PART)
+
+    response = client.post('/api/upload/multipart/abort', headers=headers, json=upload)
+
+    assert response.status_code == 200
+    assert open_uploads(s3_bucket) == []
+
+def test_other_users_uploads_are_refused(client, auth_headers, s3_bucket):
+    upload = start_upload(client, auth_headers('owner@example.com'))
+    intruder = auth_headers('intruder@example.com')
+
+    for method, path in (('post', '/api/upload/multipart/complete'), ('post', '/api/upload/multipart/abort'),
+                         ('get', '/api/upload/multipart/parts')):
+        if method == 'get':
+            response = client.get(path, headers=intruder, query_string=upload)
+        else:
+            response = client.post(path, headers=intruder, json=upload)
+        assert response.status_code == 403
+
+    assert len(open_uploads(s3_bucket)) == 1
+
+def test_oversized_start_is_rejected(client, auth_headers, s3_bucket):
+    response = client.post('/api/upload/multipart/start', headers=auth_headers('huge@example.com'),
+                           json={'filename': 'huge.bin', 'file_size': app.MAX_MULTIPART_UPLOAD_SIZE_BYTES + 1})
+
+    assert response.status_code == 413
+    assert open_uploads(s3_bucket) == []
+
+def test_cleanup_is_disabled_without_an_admin_token(client, s3_bucket, monkeypatch):
+    monkeypatch.setattr(app, 'ADMIN_API_TOKEN', None)
+
+    response = client.post('/api/admin/cleanup-stale-uploads', headers={'X-Admin-Token': ''})
+
+    assert response.status_code == 403
+
+@pytest.mark.parametrize('headers', [{}, {'X-Admin-Token': 'wrong'}])
+def test_cleanup_requires_the_admin_token(client, admin_token, s3_bucket, headers):
+    response = client.post('/api/admin/cleanup-stale-uploads?max_age_hours=0', headers=headers)
+
+    assert response.status_code == 401
+
+def test_cleanup_age_is_clamped_to_the_minimum(client, admin_token, s3_bucket, monkeypatch):
+    requested_ages = []
+    monkeypatch.setattr(app, 'abort_stale_multipart_uploads',
+                        lambda s3, bucket, max_age_hours: requested_ages.append(max_age_hours) or 0)
+
+    for max_age_hours in (0, app.MIN_STALE_UPLOAD_AGE_HOURS * 2):
+        response = client.post(f'/api/admin/cleanup-stale-uploads?max_age_hours={max_age_hours}', headers=admin_token)
+        assert response.status_code == 200
+
+    assert requested_ages == [app.MIN_STALE_UPLOAD_AGE_HOURS, app.MIN_STALE_UPLOAD_AGE_HOURS * 2]
+
+def test_cleanup_aborts_uploads_past_the_cutoff(client, auth_headers, admin_token, s3_bucket):
+    # moto reports every multipart upload as initiated in 2010
+    start_upload(client, auth_headers('stale@example.com'))
+
+    response = client.post('/api/admin/cleanup-stale-uploads', headers=admin_token)
+
+    assert response.get_json()['aborted_count'] == 1
+    assert open_uploads(s3_bucket) == []
+
+def test_cleanup_rejects_a_non_numeric_age(client, admin_token, s3_bucket):
+    response = client.post('/api/admin/cleanup-stale-uploads?max_age_hours=soon', headers=admin_token)
+
+    assert response.status_code == 400
@@ -0,0 +1,111 @@
+"""
+Query plans of the url_shortener, file catalog and user_management statements
+
+Seeds a scratch database, calls the shortener, catalog and trial-status
+functions with SQL tracing on, and runs EXPLAIN QUERY PLAN on every statement
+they issued. A statement fails if it scans a whole table or index or sorts
+through a temp B-tree, so index regressions show up before they reach a large
+url_mappings or file_catalog table.
+"""
+import random
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import url_shortener
+import user_management
+
+BAD_PLAN = re.compile(r'^SCAN (TABLE )?\w+|USE TEMP B-TREE')
+CHECKED_STATEMENT = re.compile(r'^\s*(SELECT|UPDATE|DELETE|INSERT\b.*\bSELECT\b)', re.IGNORECASE | re.DOTALL)
+
+SEED_ROWS = 20000
+SEED_USERS = 200
+BUCKET = 'plan-check-bucket'
+EMAIL = 'planuser1@example.com'
+FILE_KEYS = [f'{EMAIL}/file{i}.txt' for i in (1, 201, 401)]
+
+CALLS = [
+    ('create_short_url', lambda: url_shortener.create_short_url('https://example.com/a', EMAIL)),
+    ('create_short_url (existing)', lambda: url_shortener.create_short_url('https://example.com/a', EMAIL)),
+    ('create_file_short_urls', lambda: url_shortener.create_file_short_urls(BUCKET, FILE_KEYS, EMAIL, 3)),
+    ('get_full_url', lambda: url_shortener.get_full_url('plan1')),
+    ('get_user_urls', lambda: url_shortener.get_user_urls(EMAIL)),
+    ('get_user_urls_for_files', lambda: url_shortener.get_user_urls_for_files(EMAIL, FILE_KEYS)),
+    ('get_next_link_expiry', lambda: url_shortener.get_next_link_expiry(EMAIL)),
+    ('delete_short_url', lambda: url_shortener.delete_short_url('plan201', EMAIL)),
+    ('delete_file_short_urls', lambda: url_shortener.delete_file_short_urls(FILE_KEYS[2:])),
+    ('list_catalog_page (newest)',
+     lambda: database.list_catalog_page(EMAIL, 'newest', ['2026-01-01T00:00:00.000000+00:00', FILE_KEYS[0]], 50)),
+    ('list_catalog_page (name)', lambda: database.list_catalog_page(EMAIL, 'name', FILE_KEYS[0], 50)),
+    ('count_catalog_files', lambda: database.count_catalog_files(EMAIL)),
+    ('get_user_trial_status', lambda: user_management.get_user_trial_status(EMAIL, 'planuser-1')),
+    ('get_user_trial_status (new user)',
+     lambda: user_management.get_user_trial_status('plan-new@example.com', 'planuser-new')),
+]
+
+def seed(db_path):
+    """Fill users and url_mappings with rows spread across SEED_USERS users"""
+    now = datetime.now()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO users (user_id, email, user_tier) VALUES (?, ?, ?)',
+            [(f'planuser-{i}', f'planuser{i}@example.com', 'Free') for i in range(SEED_USERS)]
+        )
+        batch = []
+        for i in range(SEED_ROWS):
+            email = f'planuser{i % SEED_USERS}@example.com'
+            file_key = f'{email}/file{i}.txt'
+            created_at = now - timedelta(minutes=SEED_ROWS - i)
+            expires_at = created_at + timedelta(days=random.choice((1, 3, 7)))
+            batch.append((f'plan{i}', url_shortener.make_s3_link(BUCKET, file_key), email,
+                          file_key, f'file{i}.txt', created_at, expires_at))
+        conn.executemany('''
+            INSERT INTO url_mappings
+                (short_code, full_url, created_by_user, file_key, filename, created_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+
+@pytest.fixture(scope='module')
+def captured_statements(tmp_path_factory):
+    """Run every call in CALLS against a seeded scratch database and collect the SQL each one issued"""
+    db_path = str(tmp_path_factory.mktemp('query-plans') / 'plans.db')
+    original_path = database.DB_PATH
+    open_connection = database._open_connection
+    statements = []
+
+    def traced_connection():
+        conn = open_connection()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    database.close_db_connections()
+    database.DB_PATH = db_path
+    database._open_connection = traced_connection
+    try:
+        database.init_database()
+        seed(db_path)
+        captured = {}
+        for name, call in CALLS:
+            del statements[:]
+            call()
+            captured[name] = list(dict.fromkeys(sql for sql in statements if CHECKED_STATEMENT.match(sql)))
+    finally:
+        database._open_connection = open_connection
+        database.close_db_connections()
+        database.DB_PATH = original_path
+    return db_path, captured
+
+@pytest.mark.parametrize('name', [name for name, _ in CALLS])
+def test_statements_use_indexes_without_temp_sorts(captured_statements, name):
+    db_path, captured = captured_statements
+    assert captured[name], f"{name} issued no checked statements"
+
+    with sqlite3.connect(db_path) as conn:
+        for sql in captured[name]:
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+            bad = [step for step in plan if BAD_PLAN.search(step)]
+            assert not bad, f"{' '.join(sql.split())}\nplan: {plan}"
@@ -0,0 +1,110 @@
+"""
+Short URL redirects (url_shortener.get_full_url and /s/<short_code>)
+"""
+from urllib.parse import urlparse, parse_qs, unquote
+
+import pytest
+
+import app
+import click_counter
+import redirect_cache
+import url_shortener
+
+@pytest.fixture
+def short_code(request):
+    click_counter.flush_clicks()
+    target = f'https://example.com/{request.node.name}'
+    short_code = url_shortener.create_short_url(target, 'redirects@example.com')['short_code']
+    yield short_code
+    redirect_cache.invalidate_redirect(short_code)
+
+def test_click_counts_survive_a_flush(short_code):
+    counts = [url_shortener.get_full_url(short_code)['click_count'] for _ in range(3)]
+    click_counter.flush_clicks()
+    counts += [url_shortener.get_full_url(short_code)['click_count'] for _ in range(2)]
+    click_counter.flush_clicks()
+
+    assert counts == [1, 2, 3, 4, 5]
+    redirect_cache.invalidate_redirect(short_code)
+    assert url_shortener.get_full_url(short_code)['click_count'] == 6
+
+def test_reads_overlapping_a_flush_are_not_cached(short_code, monkeypatch):
+    url_shortener.get_full_url(short_code)
+    redirect_cache.invalidate_redirect(short_code)
+
+    # A flush completes while the redirect is reading the stored count
+    get_db_connection = url_shortener.get_db_connection
+    def flushing_connection():
+        click_counter.flush_clicks()
+        return get_db_connection()
+    with monkeypatch.context() as patched:
+        patched.setattr(url_shortener, 'get_db_connection', flushing_connection)
+        assert url_shortener.get_full_url(short_code)['click_count'] == 2
+
+    assert redirect_cache.get_cached_redirect(short_code) is None
+    assert url_shortener.get_full_url(short_code)['click_count'] == 3
+    assert url_shortener.get_full_url(short_code)['click_count'] == 4
+
+def test_cache_hits_skip_the_database(short_code, monkeypatch):
+    url_shortener.get_full_url(short_code)
+
+    def no_database():
+        raise AssertionError('database read on a cache hit')
+    monkeypatch.setattr(url_shortener, 'get_db_connection', no_database)
+
+    assert url_shortener.get_full_url(short_code)['full_url'] == 'https://example.com/test_cache_hits_skip_the_database'
+    assert redirect_cache.get_redirect_cache_stats()['hits'] >= 1
+
+def test_file_links_are_signed_on_redirect(client, s3_bucket):
+    app.s3.put_object(Bucket=s3_bucket, Key='redirects@example.com/report.pdf', Body=b'report')
+    link = url_shortener.create_file_short_url(s3_bucket, 'redirects@example.com/report.pdf', 'redirects@example.com', 3)
+    assert url_shortener.get_full_url(link['short_code'])['full_url'].startswith('s3://')
+
+    response = client.get(f"/s/{link['short_code']}")
+
+    assert response.status_code == 302
+    location = urlparse(response.headers['Location'])
+    assert unquote(location.path) == '/redirects@example.com/report.pdf'
+    query = parse_qs(location.query)
+    assert 'X-Amz-Signature' in query or 'Signature' in query
+
+def test_file_links_outside_the_bucket_are_not_signed(client, s3_bucket):
+    link = url_shortener.create_file_short_url('other-bucket', 'redirects@example.com/x.pdf', 'redirects@example.com', 3)
+
+    response = client.get(f"/s/{link['short_code']}")
+
+    assert response.status_code == 404
+    assert response.headers['Cache-Control'] == 'no-store'
+
+def test_redirects_are_cached_only_at_the_cdn(client, short_code, monkeypatch):
+    monkeypatch.setattr(app, 'REDIRECT_CACHE_MAX_AGE', 600)
+
+    response = client.get(f'/s/{short_code}')
+
+    assert response.status_code == 302
+    assert response.headers['Cache-Control'] == 'public, max-age=0, s-maxage=600'
+
+def test_file_link_redirects_are_cached_for_part_of_the_signature_ttl(client, s3_bucket, monkeypatch):
+    monkeypatch.setattr(app, 'LINK_PRESIGN_TTL', 300)
+    link = url_shortener.create_file_short_url(s3_bucket, 'redirects@example.com/cached.pdf', 'redirects@example.com', 3)
+
+    response = client.get(f"/s/{link['short_code']}")
+
+    assert response.headers['Cache-Control'] == 'public, max-age=0, s-maxage=150'
+
+def test_missing_links_are_not_cached(client):
+    response = client.get('/s/nosuch1')
+
+    assert response.status_code == 404
+    assert response.headers['Cache-Control'] == 'no-store'
+
+def test_permanent_redirects_for_links_that_never_change(client, monkeypatch):
+    monkeypatch.setattr(app, 'PERMANENT_REDIRECTS', True)
+    monkeypatch.setattr(app, 'REDIRECT_CACHE_MAX_AGE', 600)
+    short_code = url_shortener.create_short_url('https://example.com/forever', 'redirects@example.com',
+                                                expires_in_days=None)['short_code']
+
+    response = client.get(f'/s/{short_code}')
+
+    assert response.status_code == 301
+    assert response.headers['Cache-Control'] == 'public, max-age=600'
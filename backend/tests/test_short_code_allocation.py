@@ -0,0 +1,68 @@
+"""
+Short code allocation: legacy code collisions and leases from the shared counter
+"""
+import pytest
+
+import database
+import short_code_allocator
+import url_shortener
+
+LEGACY_CODE = 'legacy1'
+
+@pytest.fixture
+def colliding_allocator(monkeypatch):
+    """
+    Lease one code per block, and hand out LEGACY_CODE (already taken by a row
+    from the old random generator) as the second code of the first allocation
+    """
+    monkeypatch.setattr(short_code_allocator, '_allocator', short_code_allocator.ShortCodeAllocator(block_size=1))
+    with database.get_db_connection() as conn:
+        conn.execute('INSERT OR IGNORE INTO url_mappings (short_code, full_url) VALUES (?, ?)',
+                     (LEGACY_CODE, 'https://example.com/legacy'))
+        conn.commit()
+
+    calls = []
+
+    def allocate(count):
+        codes = short_code_allocator.allocate_short_codes(count)
+        if not calls and count > 1:
+            codes[1] = LEGACY_CODE
+        calls.append(count)
+        return codes
+    monkeypatch.setattr(url_shortener, 'allocate_short_codes', allocate)
+    return calls
+
+def test_bulk_links_replace_taken_codes_before_writing(colliding_allocator):
+    file_keys = [f'alloc@example.com/file{i}.txt' for i in range(3)]
+
+    results = url_shortener.create_file_short_urls('bucket', file_keys, 'alloc@example.com', 3)
+
+    short_codes = [results[file_key]['short_code'] for file_key in file_keys]
+    assert LEGACY_CODE not in short_codes
+    assert len(set(short_codes)) == 3
+    assert colliding_allocator == [3, 1]
+    for file_key, short_code in zip(file_keys, short_codes):
+        assert url_shortener.get_full_url(short_code)['file_key'] == file_key
+    assert url_shortener.get_full_url(LEGACY_CODE)['full_url'] == 'https://example.com/legacy'
+
+def test_tasks_lease_disjoint_blocks_from_the_shared_counter(dynamodb_adapter, monkeypatch):
+    monkeypatch.setattr(short_code_allocator, '_lease', dynamodb_adapter.lease_short_code_block)
+    # Two tasks, each with its own allocator, interleaving small leases
+    first_task = short_code_allocator.ShortCodeAllocator(block_size=3)
+    second_task = short_code_allocator.ShortCodeAllocator(block_size=3)
+
+    codes = []
+    for _ in range(4):
+        codes += first_task.allocate_many(2) + second_task.allocate_many(2)
+
+    assert len(codes) == len(set(codes)) == 16
+    assert all(len(code) == short_code_allocator.SHORT_CODE_MIN_LENGTH for code in codes)
+
+def test_full_lengths_move_to_the_next_length(dynamodb_adapter, monkeypatch):
+    monkeypatch.setattr(short_code_allocator, '_lease', dynamodb_adapter.lease_short_code_block)
+    allocator = short_code_allocator.ShortCodeAllocator(block_size=2, min_length=1, max_fill=3 / 62)
+
+    codes = allocator.allocate_many(5)
+
+    assert [len(code) for code in codes] == [1, 1, 1, 2, 2]
+    assert len(set(codes)) == 5
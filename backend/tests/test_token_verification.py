@@ -0,0 +1,59 @@
+"""
+Fast rejection and negative caching of bad tokens in verify_jwt_token
+"""
+import time
+
+import jwt
+import pytest
+
+import app
+
+@pytest.fixture(autouse=True)
+def registry(jwks_server, monkeypatch):
+    registry = app.JWKSKeyRegistry(jwks_server.url)
+    monkeypatch.setattr(app, 'jwks_registry', registry)
+    app.clear_verified_token_cache()
+    # Tokens minted within the same second are identical, so earlier tests' failures must not leak in
+    with app.failed_token_cache_lock:
+        app.failed_token_cache.clear()
+    return registry
+
+def test_missing_exp_error_is_identical_when_served_from_cache(make_token):
+    token = make_token(exp=None)
+
+    with pytest.raises(jwt.MissingRequiredClaimError) as first:
+        app.verify_jwt_token(token)
+    with pytest.raises(jwt.MissingRequiredClaimError) as cached:
+        app.verify_jwt_token(token)
+
+    assert str(first.value) == 'Token is missing the "exp" claim'
+    assert str(cached.value) == str(first.value)
+    assert cached.value.claim == 'exp'
+
+def test_bad_tokens_are_rejected_before_any_jwks_fetch(jwks_server, make_token):
+    bad_tokens = [
+        (make_token(exp=int(time.time()) - 10), jwt.ExpiredSignatureError),
+        (make_token(iss='https://example.com/other-pool'), jwt.InvalidIssuerError),
+        (make_token(aud='other-client'), jwt.InvalidAudienceError),
+        (make_token(token_use='access'), jwt.InvalidTokenError),
+    ]
+    for token, error_class in bad_tokens:
+        for _ in range(2):
+            with pytest.raises(error_class) as raised:
+                app.verify_jwt_token(token)
+            assert type(raised.value) is error_class
+
+    assert jwks_server.fetches == 0
+
+def test_repeated_bad_token_is_served_from_negative_cache(make_token):
+    token = make_token(iss='https://example.com/other-pool')
+    hits_before = app.get_failed_token_cache_stats()['hits']
+
+    for _ in range(3):
+        with pytest.raises(jwt.InvalidIssuerError):
+            app.verify_jwt_token(token)
+
+    assert app.get_failed_token_cache_stats()['hits'] - hits_before == 2
+
+def test_valid_token_verifies(make_token):
+    assert app.verify_jwt_token(make_token())['email'] == 'user@example.com'
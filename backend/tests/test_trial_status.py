@@ -0,0 +1,104 @@
+"""
+Trial status caching and trial start eligibility (SQLite backend)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import simple_trial_functions
+import trial_status_cache
+import user_management
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    trial_status_cache.clear_trial_status_cache()
+    # Keep start_user_trial away from Cognito
+    monkeypatch.setattr(simple_trial_functions, 'simple_add_user_to_group', lambda *args: True)
+    monkeypatch.setattr(simple_trial_functions, 'simple_remove_user_from_group', lambda *args: True)
+    yield
+    trial_status_cache.clear_trial_status_cache()
+
+def add_user(user_id, email, trial_used=False, trial_expires_at=None):
+    with database.get_db_connection() as conn:
+        conn.execute('''
+            INSERT INTO users (user_id, email, user_tier, trial_used, trial_started_at, trial_expires_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, email, 'premium-trial' if trial_used else 'Free', trial_used,
+              datetime.now().isoformat() if trial_used else None, trial_expires_at))
+        conn.commit()
+
+def test_load_failure_falls_back_without_caching(monkeypatch):
+    def failing_load(user_email, user_id):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(user_management, '_load_user_trial_status', failing_load)
+
+    status = user_management.get_user_trial_status('flaky@example.com', 'flaky-1')
+
+    assert status == user_management.DEFAULT_TRIAL_STATUS
+    assert trial_status_cache.get_cached_trial_status('flaky@example.com', 'flaky-1') is None
+
+def test_free_user_status_is_served_from_cache(monkeypatch):
+    status = user_management.get_user_trial_status('fresh@example.com', 'fresh-1')
+    assert status['can_start_trial'] is True
+
+    def no_load(user_email, user_id):
+        raise AssertionError('trial status re-read within its TTL')
+    monkeypatch.setattr(user_management, '_load_user_trial_status', no_load)
+
+    assert user_management.get_user_trial_status('fresh@example.com', 'fresh-1') == status
+
+def test_status_that_allows_a_trial_expires_sooner(monkeypatch):
+    monkeypatch.setattr(trial_status_cache, 'TRIAL_STATUS_ELIGIBLE_CACHE_TTL', 0)
+
+    user_management.get_user_trial_status('fresh-short@example.com', 'fresh-2')
+
+    assert trial_status_cache.get_cached_trial_status('fresh-short@example.com', 'fresh-2') is None
+
+def test_active_trial_status_is_cached():
+    add_user('active-1', 'active@example.com', trial_used=True,
+             trial_expires_at=(datetime.now() + timedelta(days=10)).isoformat())
+
+    status = user_management.get_user_trial_status('active@example.com', 'active-1')
+
+    assert status['trial_status'] == 'active'
+    assert trial_status_cache.get_cached_trial_status('active@example.com', 'active-1') == status
+
+def test_start_trial_ignores_a_stale_eligible_status(monkeypatch):
+    add_user('used-1', 'used@example.com', trial_used=True,
+             trial_expires_at=(datetime.now() - timedelta(days=1)).isoformat())
+    # What another worker's cache or a failed load might still report
+    monkeypatch.setattr(user_management, 'get_user_trial_status',
+                        lambda user_email, user_id: dict(user_management.DEFAULT_TRIAL_STATUS))
+
+    result = user_management.start_user_trial('used@example.com', 'used-1')
+
+    assert result['success'] is False
+
+def test_start_trial_fails_closed_when_eligibility_cannot_be_read(monkeypatch):
+    def failing_load(user_email, user_id):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(user_management, '_load_user_trial_status', failing_load)
+
+    result = user_management.start_user_trial('locked@example.com', 'locked-1')
+
+    assert result['success'] is False
+
+def test_simple_start_trial_does_not_restart_a_used_trial():
+    expired = (datetime.now() - timedelta(days=1)).isoformat()
+    add_user('restart-1', 'restart@example.com', trial_used=True, trial_expires_at=expired)
+
+    result = simple_trial_functions.simple_start_trial('restart-1', 'restart@example.com')
+
+    assert result['success'] is False
+    with database.get_db_connection() as conn:
+        row = conn.execute('SELECT trial_expires_at FROM users WHERE user_id = ?', ('restart-1',)).fetchone()
+    assert row[0] == expired
+
+def test_first_trial_start_succeeds_once():
+    first = user_management.start_user_trial('new@example.com', 'new-1')
+    second = user_management.start_user_trial('new@example.com', 'new-1')
+
+    assert first['success'] is True
+    assert second['success'] is False
+    assert user_management.get_user_trial_status('new@example.com', 'new-1')['trial_status'] == 'active'
@@ -0,0 +1,36 @@
+"""
+Content-hash deduplication of /api/upload, against moto S3
+"""
+import io
+
+import app
+
+def upload(client, headers, filename, body):
+    response = client.post('/api/upload', headers=headers, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(body), filename)})
+    assert response.status_code == 200
+    return response.get_json()['dedupe']
+
+def test_reupload_to_the_same_key_is_skipped_when_other_keys_share_the_content(client, auth_headers, s3_bucket):
+    headers = auth_headers('dedupe@example.com')
+    assert upload(client, headers, 'a.txt', b'same bytes') == 'uploaded'
+    assert upload(client, headers, 'b.txt', b'same bytes') == 'copied'
+
+    # Both keys hold the content; each re-upload must be recognised as already stored
+    assert upload(client, headers, 'a.txt', b'same bytes') == 'skipped'
+    assert upload(client, headers, 'b.txt', b'same bytes') == 'skipped'
+
+def test_changed_content_at_a_key_is_uploaded(client, auth_headers, s3_bucket):
+    headers = auth_headers('dedupe-change@example.com')
+    assert upload(client, headers, 'a.txt', b'version 1') == 'uploaded'
+
+    assert upload(client, headers, 'a.txt', b'version 2') == 'uploaded'
+    stored = app.s3.get_object(Bucket=s3_bucket, Key='dedupe-change@example.com/a.txt')['Body'].read()
+    assert stored == b'version 2'
+
+def test_object_overwritten_outside_the_index_is_uploaded_again(client, auth_headers, s3_bucket):
+    headers = auth_headers('dedupe-stale@example.com')
+    assert upload(client, headers, 'a.txt', b'indexed') == 'uploaded'
+    app.s3.put_object(Bucket=s3_bucket, Key='dedupe-stale@example.com/a.txt', Body=b'overwritten')
+
+    assert upload(client, headers, 'a.txt', b'indexed') == 'uploaded'
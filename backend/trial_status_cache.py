@@ -0,0 +1,113 @@
+"""
+In-process cache for per-user trial status lookups
+"""
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Maximum age of a cached status; active trials also expire at trial_expires_at
+TRIAL_STATUS_CACHE_TTL = int(os.getenv('TRIAL_STATUS_CACHE_TTL', 300))
+# Statuses that still allow a trial change when another worker starts one, and
+# that invalidation only reaches its own process, so they are kept briefly;
+# start_user_trial re-reads eligibility itself rather than trusting the cache
+TRIAL_STATUS_ELIGIBLE_CACHE_TTL = int(os.getenv('TRIAL_STATUS_ELIGIBLE_CACHE_TTL', 30))
+TRIAL_STATUS_CACHE_SIZE = int(os.getenv('TRIAL_STATUS_CACHE_SIZE', 10000))
+
+_lock = threading.Lock()
+_entries = {}  # user_id -> (expires_at, user_email, trial_status)
+_user_ids_by_email = {}
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def _trial_expiry_timestamp(trial_status):
+    """Return the trial's expiry as epoch seconds, or None if unknown"""
+    trial_expires_at = trial_status.get('trial_expires_at')
+    if not trial_expires_at:
+        return None
+    
+    try:
+        if isinstance(trial_expires_at, str):
+            expires_dt = datetime.fromisoformat(trial_expires_at.replace('Z', '+00:00'))
+        else:
+            expires_dt = trial_expires_at
+        
+        if expires_dt.tzinfo:
+            return expires_dt.timestamp()
+        # Naive timestamps are compared against local time elsewhere in the app
+        return time.mktime(expires_dt.timetuple())
+    except Exception as e:
+        logger.warning(f"Could not parse trial expiry {trial_expires_at}: {e}")
+        return None
+
+def get_cached_trial_status(user_email, user_id):
+    """Return a copy of the cached trial status for a user, or None"""
+    with _lock:
+        user_id = user_id or _user_ids_by_email.get(user_email)
+        entry = _entries.get(user_id)
+        if entry is None:
+            _stats['misses'] += 1
+            return None
+        
+        expires_at, _, trial_status = entry
+        if time.time() >= expires_at:
+            _remove_entry(user_id)
+            _stats['misses'] += 1
+            return None
+        
+        _stats['hits'] += 1
+        return dict(trial_status)
+
+def cache_trial_status(user_email, user_id, trial_status):
+    """Cache a trial status until the earlier of its TTL and the trial's own expiry"""
+    ttl = TRIAL_STATUS_ELIGIBLE_CACHE_TTL if trial_status.get('can_start_trial') else TRIAL_STATUS_CACHE_TTL
+    if not user_id or ttl <= 0:
+        return
+    
+    expires_at = time.time() + ttl
+    if trial_status.get('trial_status') == 'active':
+        trial_expiry = _trial_expiry_timestamp(trial_status)
+        if trial_expiry is not None:
+            expires_at = min(expires_at, trial_expiry)
+    
+    with _lock:
+        if user_id not in _entries and len(_entries) >= TRIAL_STATUS_CACHE_SIZE:
+            # Drop the oldest entry (dicts keep insertion order)
+            _remove_entry(next(iter(_entries)))
+        _remove_entry(user_id)
+        _entries[user_id] = (expires_at, user_email, dict(trial_status))
+        if user_email:
+            _user_ids_by_email[user_email] = user_id
+
+def invalidate_trial_status(user_email=None, user_id=None):
+    """Drop the cached status for a user identified by email and/or user_id"""
+    with _lock:
+        if user_email:
+            _remove_entry(_user_ids_by_email.get(user_email))
+        if user_id:
+            _remove_entry(user_id)
+        _stats['invalidations'] += 1
+
+def clear_trial_status_cache():
+    """Drop every cached status (e.g. after a bulk trial expiry)"""
+    with _lock:
+        _entries.clear()
+        _user_ids_by_email.clear()
+        _stats['invalidations'] += 1
+
+def get_trial_status_cache_stats():
+    """Hit/miss counters for the trial status cache"""
+    with _lock:
+        stats = dict(_stats)
+        stats['size'] = len(_entries)
+    stats['ttl_seconds'] = TRIAL_STATUS_CACHE_TTL
+    stats['eligible_ttl_seconds'] = TRIAL_STATUS_ELIGIBLE_CACHE_TTL
+    return stats
+
+def _remove_entry(user_id):
+    # Caller must hold _lock
+    entry = _entries.pop(user_id, None)
+    if entry is not None and _user_ids_by_email.get(entry[1]) == user_id:
+        del _user_ids_by_email[entry[1]]
@@ -4,15 +4,40 @@ URL Shortener core functionality
 import string
 import random
 import hashlib
+import time
+import os
 from datetime import datetime, timedelta
-from database import get_db_connection, cleanup_expired_urls
+from database import get_db_connection, link_upsert_changes
+from change_log import record_changes, record_committed_changes, prune_change_log
+from redirect_cache import get_cached_redirect, cache_redirect, invalidate_redirect, record_redirect_lookup
+from click_counter import record_click, get_flush_generation
+from short_code_allocator import allocate_short_codes
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Delta-sync clients whose cursor is older than this must reload their full listing
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv('CHANGE_LOG_RETENTION_DAYS', 7))
+
 # Characters for base62 encoding (0-9, a-z, A-Z)
 BASE62_CHARS = string.digits + string.ascii_lowercase + string.ascii_uppercase
 
+# File links store s3://bucket/key instead of a presigned URL; the redirect signs on click
+S3_LINK_PREFIX = 's3://'
+# A file link is reused when its expiry is within this many seconds of the requested one
+FILE_LINK_DEDUPE_WINDOW = 3600
+
+def make_s3_link(bucket, file_key):
+    """Build the stored form of a lazily-presigned file link"""
+    return f"{S3_LINK_PREFIX}{bucket}/{file_key}"
+
+def parse_s3_link(full_url):
+    """Return (bucket, file_key) for a file link, or None for a regular URL"""
+    if not full_url or not full_url.startswith(S3_LINK_PREFIX):
+        return None
+    bucket, _, file_key = full_url[len(S3_LINK_PREFIX):].partition('/')
+    return bucket, file_key
+
 def generate_short_code(length=6):
     """Generate a random short code using base62 encoding"""
     return ''.join(random.choice(BASE62_CHARS) for _ in range(length))
@@ -55,6 +80,8 @@ def create_short_url(full_url, user_email=None, file_key=None, filename=None, ex
         dict with short_code and created status
     """
     # Note: Cleanup operations moved to scheduled background task for better performance
+    if parse_s3_link(full_url):
+        raise ValueError("s3:// URLs cannot be shortened directly")
     
     try:
         with get_db_connection() as conn:
@@ -77,32 +104,17 @@ def create_short_url(full_url, user_email=None, file_key=None, filename=None, ex
                     'message': 'URL already shortened'
                 }
             
-            # Generate new short code
-            max_attempts = 10
-            for attempt in range(max_attempts):
-                short_code = generate_short_code()
-                
-                # Check if code already exists
-                cursor.execute('SELECT 1 FROM url_mappings WHERE short_code = ?', (short_code,))
-                if not cursor.fetchone():
-                    break
-                    
-                if attempt == max_attempts - 1:
-                    raise Exception("Failed to generate unique short code")
-            
             # Calculate expiration
             expires_at = None
             if expires_in_days:
                 expires_at = datetime.now() + timedelta(days=expires_in_days)
             
-            # Insert new mapping
-            cursor.execute('''
-                INSERT INTO url_mappings 
-                (short_code, full_url, created_by_user, file_key, filename, expires_at, expires_in_days)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (short_code, full_url, user_email, file_key, filename, expires_at, expires_in_days))
-            
+            short_code = _allocate_unused_codes(cursor, 1)[0]
+            _insert_short_url(cursor, full_url, user_email, file_key, filename, expires_at, expires_in_days, short_code)
+            changes = link_upsert_changes(cursor, [short_code])
+            record_changes(changes, cursor)
             conn.commit()
+            record_committed_changes(changes)
             
             logger.info(f"Created short URL: {short_code} for user: {user_email}")
             
@@ -117,10 +129,128 @@ def create_short_url(full_url, user_email=None, file_key=None, filename=None, ex
         logger.error(f"Failed to create short URL: {e}")
         raise
 
+def create_file_short_url(bucket, file_key, user_email=None, expires_in_days=7):
+    """
+    Create a short URL that presigns a download for bucket/file_key on each click
+    
+    Only the bucket, key and expiry are stored. An existing link for the same
+    user, file and expiry is reused when its expires_at is within
+    FILE_LINK_DEDUPE_WINDOW of the requested one.
+    
+    Returns:
+        dict with short_code and created status
+    """
+    return create_file_short_urls(bucket, [file_key], user_email, expires_in_days)[file_key]
+
+def create_file_short_urls(bucket, file_keys, user_email=None, expires_in_days=7):
+    """
+    Create (or reuse) file links for many files of one user in a single transaction
+    
+    Existing links are looked up with one query, new short codes are allocated
+    in one batch and all new mappings are inserted with a single commit.
+    
+    Returns:
+        dict of file_key -> result, each shaped like create_file_short_url's
+    """
+    file_keys = list(dict.fromkeys(file_keys))  # Drop duplicates, keep order
+    full_urls = {make_s3_link(bucket, file_key): file_key for file_key in file_keys}
+    expires_at = datetime.now() + timedelta(days=expires_in_days)
+    results = {}
+    
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            placeholders = ','.join('?' * len(full_urls))
+            cursor.execute(f'''
+                SELECT short_code, full_url, expires_at FROM url_mappings 
+                WHERE created_by_user = ? AND expires_in_days = ? AND expires_at > ?
+                AND full_url IN ({placeholders})
+            ''', (user_email, expires_in_days, expires_at - timedelta(seconds=FILE_LINK_DEDUPE_WINDOW),
+                  *full_urls))
+            
+            # The latest-expiring link per file wins (picked here rather than with
+            # ORDER BY, which would need a temp sort across the IN list)
+            latest = {}
+            for row in cursor.fetchall():
+                file_key = full_urls[row['full_url']]
+                if file_key not in latest or row['expires_at'] > latest[file_key]['expires_at']:
+                    latest[file_key] = row
+            for file_key, row in latest.items():
+                results[file_key] = {
+                    'short_code': row['short_code'],
+                    'created': False,
+                    # Stored as 'YYYY-MM-DD HH:MM:SS'; returned in the same ISO form as new links
+                    'expires_at': datetime.fromisoformat(row['expires_at']).isoformat(),
+                    'message': 'File link already exists'
+                }
+            
+            missing = [(full_url, file_key) for full_url, file_key in full_urls.items() if file_key not in results]
+            if missing:
+                # Allocate before the first INSERT opens the write transaction
+                short_codes = _allocate_unused_codes(cursor, len(missing))
+                for (full_url, file_key), short_code in zip(missing, short_codes):
+                    filename = file_key.split('/')[-1]
+                    _insert_short_url(cursor, full_url, user_email, file_key, filename,
+                                      expires_at, expires_in_days, short_code)
+                    results[file_key] = {
+                        'short_code': short_code,
+                        'created': True,
+                        'expires_at': expires_at.isoformat(),
+                        'message': 'Short URL created successfully'
+                    }
+                changes = link_upsert_changes(cursor, short_codes)
+                record_changes(changes, cursor)
+                conn.commit()
+                record_committed_changes(changes)
+            
+            logger.info(f"File links for {user_email}: {len(missing)} created, {len(file_keys) - len(missing)} reused")
+            return results
+            
+    except Exception as e:
+        logger.error(f"Failed to create file links for {user_email}: {e}")
+        raise
+
+def _allocate_unused_codes(cursor, count):
+    """
+    Allocate count short codes that no existing mapping uses
+
+    Allocated codes never repeat, but rows created with the old random
+    generator may already hold one, so taken codes are swapped for fresh ones
+    here. Call before the first INSERT: a block lease takes the database write
+    lock on its own connection and would wait on the caller's open transaction.
+    """
+    short_codes = []
+    max_attempts = 10
+    for attempt in range(max_attempts):
+        candidates = allocate_short_codes(count - len(short_codes))
+        placeholders = ','.join('?' * len(candidates))
+        cursor.execute(f'SELECT short_code FROM url_mappings WHERE short_code IN ({placeholders})', candidates)
+        taken = {row['short_code'] for row in cursor.fetchall()}
+        if taken:
+            logger.warning(f"Short codes {sorted(taken)} already in use, allocating others")
+        short_codes.extend(code for code in candidates if code not in taken)
+        if len(short_codes) == count:
+            return short_codes
+    
+    raise Exception("Failed to generate unique short code")
+
+def _insert_short_url(cursor, full_url, user_email, file_key, filename, expires_at, expires_in_days, short_code):
+    """Insert a mapping under a short code from _allocate_unused_codes; the caller logs the change"""
+    cursor.execute('''
+        INSERT INTO url_mappings 
+        (short_code, full_url, created_by_user, file_key, filename, expires_at, expires_in_days)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (short_code, full_url, user_email, file_key, filename, expires_at, expires_in_days))
+
 def get_full_url(short_code):
     """
     Retrieve full URL by short code and increment click count
     
+    Cache hits are answered from the in-process redirect cache without touching
+    the database. Clicks are counted in memory and written in batches by
+    click_counter, so stored click counts are eventually consistent.
+    
     Args:
         short_code: The short code to look up
         
@@ -128,8 +258,18 @@ def get_full_url(short_code):
         dict with full_url and metadata, or None if not found
     """
     # Note: Cleanup operations moved to scheduled background task for better performance
+    started = time.perf_counter()
+    
+    cached = get_cached_redirect(short_code)
+    if cached:
+        # The cached click_count follows the stored count through flushes;
+        # record_click adds the clicks not yet stored
+        cached['click_count'] += record_click(short_code)
+        record_redirect_lookup(True, time.perf_counter() - started)
+        return cached
     
     try:
+        flush_generation = get_flush_generation()
         with get_db_connection() as conn:
             cursor = conn.cursor()
             
@@ -143,28 +283,27 @@ def get_full_url(short_code):
             ''', (short_code,))
             
             row = cursor.fetchone()
-            if not row:
-                return None
-            
-            # Increment click count
-            cursor.execute('''
-                UPDATE url_mappings 
-                SET click_count = click_count + 1 
-                WHERE short_code = ?
-            ''', (short_code,))
-            
-            conn.commit()
-            
-            return {
-                'full_url': row['full_url'],
-                'created_by_user': row['created_by_user'],
-                'file_key': row['file_key'],
-                'filename': row['filename'],
-                'expires_at': row['expires_at'],
-                'expires_in_days': row['expires_in_days'],
-                'click_count': row['click_count'] + 1,  # Return updated count
-                'created_at': row['created_at']
-            }
+        
+        record_redirect_lookup(False, time.perf_counter() - started)
+        if not row:
+            return None
+        
+        url_info = {
+            'full_url': row['full_url'],
+            'created_by_user': row['created_by_user'],
+            'file_key': row['file_key'],
+            'filename': row['filename'],
+            'expires_at': row['expires_at'],
+            'expires_in_days': row['expires_in_days'],
+            'click_count': row['click_count'],
+            'created_at': row['created_at']
+        }
+        # A flush overlapping the read may or may not be in click_count, so that read is not cached
+        if flush_generation is not None and flush_generation == get_flush_generation():
+            cache_redirect(short_code, url_info)
+        
+        url_info['click_count'] += record_click(short_code)  # Return updated count
+        return url_info
             
     except Exception as e:
         logger.error(f"Failed to get full URL for {short_code}: {e}")
@@ -203,6 +342,67 @@ def get_user_urls(user_email, limit=100):
         logger.error(f"Failed to get URLs for user {user_email}: {e}")
         return []
 
+def get_user_urls_for_files(user_email, file_keys):
+    """
+    Get the newest active short URL for each of the given files in one query
+    
+    Args:
+        user_email: User's email address
+        file_keys: S3 keys to look up
+        
+    Returns:
+        dict of file_key -> URL mapping (files without a link are omitted)
+    """
+    file_keys = list(dict.fromkeys(file_keys))
+    urls_by_file = {}
+    if not file_keys:
+        return urls_by_file
+    
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(file_keys), 500):
+                chunk = file_keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                    SELECT short_code, full_url, file_key, filename, 
+                           click_count, created_at, expires_at, expires_in_days
+                    FROM url_mappings 
+                    WHERE created_by_user = ?
+                    AND file_key IN ({placeholders})
+                    AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+                ''', (user_email, *chunk))
+                
+                # The newest link per file wins (picked here rather than with
+                # ORDER BY, which would need a temp sort across the IN list)
+                for row in cursor.fetchall():
+                    current = urls_by_file.get(row['file_key'])
+                    if current is None or row['created_at'] >= current['created_at']:
+                        urls_by_file[row['file_key']] = dict(row)
+            
+            return urls_by_file
+            
+    except Exception as e:
+        logger.error(f"Failed to get file URLs for user {user_email}: {e}")
+        return {}
+
+def get_next_link_expiry(user_email):
+    """
+    Return when the user's next active short URL expires (None if none will)
+    
+    Expired links drop out of listings without a write, so listing
+    validators include this to change when one lapses.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT MIN(expires_at) AS next_expiry FROM url_mappings
+            WHERE created_by_user = ? AND expires_at > CURRENT_TIMESTAMP
+        ''', (user_email,))
+        return cursor.fetchone()['next_expiry']
+
 def delete_short_url(short_code, user_email):
     """
     Delete a short URL (only if created by the user)
@@ -218,6 +418,12 @@ def delete_short_url(short_code, user_email):
         with get_db_connection() as conn:
             cursor = conn.cursor()
             
+            cursor.execute('''
+                SELECT file_key FROM url_mappings 
+                WHERE short_code = ? AND created_by_user = ?
+            ''', (short_code, user_email))
+            row = cursor.fetchone()
+            
             # Delete only if user owns the URL
             cursor.execute('''
                 DELETE FROM url_mappings 
@@ -225,16 +431,124 @@ def delete_short_url(short_code, user_email):
             ''', (short_code, user_email))
             
             deleted = cursor.rowcount > 0
-            conn.commit()
-            
+            changes = []
             if deleted:
-                logger.info(f"Deleted short URL {short_code} for user {user_email}")
-            
-            return deleted
+                changes.append((user_email, 'link', short_code, 'delete'))
+                if row['file_key']:
+                    # The file's listing entry shows its newest link
+                    changes.append((user_email, 'file', row['file_key'], 'upsert'))
+                record_changes(changes, cursor)
+            conn.commit()
             
     except Exception as e:
         logger.error(f"Failed to delete short URL {short_code}: {e}")
         return False
+    
+    # Outside the try: the delete has committed, so a logging failure is raised rather than reported as not found
+    record_committed_changes(changes)
+    if deleted:
+        invalidate_redirect(short_code)
+        logger.info(f"Deleted short URL {short_code} for user {user_email}")
+    return deleted
+
+def delete_file_short_urls(file_keys):
+    """
+    Delete every short URL pointing at the given files in one transaction
+
+    Used when the files themselves are deleted, so their links stop showing up
+    in get_user_urls and stop redirecting to missing objects.
+
+    Args:
+        file_keys: S3 keys of deleted files
+
+    Returns:
+        list of deleted short codes (empty on error)
+    """
+    file_keys = list(dict.fromkeys(file_keys))
+    deleted_codes = []
+    if not file_keys:
+        return deleted_codes
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            changes = []
+
+            for start in range(0, len(file_keys), 500):
+                chunk = file_keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                    SELECT short_code, created_by_user FROM url_mappings
+                    WHERE file_key IN ({placeholders})
+                ''', chunk)
+                rows = cursor.fetchall()
+                if not rows:
+                    continue
+
+                cursor.execute(f'''
+                    DELETE FROM url_mappings
+                    WHERE file_key IN ({placeholders})
+                ''', chunk)
+                for row in rows:
+                    deleted_codes.append(row['short_code'])
+                    if row['created_by_user']:
+                        changes.append((row['created_by_user'], 'link', row['short_code'], 'delete'))
+
+            record_changes(changes, cursor)
+            conn.commit()
+
+    except Exception as e:
+        logger.error(f"Failed to delete short URLs for {len(file_keys)} files: {e}")
+        return []
+
+    record_committed_changes(changes)
+    for short_code in deleted_codes:
+        invalidate_redirect(short_code)
+    if deleted_codes:
+        logger.info(f"Deleted {len(deleted_codes)} short URLs for {len(file_keys)} deleted files")
+    return deleted_codes
+
+def cleanup_expired_urls():
+    """Remove expired URLs from database"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT short_code, created_by_user, file_key FROM url_mappings
+                WHERE expires_at IS NOT NULL 
+                AND expires_at < CURRENT_TIMESTAMP
+            ''')
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+            
+            # Delete exactly the rows read, so every removal is logged for delta-sync clients
+            short_codes = [row['short_code'] for row in rows]
+            deleted_count = 0
+            for start in range(0, len(short_codes), 500):
+                chunk = short_codes[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'DELETE FROM url_mappings WHERE short_code IN ({placeholders})', chunk)
+                deleted_count += cursor.rowcount
+            
+            changes = []
+            for row in rows:
+                if row['created_by_user']:
+                    changes.append((row['created_by_user'], 'link', row['short_code'], 'delete'))
+                    if row['file_key']:
+                        # The file's listing entry shows its newest link
+                        changes.append((row['created_by_user'], 'file', row['file_key'], 'upsert'))
+            changes = list(dict.fromkeys(changes))
+            record_changes(changes, cursor)
+            conn.commit()
+                
+    except Exception as e:
+        logger.error(f"Failed to cleanup expired URLs: {e}")
+        return 0
+    
+    record_committed_changes(changes)
+    logger.info(f"Cleaned up {deleted_count} expired URLs")
+    return deleted_count
 
 def scheduled_cleanup():
     """
@@ -243,6 +557,7 @@ def scheduled_cleanup():
     """
     try:
         deleted_count = cleanup_expired_urls()
+        prune_change_log(CHANGE_LOG_RETENTION_DAYS)
         logger.info(f"Scheduled cleanup completed: {deleted_count} expired URLs removed")
         return deleted_count
     except Exception as e:
@@ -4,6 +4,7 @@ User management functions for Premium Trial system
 import os
 import logging
 from datetime import datetime, timedelta
+from trial_status_cache import get_cached_trial_status, cache_trial_status
 
 logger = logging.getLogger(__name__)
 
@@ -14,14 +15,17 @@ if USE_DYNAMODB:
     # Use DynamoDB for production
     from dynamodb_adapter import db_adapter
     
-    def get_user_trial_status(user_email, user_id):
-        """Get comprehensive trial status for a user"""
+    def _load_user_trial_status(user_email, user_id):
+        """Get comprehensive trial status for a user from DynamoDB"""
         return db_adapter.get_user_trial_status(user_email, user_id)
     
-    def validate_trial_eligibility(user_email, user_id):
+    def validate_trial_eligibility(user_email, user_id, use_cache=True):
         """Check if user is eligible to start a Premium trial"""
         try:
-            trial_status = get_user_trial_status(user_email, user_id)
+            if use_cache:
+                trial_status = get_user_trial_status(user_email, user_id)
+            else:
+                trial_status = _load_user_trial_status(user_email, user_id)
             
             if trial_status['can_start_trial']:
                 return {
@@ -44,8 +48,8 @@ if USE_DYNAMODB:
     def start_user_trial(user_email, user_id):
         """Start a 30-day Premium trial for a user"""
         try:
-            # Check eligibility first
-            eligibility = validate_trial_eligibility(user_email, user_id)
+            # Check eligibility first, against the database rather than a cached status
+            eligibility = validate_trial_eligibility(user_email, user_id, use_cache=False)
             if not eligibility['eligible']:
                 return {
                     'success': False,
@@ -109,16 +113,12 @@ if USE_DYNAMODB:
 
 else:
     # Use SQLite for development (original code)
-    import sqlite3
-    
-    # Database file path
-    DB_PATH = os.path.join(os.path.dirname(__file__), 'url_shortener.db')
+    from database import get_db_connection
     
-    def get_user_trial_status(user_email, user_id):
-        """Get comprehensive trial status for a user"""
+    def _load_user_trial_status(user_email, user_id):
+        """Get comprehensive trial status for a user from SQLite"""
         try:
-            with sqlite3.connect(DB_PATH) as conn:
-                conn.row_factory = sqlite3.Row
+            with get_db_connection() as conn:
                 cursor = conn.cursor()
                 
                 # First, ensure the user exists in the database
@@ -206,21 +206,16 @@ else:
                 }
                 
         except Exception as e:
-            logger.error(f"Error getting trial status for user {user_email}: {e}")
-            # Return safe default for new users
-            return {
-                'user_tier': 'Free',
-                'trial_status': 'not_started',
-                'can_start_trial': True,
-                'days_remaining': 0,
-                'trial_started_at': None,
-                'trial_expires_at': None
-            }
+            logger.error(f"Error loading trial status for user {user_email}: {e}")
+            raise
 
-    def validate_trial_eligibility(user_email, user_id):
+    def validate_trial_eligibility(user_email, user_id, use_cache=True):
         """Check if user is eligible to start a Premium trial"""
         try:
-            trial_status = get_user_trial_status(user_email, user_id)
+            if use_cache:
+                trial_status = get_user_trial_status(user_email, user_id)
+            else:
+                trial_status = _load_user_trial_status(user_email, user_id)
             
             if trial_status['can_start_trial']:
                 return {
@@ -243,8 +238,8 @@ else:
     def start_user_trial(user_email, user_id):
         """Start a 30-day Premium trial for a user"""
         try:
-            # Check eligibility first
-            eligibility = validate_trial_eligibility(user_email, user_id)
+            # Check eligibility first, against the database rather than a cached status
+            eligibility = validate_trial_eligibility(user_email, user_id, use_cache=False)
             if not eligibility['eligible']:
                 return {
                     'success': False,
@@ -301,4 +296,30 @@ else:
             return {
                 'success': False,
                 'error': f'Failed to process expired trials: {str(e)}'
-            }
\ No newline at end of file
+            }
+
+# Shown when the status can't be loaded; never cached, so a transient error
+# doesn't outlive the request that hit it
+DEFAULT_TRIAL_STATUS = {
+    'user_tier': 'Free',
+    'trial_status': 'not_started',
+    'can_start_trial': True,
+    'days_remaining': 0,
+    'trial_started_at': None,
+    'trial_expires_at': None
+}
+
+def get_user_trial_status(user_email, user_id):
+    """Get comprehensive trial status for a user, served from cache when fresh"""
+    trial_status = get_cached_trial_status(user_email, user_id)
+    if trial_status is not None:
+        return trial_status
+    
+    try:
+        trial_status = _load_user_trial_status(user_email, user_id)
+    except Exception as e:
+        logger.error(f"Error getting trial status for user {user_email}: {e}")
+        return dict(DEFAULT_TRIAL_STATUS)
+    
+    cache_trial_status(user_email, user_id, trial_status)
+    return trial_status
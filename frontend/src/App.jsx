@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 
 // Import necessary Amplify v6 components and utilities
 import { fetchAuthSession, signOut as amplifySignOut, signUp, signIn, confirmSignUp, getCurrentUser, fetchUserAttributes, resetPassword, confirmResetPassword } from 'aws-amplify/auth';
@@ -17,6 +17,49 @@ try {
   console.error("Failed to configure Amplify in App.jsx:", error);
 }
 
+// Upload a file straight to S3 with a presigned POST from the backend, then
+// confirm it so the backend can register the upload. Returns the confirm response.
+const uploadFileToS3 = async (file, token, apiUrl) => {
+  const presignResponse = await fetch(`${apiUrl}/api/upload/presign`, {
+    method: 'POST',
+    headers: {
+      'Authorization': `Bearer ${token}`,
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify({
+      filename: file.name,
+      file_size: file.size,
+      content_type: file.type || undefined
+    }),
+  });
+  const presignData = await presignResponse.json();
+  if (!presignResponse.ok) throw new Error(presignData.message || 'Could not prepare upload');
+
+  // S3 requires the policy fields first and the file as the last form field
+  const formData = new FormData();
+  Object.entries(presignData.fields).forEach(([name, value]) => formData.append(name, value));
+  formData.append('file', file);
+
+  const s3Response = await fetch(presignData.upload_url, {
+    method: 'POST',
+    body: formData,
+  });
+  if (!s3Response.ok) throw new Error(`Upload to storage failed (status ${s3Response.status})`);
+
+  const confirmResponse = await fetch(`${apiUrl}/api/upload/confirm`, {
+    method: 'POST',
+    headers: {
+      'Authorization': `Bearer ${token}`,
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify({ file_key: presignData.file_key }),
+  });
+  const confirmData = await confirmResponse.json();
+  if (!confirmResponse.ok) throw new Error(confirmData.message || 'Upload failed');
+
+  return confirmData;
+};
+
 // Custom Authentication Component
 const CustomAuth = ({ onAuthenticated }) => {
   const [isSignUp, setIsSignUp] = useState(true);
@@ -420,6 +463,30 @@ const CustomAuth = ({ onAuthenticated }) => {
   );
 };
 
+// Files requested per /api/files page
+const FILES_PAGE_SIZE = 50;
+
+// Newest first, key as tie-breaker - the same order as /api/files
+const compareFiles = (a, b) =>
+  b.last_modified.localeCompare(a.last_modified) || a.key.localeCompare(b.key);
+
+// Apply one /api/files/changes response to the loaded file list. When only some
+// pages are loaded, files that would sort after the last loaded one are left
+// for "Load more" instead of being appended out of order.
+const mergeFileChanges = (files, changes, partiallyLoaded) => {
+  const removed = new Set(changes.removed_files);
+  const byKey = new Map(files.filter(f => !removed.has(f.key)).map(f => [f.key, f]));
+  const lastLoaded = files[files.length - 1];
+
+  changes.files.forEach(changed => {
+    if (byKey.has(changed.key) || !partiallyLoaded || !lastLoaded || compareFiles(changed, lastLoaded) < 0) {
+      byKey.set(changed.key, changed);
+    }
+  });
+
+  return [...byKey.values()].sort(compareFiles);
+};
+
 // This is the inner component that will be rendered ONLY after a successful login.
 // Premium File Explorer Component
 const PremiumFileExplorer = ({ signOut, user, tier, userStatus, getJwtToken }) => {
@@ -429,14 +496,25 @@ const PremiumFileExplorer = ({ signOut, user, tier, userStatus, getJwtToken }) =
   const [message, setMessage] = useState('');
   const [file, setFile] = useState(null);
   const [isUploading, setIsUploading] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  // Delta-sync cursor from /api/files; a ref so delayed callbacks always see the latest one
+  const changesCursorRef = useRef(null);
+  // Whether more pages remain to load, mirrored for the same reason
+  const hasMorePagesRef = useRef(false);
 
   // Load files on component mount
   useEffect(() => {
     loadFiles();
   }, []);
 
-  const loadFiles = async () => {
-    setIsLoading(true);
+  // Loads the first page of files, or the next page when given a cursor
+  const loadFiles = async (cursor = null) => {
+    if (cursor) {
+      setIsLoadingMore(true);
+    } else {
+      setIsLoading(true);
+    }
     setError('');
     
     try {
@@ -447,9 +525,22 @@ const PremiumFileExplorer = ({ signOut, user, tier, userStatus, getJwtToken }) =
       }
 
       const apiUrl = import.meta.env.VITE_BACKEND_API_URL;
-      const response = await fetch(`${apiUrl}/api/files`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
+      let url = `${apiUrl}/api/files?page_size=${FILES_PAGE_SIZE}`;
+      if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+      }
+      // A first listing gets 503 while the backend indexes the folder; retry as asked
+      let response;
+      for (let attempt = 1; ; attempt++) {
+        response = await fetch(url, {
+          headers: { 'Authorization': `Bearer ${token}` }
+        });
+        if (response.status !== 503 || attempt >= 5) {
+          break;
+        }
+        const retryAfter = Number(response.headers.get('Retry-After')) || 2;
+        await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+      }
 
       const data = await response.json();
       
@@ -457,15 +548,64 @@ const PremiumFileExplorer = ({ signOut, user, tier, userStatus, getJwtToken }) =
         throw new Error(data.message || 'Failed to load files');
       }
 
-      setFiles(data.files || []);
-      setMessage(`Found ${data.total_count} files`);
-      setTimeout(() => setMessage(''), 3000);
+      if (cursor) {
+        setFiles(prevFiles => [...prevFiles, ...(data.files || [])]);
+      } else {
+        setFiles(data.files || []);
+        changesCursorRef.current = data.changes_cursor;
+        setMessage(`Found ${data.total_count ?? data.count} files`);
+        setTimeout(() => setMessage(''), 3000);
+      }
+      setNextCursor(data.has_more ? data.next_cursor : null);
+      hasMorePagesRef.current = Boolean(data.has_more);
       
     } catch (error) {
       console.error('Error loading files:', error);
       setError(error.message || 'Failed to load files');
     } finally {
       setIsLoading(false);
+      setIsLoadingMore(false);
+    }
+  };
+
+  // Applies only what changed since the last load or sync, instead of reloading the whole list
+  const syncFiles = async () => {
+    if (!changesCursorRef.current) {
+      return loadFiles();
+    }
+
+    try {
+      const token = await getJwtToken();
+      if (!token) {
+        setError('Authentication error. Please sign in again.');
+        return;
+      }
+
+      const apiUrl = import.meta.env.VITE_BACKEND_API_URL;
+      let hasMore = true;
+      while (hasMore) {
+        const response = await fetch(
+          `${apiUrl}/api/files/changes?since=${encodeURIComponent(changesCursorRef.current)}`,
+          { headers: { 'Authorization': `Bearer ${token}` } }
+        );
+
+        if (response.status === 410) {
+          // Cursor is older than the server's change log
+          return loadFiles();
+        }
+
+        const data = await response.json();
+        if (!response.ok) {
+          throw new Error(data.message || 'Failed to sync files');
+        }
+
+        setFiles(prevFiles => mergeFileChanges(prevFiles, data, hasMorePagesRef.current));
+        changesCursorRef.current = data.next_cursor;
+        hasMore = data.has_more;
+      }
+    } catch (error) {
+      console.error('Error syncing files:', error);
+      loadFiles();
     }
   };
 
@@ -490,23 +630,9 @@ const PremiumFileExplorer = ({ signOut, user, tier, userStatus, getJwtToken }) =
       const apiUrl = import.meta.env.VITE_BACKEND_API_URL;
       console.log('Using API URL for Premium upload:', apiUrl);
       
-      const formData = new FormData();
-      formData.append('file', file);
-
-      console.log('Making Premium upload request...');
-      const uploadResponse = await fetch(`${apiUrl}/api/upload`, {
-        method: 'POST',
-        headers: { 'Authorization': `Bearer ${token}` },
-        body: formData,
-      });
-
-      console.log('Premium upload response status:', uploadResponse.status);
-      const uploadData = await uploadResponse.json();
+      console.log('Making Premium direct-to-S3 upload...');
+      const uploadData = await uploadFileToS3(file, token, apiUrl);
       console.log('Premium upload response data:', uploadData);
-      
-      if (!uploadResponse.ok) {
-        throw new Error(uploadData.message || 'Upload failed');
-      }
 
       setMessage('File uploaded successfully! Generating 3-day download link...');
       setFile(null);
@@ -521,9 +647,9 @@ const PremiumFileExplorer = ({ signOut, user, tier, userStatus, getJwtToken }) =
         }
       }
       
-      // Reload files to show the new upload
+      // Sync files to show the new upload
       setTimeout(() => {
-        loadFiles();
+        syncFiles();
       }, 1000);
 
     } catch (error) {
@@ -629,8 +755,8 @@ const PremiumFileExplorer = ({ signOut, user, tier, userStatus, getJwtToken }) =
       setMessage(`New download link generated and copied to clipboard! (Expires in ${data.expires_in_days} days)`);
       setTimeout(() => setMessage(''), 5000);
 
-      // Reload files to update the expiration info
-      loadFiles();
+      // Sync files to update the expiration info
+      syncFiles();
 
     } catch (error) {
       console.error('Error generating new link:', error);
@@ -665,8 +791,8 @@ const PremiumFileExplorer = ({ signOut, user, tier, userStatus, getJwtToken }) =
       setMessage(`File "${filename}" deleted successfully!`);
       setTimeout(() => setMessage(''), 3000);
       
-      // Reload files to reflect the deletion
-      loadFiles();
+      // Sync files to reflect the deletion
+      syncFiles();
 
     } catch (error) {
       console.error('Error deleting file:', error);
@@ -739,8 +865,8 @@ This message was sent using FileShare Plus Premium. Experience secure file shari
         setMessage(`Email client opened with download link for "${filename}"`);
         setTimeout(() => setMessage(''), 4000);
         
-        // Reload files to update the expiration info
-        loadFiles();
+        // Sync files to update the expiration info
+        syncFiles();
       } catch (emailError) {
         console.error('Error opening email client:', emailError);
         // Fallback: copy to clipboard
@@ -824,7 +950,7 @@ This message was sent using FileShare Plus Premium. Experience secure file shari
         <Card variation="outlined" padding="1.5rem">
           <Flex direction="row" justifyContent="space-between" alignItems="center" marginBottom="1rem">
             <Heading level={3}>Your Files</Heading>
-            <Button onClick={loadFiles} variation="link" isLoading={isLoading}>
+            <Button onClick={() => loadFiles()} variation="link" isLoading={isLoading}>
               Refresh
             </Button>
           </Flex>
@@ -902,6 +1028,14 @@ This message was sent using FileShare Plus Premium. Experience secure file shari
               </table>
             </div>
           )}
+
+          {!isLoading && nextCursor && (
+            <Flex justifyContent="center" marginTop="1rem">
+              <Button onClick={() => loadFiles(nextCursor)} isLoading={isLoadingMore}>
+                Load more
+              </Button>
+            </Flex>
+          )}
         </Card>
       </Card>
     </Flex>
@@ -1117,21 +1251,9 @@ This message was sent using FileShare Plus. Experience secure file sharing today
       const apiUrl = import.meta.env.VITE_BACKEND_API_URL;
       console.log('Using API URL:', apiUrl);
       
-      const formData = new FormData();
-      formData.append('file', file);
-
-      console.log('Making upload request...');
-      const uploadResponse = await fetch(`${apiUrl}/api/upload`, {
-        method: 'POST',
-        headers: { 'Authorization': `Bearer ${token}` },
-        body: formData,
-      });
-
-      console.log('Upload response status:', uploadResponse.status);
-      const uploadData = await uploadResponse.json();
+      console.log('Making direct-to-S3 upload...');
+      const uploadData = await uploadFileToS3(file, token, apiUrl);
       console.log('Upload response data:', uploadData);
-      
-      if (!uploadResponse.ok) throw new Error(uploadData.message || 'Upload failed');
 
       setUploadMessage('Upload successful! Generating download link...');
       
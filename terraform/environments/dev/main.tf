@@ -85,6 +85,9 @@ module "backend_app" {
   # Pass CloudFront domain for short URL construction
   frontend_domain = var.cloudfront_custom_domain_name != "" ? var.cloudfront_custom_domain_name : module.frontend_app.cloudfront_domain_name
   
+  # Lets the backend purge cached short URL redirects
+  cloudfront_distribution_id = module.frontend_app.cloudfront_distribution_id
+  
   # Pass DynamoDB policy ARN for database access
   dynamodb_policy_arn = module.dynamodb.dynamodb_policy_arn
 }
@@ -99,6 +102,10 @@ module "cognito" {
   ses_email_identity_arn = module.ses_email.ses_enabled ? module.ses_email.domain_identity_arn : null
   from_email_address     = module.ses_email.ses_enabled ? module.ses_email.from_email_address : null
   reply_to_email_address = module.ses_email.ses_enabled ? module.ses_email.from_email_address : null
+
+  # DynamoDB users table for the trial expiry token claim
+  users_table_name = module.dynamodb.users_table_name
+  users_table_arn  = module.dynamodb.users_table_arn
 }
 
 # Call the SES email module for better email deliverability
@@ -210,6 +217,11 @@ output "dynamodb_urls_table_name" {
   value       = module.dynamodb.urls_table_name
 }
 
+output "dynamodb_files_table_name" {
+  description = "The name of the DynamoDB file catalog table"
+  value       = module.dynamodb.files_table_name
+}
+
 output "dynamodb_users_table_arn" {
   description = "The ARN of the DynamoDB users table"
   value       = module.dynamodb.users_table_arn
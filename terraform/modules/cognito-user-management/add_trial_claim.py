@@ -0,0 +1,65 @@
+# add_trial_claim.py
+
+import boto3
+import os
+from datetime import datetime, timezone
+
+TRIAL_GROUP_NAME = 'premium-trial'
+
+# Reused across warm invocations; tests can replace it with a fake table.
+users_table = None
+
+def get_users_table():
+    """Return the DynamoDB users table, creating the handle on first use"""
+    global users_table
+    if users_table is None:
+        users_table = boto3.resource('dynamodb').Table(os.environ['USERS_TABLE_NAME'])
+    return users_table
+
+def to_epoch_seconds(timestamp):
+    """Convert a stored trial timestamp (ISO string, naive = UTC) to epoch seconds"""
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    
+    expires_dt = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+    if expires_dt.tzinfo is None:
+        expires_dt = expires_dt.replace(tzinfo=timezone.utc)
+    return int(expires_dt.timestamp())
+
+def handler(event, context):
+    """
+    This function is triggered by Cognito's Pre-Token-Generation hook.
+    For users in the 'premium-trial' group it adds a 'trial_expires_at' claim
+    (epoch seconds) to the ID token, so the backend can check trial expiry
+    from the token alone without a database read on every request.
+    """
+    
+    request = event.get('request', {})
+    groups = (request.get('groupConfiguration') or {}).get('groupsToOverride') or []
+    
+    if TRIAL_GROUP_NAME not in groups:
+        return event
+    
+    user_id = (request.get('userAttributes') or {}).get('sub')
+    print(f"Adding trial expiry claim for user '{user_id}'")
+    
+    try:
+        response = get_users_table().get_item(Key={'user_id': user_id})
+        trial_expires_at = response.get('Item', {}).get('trial_expires_at')
+        
+        if not trial_expires_at:
+            print("No trial_expires_at stored for user - token issued without claim")
+            return event
+        
+        claims_override = event.setdefault('response', {}).get('claimsOverrideDetails') or {}
+        claims_to_add = claims_override.get('claimsToAddOrOverride') or {}
+        claims_to_add['trial_expires_at'] = str(to_epoch_seconds(trial_expires_at))
+        claims_override['claimsToAddOrOverride'] = claims_to_add
+        event['response']['claimsOverrideDetails'] = claims_override
+        print(f"Added trial_expires_at claim: {claims_to_add['trial_expires_at']}")
+    except Exception as e:
+        # Don't block sign-in - the backend treats a missing claim as "unknown"
+        print(f"Error adding trial expiry claim: {e}")
+    
+    # Return the event object back to Cognito
+    return event
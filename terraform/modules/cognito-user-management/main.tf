@@ -1,5 +1,10 @@
 # main.tf for the cognito-user-management module
 
+locals {
+  # The trial expiry claim is only added when the users table is passed in
+  trial_claim_enabled = var.users_table_name != null && var.users_table_arn != null
+}
+
 # -----------------------------------------------------------------------------
 # Cognito User Pool and Client
 # -----------------------------------------------------------------------------
@@ -38,6 +43,8 @@ resource "aws_cognito_user_pool" "this" {
     pre_sign_up = var.environment == "dev" ? aws_lambda_function.pre_signup_trigger[0].arn : null
     # Post-confirmation trigger to add users to free tier group
     post_confirmation = aws_lambda_function.post_confirmation_trigger.arn
+    # Pre-token-generation trigger to add the trial expiry claim to ID tokens (needs the users table)
+    pre_token_generation = local.trial_claim_enabled ? aws_lambda_function.pre_token_generation_trigger[0].arn : null
   }
 
   # Email configuration - use custom SES for better deliverability (if provided)
@@ -156,6 +163,38 @@ resource "aws_lambda_permission" "allow_cognito" {
   source_arn    = aws_cognito_user_pool.this.arn
 }
 
+# Lambda function for pre-token-generation trigger (trial expiry claim)
+resource "aws_lambda_function" "pre_token_generation_trigger" {
+  count            = local.trial_claim_enabled ? 1 : 0
+  filename         = "${path.module}/add_trial_claim.zip"
+  function_name    = "${var.project_name}-${var.environment}-pre-token-generation-trigger"
+  role             = aws_iam_role.lambda_exec_role.arn
+  handler          = "add_trial_claim.handler"
+  runtime          = "python3.13"
+  source_code_hash = filebase64sha256("${path.module}/add_trial_claim.py")
+
+  environment {
+    variables = {
+      USERS_TABLE_NAME = var.users_table_name
+    }
+  }
+
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Allow Cognito service to invoke the pre-token-generation Lambda function
+resource "aws_lambda_permission" "allow_cognito_pre_token_generation" {
+  count         = local.trial_claim_enabled ? 1 : 0
+  statement_id  = "AllowCognitoInvokePreTokenGeneration"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.pre_token_generation_trigger[0].function_name
+  principal     = "cognito-idp.amazonaws.com"
+  source_arn    = aws_cognito_user_pool.this.arn
+}
+
 # -----------------------------------------------------------------------------
 # IAM Role and Policy for the Lambda Function
 # -----------------------------------------------------------------------------
@@ -178,7 +217,7 @@ resource "aws_iam_policy" "lambda_policy" {
   description = "IAM policy for Cognito trigger Lambda"
   policy = jsonencode({
     Version = "2012-10-17",
-    Statement = [
+    Statement = concat([
       {
         Action = [
           "logs:CreateLogGroup",
@@ -195,7 +234,15 @@ resource "aws_iam_policy" "lambda_policy" {
         Effect   = "Allow",
         Resource = aws_cognito_user_pool.this.arn
       }
-    ]
+    ], local.trial_claim_enabled ? [
+      {
+        Action = [
+          "dynamodb:GetItem"
+        ],
+        Effect   = "Allow",
+        Resource = var.users_table_arn
+      }
+    ] : [])
   })
 }
 
@@ -28,3 +28,17 @@ variable "reply_to_email_address" {
   type        = string
   default     = null
 }
+
+# DynamoDB users table read by the pre-token-generation trigger. Leave both
+# unset to skip the trigger; ID tokens then carry no trial_expires_at claim.
+variable "users_table_name" {
+  description = "Name of the DynamoDB users table holding trial expiry dates (optional)"
+  type        = string
+  default     = null
+}
+
+variable "users_table_arn" {
+  description = "ARN of the DynamoDB users table holding trial expiry dates (optional)"
+  type        = string
+  default     = null
+}
@@ -88,6 +88,90 @@ resource "aws_dynamodb_table" "urls" {
   }
 }
 
+# DynamoDB Table for the per-user file catalog (index of objects stored in S3)
+resource "aws_dynamodb_table" "files" {
+  name           = "${var.project_name}-${var.environment}-files"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "user_folder"
+  range_key      = "file_key"
+
+  attribute {
+    name = "user_folder"
+    type = "S"
+  }
+
+  attribute {
+    name = "file_key"
+    type = "S"
+  }
+
+  attribute {
+    name = "last_modified"
+    type = "S"
+  }
+
+  # Global Secondary Index for newest-first listing pages; sparse, so the
+  # per-folder reconciliation marker (no last_modified) is left out
+  global_secondary_index {
+    name            = "modified-index"
+    hash_key        = "user_folder"
+    range_key       = "last_modified"
+    projection_type = "ALL"
+  }
+
+  # Enable point-in-time recovery
+  point_in_time_recovery {
+    enabled = var.enable_point_in_time_recovery
+  }
+
+  # Server-side encryption
+  server_side_encryption {
+    enabled = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-files"
+    Environment = var.environment
+    Project     = var.project_name
+    ManagedBy   = "terraform"
+  }
+}
+
+# DynamoDB Table for the delta-sync change log shared by every backend task
+resource "aws_dynamodb_table" "changes" {
+  name           = "${var.project_name}-${var.environment}-changes"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "user_key"
+  range_key      = "seq"
+
+  attribute {
+    name = "user_key"
+    type = "S"
+  }
+
+  attribute {
+    name = "seq"
+    type = "N"
+  }
+
+  # Enable point-in-time recovery
+  point_in_time_recovery {
+    enabled = var.enable_point_in_time_recovery
+  }
+
+  # Server-side encryption
+  server_side_encryption {
+    enabled = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-changes"
+    Environment = var.environment
+    Project     = var.project_name
+    ManagedBy   = "terraform"
+  }
+}
+
 # IAM Policy for DynamoDB access
 resource "aws_iam_policy" "dynamodb_access" {
   name        = "${var.project_name}-${var.environment}-dynamodb-access"
@@ -112,7 +196,10 @@ resource "aws_iam_policy" "dynamodb_access" {
           aws_dynamodb_table.users.arn,
           "${aws_dynamodb_table.users.arn}/index/*",
           aws_dynamodb_table.urls.arn,
-          "${aws_dynamodb_table.urls.arn}/index/*"
+          "${aws_dynamodb_table.urls.arn}/index/*",
+          aws_dynamodb_table.files.arn,
+          "${aws_dynamodb_table.files.arn}/index/*",
+          aws_dynamodb_table.changes.arn
         ]
       }
     ]
@@ -147,6 +234,28 @@ resource "aws_ssm_parameter" "dynamodb_urls_table_name" {
   }
 }
 
+resource "aws_ssm_parameter" "dynamodb_files_table_name" {
+  name  = "/fileshare/${var.environment}/dynamodb_files_table_name"
+  type  = "String"
+  value = aws_dynamodb_table.files.name
+
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_ssm_parameter" "dynamodb_changes_table_name" {
+  name  = "/fileshare/${var.environment}/dynamodb_changes_table_name"
+  type  = "String"
+  value = aws_dynamodb_table.changes.name
+
+  tags = {
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
 resource "aws_ssm_parameter" "dynamodb_users_table_arn" {
   name  = "/fileshare/${var.environment}/dynamodb_users_table_arn"
   type  = "String"
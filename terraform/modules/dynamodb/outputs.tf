@@ -20,6 +20,26 @@ output "urls_table_arn" {
   value       = aws_dynamodb_table.urls.arn
 }
 
+output "files_table_name" {
+  description = "Name of the DynamoDB file catalog table"
+  value       = aws_dynamodb_table.files.name
+}
+
+output "files_table_arn" {
+  description = "ARN of the DynamoDB file catalog table"
+  value       = aws_dynamodb_table.files.arn
+}
+
+output "changes_table_name" {
+  description = "Name of the DynamoDB change log table"
+  value       = aws_dynamodb_table.changes.name
+}
+
+output "changes_table_arn" {
+  description = "ARN of the DynamoDB change log table"
+  value       = aws_dynamodb_table.changes.arn
+}
+
 output "dynamodb_policy_arn" {
   description = "ARN of the IAM policy for DynamoDB access"
   value       = aws_iam_policy.dynamodb_access.arn
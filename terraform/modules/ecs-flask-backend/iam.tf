@@ -65,7 +65,10 @@ resource "aws_iam_policy" "flask_app_s3_access" {
           "s3:PutObject",
           "s3:GetObject",
           "s3:ListBucket",  # Required for listing objects, potentially by boto3
-          "s3:DeleteObject" # Add if your app needs to delete files
+          "s3:DeleteObject", # Add if your app needs to delete files
+          "s3:AbortMultipartUpload",        # Resumable multipart uploads
+          "s3:ListMultipartUploadParts",
+          "s3:ListBucketMultipartUploads"   # Stale multipart upload cleanup
         ]
         Resource = [
           aws_s3_bucket.uploads_backend.arn,
@@ -81,6 +84,14 @@ resource "aws_iam_policy" "flask_app_s3_access" {
         ],
         Resource = "arn:aws:cognito-idp:us-east-2:481509955802:userpool/*"
       },
+      {
+        Sid    = "AllowCloudFrontInvalidation",
+        Effect = "Allow",
+        Action = [
+          "cloudfront:CreateInvalidation"
+        ],
+        Resource = "arn:aws:cloudfront::*:distribution/${var.cloudfront_distribution_id != "" ? var.cloudfront_distribution_id : "*"}"
+      },
       {
         Sid    = "AllowDynamoDBAccess",
         Effect = "Allow",
@@ -55,6 +55,10 @@ resource "aws_ecs_task_definition" "flask" {
         name  = "FRONTEND_DOMAIN"
         value = var.frontend_domain # CloudFront domain for short URL construction
       },
+      {
+        name  = "CLOUDFRONT_DISTRIBUTION_ID"
+        value = var.cloudfront_distribution_id # Purge cached short URL redirects on delete
+      },
       {
         name  = "USE_DYNAMODB"
         value = "true" # Enable DynamoDB for production
@@ -74,6 +78,14 @@ resource "aws_ecs_task_definition" "flask" {
       {
         name  = "DYNAMODB_SHORT_URLS_TABLE"
         value = "${var.project_name}-${var.environment}-urls"
+      },
+      {
+        name  = "DYNAMODB_FILES_TABLE"
+        value = "${var.project_name}-${var.environment}-files"
+      },
+      {
+        name  = "DYNAMODB_CHANGES_TABLE"
+        value = "${var.project_name}-${var.environment}-changes"
       }
     ]
     logConfiguration = {
@@ -22,6 +22,22 @@ resource "aws_s3_bucket_public_access_block" "uploads_backend_public_access_bloc
   restrict_public_buckets = true
 }
 
+# Allow browsers to upload directly to the bucket with presigned POSTs
+resource "aws_s3_bucket_cors_configuration" "uploads_backend_cors" {
+  bucket = aws_s3_bucket.uploads_backend.id
+
+  cors_rule {
+    allowed_methods = ["POST", "PUT"]
+    allowed_origins = compact(concat(
+      var.uploads_cors_allowed_origins,
+      [var.frontend_domain != "" ? "https://${var.frontend_domain}" : ""]
+    ))
+    allowed_headers = ["*"]
+    expose_headers  = ["ETag"]
+    max_age_seconds = 3000
+  }
+}
+
 # Enable versioning on the S3 bucket (good for data protection)
 resource "aws_s3_bucket_versioning" "uploads_backend_versioning" {
   bucket = aws_s3_bucket.uploads_backend.id
@@ -70,6 +70,12 @@ variable "frontend_domain" {
   default     = ""
 }
 
+variable "cloudfront_distribution_id" {
+  description = "CloudFront distribution serving /s/* short URLs (used to purge cached redirects). Leave empty to disable."
+  type        = string
+  default     = ""
+}
+
 #---------------------------------------------------------------
 # OPTIONAL PARAMETERS: These parameters have resonable defaults.
 #---------------------------------------------------------------
@@ -156,4 +162,14 @@ variable "dynamodb_policy_arn" {
   description = "The ARN of the IAM policy for DynamoDB access. If provided, will be attached to the ECS task role."
   type        = string
   default     = ""
-}
\ No newline at end of file
+}
+
+variable "uploads_cors_allowed_origins" {
+  description = "Origins allowed to upload directly to the uploads bucket (the frontend_domain is always added)"
+  type        = list(string)
+  default = [
+    "https://cf.aws.lupan.ca",
+    "http://localhost:3000",
+    "https://localhost:3000"
+  ]
+}
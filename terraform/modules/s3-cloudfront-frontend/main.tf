@@ -85,19 +85,21 @@ resource "aws_cloudfront_distribution" "this" {
     cached_methods         = ["GET", "HEAD"] # Cache GET requests for performance
     compress               = true
 
-    # Forward necessary headers for short URL resolution
+    # Forward only what short URL resolution needs; every forwarded header is
+    # part of the cache key, so per-browser headers would defeat caching
     forwarded_values {
       query_string = true # In case we need query parameters
-      headers      = ["Host", "User-Agent", "Referer"] # Useful for analytics
+      headers      = ["Host"]
       cookies {
         forward = "none" # Short URLs don't need cookies
       }
     }
 
-    # Short URLs can be cached briefly for performance
+    # The backend sets s-maxage per link (never past its expiry) and purges
+    # deleted links; responses without Cache-Control are not cached
     min_ttl     = 0
-    default_ttl = 300    # 5 minutes cache
-    max_ttl     = 3600   # 1 hour max cache
+    default_ttl = 0
+    max_ttl     = 86400 # 1 day max cache
   }
 
   custom_error_response {